@@ -0,0 +1,283 @@
+# analysis/modbus_table.py
+"""
+Kolumnowa reprezentacja pakietów Modbus/TCP (wynik run_native / run_tshark)
+i wektorowe jądra cech dla quick_modbus_stats.extract_features.
+
+ModbusTable: jedna tablica NumPy na kolumnę (ts, fc, addr, frame_len, flow).
+Przepływy i adresy IP są internowane: flow to id w tabeli przepływów
+(flow_src / flow_dst = id w endpoints, flow_sport / flow_dport), więc napis
+"ip:port -> ip:port" powstaje tylko dla flow_top3, a porty docelowe liczy
+np.bincount zamiast split() na każdym pakiecie.
+
+Kolumna fc: kod funkcji bez bitu wyjątku (0x7F) albo FC_NONE (tshark nie
+podał pola) / FC_MULTI (kilka PDU w pakiecie - jak "3,6" w tshark -T fields,
+nie liczy się ani do FC3, ani do FC6).
+
+TableBuilder zbiera wiersze w array.array (typowane, append w C), build()
+robi z nich tablice NumPy bez kopiowania (np.frombuffer), flush() dodatkowo
+zaczyna nowy kawałek (tryb strumieniowy).
+
+FeatureState: akumulatory cech o stałym rozmiarze - bincount FC i adresów
+FC6, min/max ts, momenty długości ramki jako dokładne sumy całkowite,
+liczniki per przepływ (rosną z liczbą przepływów, nie pakietów). update()
+na kolejnych kawałkach i merge() stanów dają wynik identyczny co do bitu
+z jedną tabelą całego capture.
+"""
+
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+FC_NONE = -1
+FC_MULTI = -2
+NO_PORT = -1            # tshark: brak tcp.srcport / tcp.dstport
+
+FC_SLOTS = 128          # fc po masce 0x7F
+ADDR_SLOTS = 65536      # adresy rejestrów (u16)
+
+FlowKey = Tuple[str, int, str, int]     # (src, sport, dst, dport)
+
+
+@dataclass
+class ModbusTable:
+    ts: np.ndarray          # f8, epoch [s]
+    fc: np.ndarray          # i2
+    addr: np.ndarray        # i4, adres FC6 albo -1
+    frame_len: np.ndarray   # u4
+    flow: np.ndarray        # u4, indeks w flow_*
+    endpoints: List[str]
+    flow_src: np.ndarray    # i4, indeks w endpoints
+    flow_sport: np.ndarray  # i4
+    flow_dst: np.ndarray    # i4
+    flow_dport: np.ndarray  # i4
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def num_flows(self) -> int:
+        return len(self.flow_src)
+
+    def flow_keys(self) -> List[FlowKey]:
+        ep = self.endpoints
+        return [(ep[s], sp, ep[d], dp) for s, sp, d, dp in zip(
+            self.flow_src.tolist(), self.flow_sport.tolist(), self.flow_dst.tolist(), self.flow_dport.tolist())]
+
+
+def _port_str(port: int) -> str:
+    return "" if port == NO_PORT else str(int(port))
+
+
+def flow_name(key: FlowKey) -> str:
+    src, sport, dst, dport = key
+    return f"{src}:{_port_str(sport)} -> {dst}:{_port_str(dport)}"
+
+
+class TableBuilder:
+    """
+    Wiersze dopisywane wprost do kolumn (ts, fc, addr, frame_len, flow - wołający
+    wiąże sobie .append lokalnie w pętli). Id przepływu: flow_ids.get(klucz),
+    przy braku new_flow(klucz, src, sport, dst, dport) - opis przepływu
+    (np. inet_ntop) liczony raz na przepływ, nie na pakiet.
+    """
+
+    def __init__(self):
+        self.flow_ids: Dict[Hashable, int] = {}
+        self._endpoint_ids: Dict[str, int] = {}
+        self.endpoints: List[str] = []
+        self._new_columns()
+
+    def _new_columns(self) -> None:
+        self.ts = array("d")
+        self.fc = array("h")
+        self.addr = array("i")
+        self.frame_len = array("I")
+        self.flow = array("I")
+        self._flows = (array("i"), array("i"), array("i"), array("i"))
+
+    def _endpoint(self, name: str) -> int:
+        i = self._endpoint_ids.get(name)
+        if i is None:
+            i = self._endpoint_ids[name] = len(self.endpoints)
+            self.endpoints.append(name)
+        return i
+
+    def new_flow(self, key: Hashable, src: str, sport: int, dst: str, dport: int) -> int:
+        fid = self.flow_ids[key] = len(self.flow_ids)
+        for col, v in zip(self._flows, (self._endpoint(src), sport, self._endpoint(dst), dport)):
+            col.append(v)
+        return fid
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def build(self) -> ModbusTable:
+        def col(a: array, dtype: str) -> np.ndarray:
+            return np.frombuffer(a, dtype=dtype) if len(a) else np.zeros(0, dtype=dtype)
+
+        src, sport, dst, dport = (col(a, "i4") for a in self._flows)
+        return ModbusTable(
+            ts=col(self.ts, "f8"),
+            fc=col(self.fc, "i2"),
+            addr=col(self.addr, "i4"),
+            frame_len=col(self.frame_len, "u4"),
+            flow=col(self.flow, "u4"),
+            endpoints=list(self.endpoints),
+            flow_src=src, flow_sport=sport, flow_dst=dst, flow_dport=dport,
+        )
+
+    def flush(self) -> ModbusTable:
+        """
+        Tabela z dotychczasowych wierszy i nowy, pusty kawałek (przepływy też od
+        zera - id są lokalne w kawałku). Po flush() trzeba na nowo związać .append
+        kolumn: stare array.array są pod tablicami NumPy, więc nie da się ich clear().
+        flow_ids jest czyszczone w miejscu.
+        """
+        table = self.build()
+        self._new_columns()
+        self.flow_ids.clear()
+        self._endpoint_ids = {}
+        self.endpoints = []
+        return table
+
+
+def empty_table() -> ModbusTable:
+    return TableBuilder().build()
+
+
+# ----------------------------
+# Jądra cech
+# ----------------------------
+
+def entropy_from_counts(counts: np.ndarray) -> float:
+    """Entropia Shannona [bit] z histogramu (zera pomijane)."""
+    c = counts[counts > 0]
+    total = int(c.sum())
+    if total == 0:
+        return 0.0
+    p = c / total
+    return max(0.0, float(-(p * np.log2(p)).sum()))
+
+
+def length_moments(frame_len: np.ndarray) -> Tuple[int, int, int]:
+    """(n, suma, suma kwadratów) - dokładnie, w liczbach całkowitych."""
+    x = frame_len.astype(np.uint64)
+    return len(x), int(x.sum()), int(np.dot(x, x))
+
+
+def mean_std(n: int, s: int, ss: int) -> Tuple[float, float]:
+    """Średnia i odchylenie populacyjne z sum całkowitych (bez utraty precyzji przy dużym n)."""
+    if n == 0:
+        return 0.0, 0.0
+    return s / n, math.sqrt((n * ss - s * s) / (n * n))
+
+
+class FeatureState:
+    """
+    Stan cech quick_modbus_stats: update(tabela) dla kolejnych kawałków,
+    merge(inny stan) dla części liczonych osobno, features() na końcu.
+    Momenty długości ramki to dokładne sumy całkowite (frame.len jest
+    całkowite) zamiast Welforda na floatach - kolejność i podział na
+    kawałki nie zmieniają wyniku. Obiekt daje się picklować.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.ts_min = math.inf
+        self.ts_max = -math.inf
+        self.fc_counts = np.zeros(FC_SLOTS, dtype=np.int64)
+        self.addr_counts = np.zeros(ADDR_SLOTS, dtype=np.int64)    # tylko FC6
+        self.len_sum = 0
+        self.len_sumsq = 0
+        self.flow_keys: List[FlowKey] = []      # kolejność pierwszego wystąpienia
+        self.flow_counts = np.zeros(0, dtype=np.int64)
+        self._flow_index: Dict[FlowKey, int] = {}
+
+    def _add_flows(self, keys: List[FlowKey], counts: np.ndarray) -> None:
+        index = self._flow_index
+        ids = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            j = index.get(key)
+            if j is None:
+                j = index[key] = len(self.flow_keys)
+                self.flow_keys.append(key)
+            ids[i] = j
+        grow = len(self.flow_keys) - len(self.flow_counts)
+        if grow:
+            self.flow_counts = np.concatenate((self.flow_counts, np.zeros(grow, dtype=np.int64)))
+        self.flow_counts[ids] += counts      # ids bez powtórzeń
+
+    def update(self, t: ModbusTable) -> None:
+        n = len(t)
+        if not n:
+            return
+        self.total += n
+        self.ts_min = min(self.ts_min, float(t.ts.min()))
+        self.ts_max = max(self.ts_max, float(t.ts.max()))
+
+        fc = t.fc
+        self.fc_counts += np.bincount(fc[fc >= 0], minlength=FC_SLOTS)
+        fc6_addrs = t.addr[(fc == 6) & (t.addr >= 0) & (t.addr < ADDR_SLOTS)]
+        if len(fc6_addrs):
+            self.addr_counts += np.bincount(fc6_addrs, minlength=ADDR_SLOTS)
+
+        _, s, ss = length_moments(t.frame_len)
+        self.len_sum += s
+        self.len_sumsq += ss
+
+        self._add_flows(t.flow_keys(), np.bincount(t.flow, minlength=t.num_flows))
+
+    def merge(self, other: "FeatureState") -> None:
+        self.total += other.total
+        self.ts_min = min(self.ts_min, other.ts_min)
+        self.ts_max = max(self.ts_max, other.ts_max)
+        self.fc_counts += other.fc_counts
+        self.addr_counts += other.addr_counts
+        self.len_sum += other.len_sum
+        self.len_sumsq += other.len_sumsq
+        self._add_flows(other.flow_keys, other.flow_counts)
+
+    def features(self) -> Dict[str, Any]:
+        """Cechy jak w extract_features (stan niepusty)."""
+        total = self.total
+        duration = (self.ts_max - self.ts_min) if total > 1 else 0.0
+        pkts_per_sec = (total / duration) if duration > 0 else float("inf")
+        mean_len, std_len = mean_std(total, self.len_sum, self.len_sumsq)
+
+        flow_counts = self.flow_counts
+        # remisy jak Counter.most_common: kolejność pierwszego wystąpienia (= id przepływu)
+        top = np.argsort(-flow_counts, kind="stable")[:3]
+        dports = np.array([k[3] for k in self.flow_keys], dtype=np.int64)
+
+        return {
+            "total_pkts": total,
+            "duration_s": duration,
+            "pkts_per_sec": pkts_per_sec,
+            "fc3_count": int(self.fc_counts[3]),
+            "fc6_count": int(self.fc_counts[6]),
+            "fc6_distinct_addrs": int(np.count_nonzero(self.addr_counts)),
+            "fc6_entropy": entropy_from_counts(self.addr_counts),
+            "mean_frame_len": mean_len,
+            "std_frame_len": std_len,
+            "num_flows": int(np.count_nonzero(flow_counts)),
+            "flow_top3": [(flow_name(self.flow_keys[i]), int(flow_counts[i])) for i in top if flow_counts[i]],
+            "ports_seen_dst": port_counts(dports, flow_counts),
+        }
+
+
+def table_features(t: ModbusTable) -> Dict[str, Any]:
+    """Cechy quick_modbus_stats dla niepustej tabeli (jeden kawałek FeatureState)."""
+    state = FeatureState()
+    state.update(t)
+    return state.features()
+
+
+def port_counts(flow_dport: np.ndarray, flow_counts: np.ndarray) -> Dict[str, int]:
+    """Pakiety per port docelowy; klucze w kolejności pierwszego wystąpienia portu."""
+    ports, first, inverse = np.unique(flow_dport, return_index=True, return_inverse=True)
+    per_port = np.bincount(inverse, weights=flow_counts, minlength=len(ports))
+    return {_port_str(ports[i]): int(per_port[i]) for i in np.argsort(first, kind="stable")
+            if per_port[i]}
@@ -0,0 +1,295 @@
+# analysis/parallel_stats.py
+"""
+Równoległa analiza wielu plików pcap / segmentów ring buffera dumpcap
+(start_capture: -b filesize:N -> <nazwa>_00001_<YYYYmmddHHMMSS>.pcapng, ...).
+
+Zadanie = plik albo (backend native) kawałek dużego pliku. Kawałki są
+wyznaczane w bajtach (part_bytes), a worker sam przesuwa granice na
+najbliższy rekord (iter_record_offsets). Wszystkie workery liczą to
+samo, więc kawałki nie zachodzą na siebie ani nie zostawiają dziur.
+Przed swoim kawałkiem worker "rozgrzewa" składanie strumieni TCP na
+WARMUP_BYTES (256 KiB) poprzedzających go bajtów. Ramka rozcięta na
+granicy i retransmisja są liczone tak samo jak przy przebiegu przez cały
+plik, o ile to, od czego zależą - początek ramki, dane powtarzane przez
+retransmisję - leży w tym oknie. Strumień milczący dłużej niż 256 KiB
+ruchu innych strumieni, z ramką rozciętą akurat na granicy, może dać na
+niej inny wynik (np. ramka zgubiona albo policzona podwójnie).
+
+Wynik zadania to FeatureState (streaming, stała pamięć), który wraca do
+rodzica. Tam stany są łączone merge() w kolejności plików / kawałków.
+Liczniki się sumują, momenty to sumy całkowite, przepływy są łączone po
+kluczu w kolejności pierwszego wystąpienia. Raport per plik i raport per
+sesja (segmenty jednego start_capture) są więc identyczne z przebiegiem
+sekwencyjnym w granicach okna rozgrzewki. Dlatego dzielenie jest opt-in:
+domyślne part_bytes=0 (i zawsze backend tshark) to zadanie = cały plik
+i dokładnie wynik sekwencyjny; równolegle idą wtedy tylko różne pliki.
+
+    python -m analysis.parallel_stats capture/pcap
+    python -m analysis.parallel_stats a.pcapng b.pcapng --workers 8 --json out.json
+    python -m analysis.parallel_stats big.pcapng --workers 8 --part-mb auto
+"""
+
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from analysis.modbus_table import FeatureState
+from analysis.pcap_reader import PcapFile
+from analysis.quick_modbus_stats import (
+    BACKENDS, DEFAULT_BACKEND, DEFAULT_DECODE_PORTS, PCAP_EXTENSIONS, STREAM_CHUNK_ROWS,
+    features_report, iter_modbus_tables, native_tables, resolve_backend,
+)
+
+MIN_PART_BYTES = 8 * 2**20          # mniejszych plików nie dzielimy
+MAX_PART_BYTES = 64 * 2**20
+TASKS_PER_WORKER = 4                # zapas na nierówne kawałki
+WARMUP_BYTES = 256 * 1024           # ~2-3 tys. pakietów Modbus - ramka ma < 300 B
+
+# dumpcap -b: <prefiks>_<numer>_<YYYYmmddHHMMSS>.<ext>
+_RING_SEGMENT_RE = re.compile(r"^(?P<session>.+)_(?P<index>\d{5,})_(?P<stamp>\d{14})$")
+
+
+@dataclass
+class AnalysisTask:
+    path: str
+    file_index: int
+    part: int
+    parts: int
+    start: int          # nominalny zakres w bajtach; granice rekordów ustala worker
+    end: int
+
+
+def session_of(path: Path) -> Tuple[str, int]:
+    """(nazwa sesji, numer segmentu) - plik spoza ring buffera to sesja jednoplikowa."""
+    m = _RING_SEGMENT_RE.match(path.stem)
+    if m is None:
+        return path.stem, 0
+    return m.group("session"), int(m.group("index"))
+
+
+def expand_paths(paths: Iterable[Path]) -> List[Path]:
+    """Pliki i katalogi (wszystkie .pcap/.pcapng w środku), bez duplikatów."""
+    out: List[Path] = []
+    seen = set()
+    for p in paths:
+        if p.is_dir():
+            files = sorted(f for f in p.iterdir() if f.is_file() and f.suffix.lower() in PCAP_EXTENSIONS)
+        else:
+            files = [p]
+        for f in files:
+            key = f.resolve()
+            if key not in seen:
+                seen.add(key)
+                out.append(f)
+    return out
+
+
+def default_part_bytes(total_bytes: int, workers: int) -> int:
+    """Rozmiar kawałka dla part_bytes=None (--part-mb auto): ~TASKS_PER_WORKER zadań na workera."""
+    if workers <= 1:
+        return 0                # bez dzielenia
+    target = math.ceil(total_bytes / (workers * TASKS_PER_WORKER))
+    return min(MAX_PART_BYTES, max(MIN_PART_BYTES, target))
+
+
+def plan_tasks(files: Sequence[Path], backend: str, part_bytes: int) -> List[AnalysisTask]:
+    tasks: List[AnalysisTask] = []
+    for i, f in enumerate(files):
+        size = f.stat().st_size
+        # tshark czyta cały plik - dzielimy tylko backend native
+        parts = 1
+        if backend == "native" and part_bytes > 0 and size > part_bytes:
+            parts = math.ceil(size / part_bytes)
+        step = math.ceil(size / parts) if parts else size
+        for k in range(parts):
+            tasks.append(AnalysisTask(
+                path=str(f), file_index=i, part=k, parts=parts,
+                start=k * step, end=min(size, (k + 1) * step),
+            ))
+    return tasks
+
+
+def _record_bounds(f: PcapFile, targets: Sequence[int]) -> List[int]:
+    """Dla każdego celu (rosnąco) offset pierwszego rekordu >= cel; brak -> koniec pliku."""
+    out: List[int] = []
+    it = iter(targets)
+    target = next(it, None)
+    for off in f.record_offsets():
+        while target is not None and off >= target:
+            out.append(off)
+            target = next(it, None)
+        if target is None:
+            return out
+    end = f.path.stat().st_size
+    while len(out) < len(targets):
+        out.append(end)
+    return out
+
+
+def run_task(task: AnalysisTask, decode_ports: List[int], backend: str) -> FeatureState:
+    """Worker: stan cech jednego pliku albo kawałka (top-level - picklowalne dla spawn)."""
+    state = FeatureState()
+    path = Path(task.path)
+    if task.parts == 1:
+        for table in iter_modbus_tables(path, decode_ports, backend, STREAM_CHUNK_ROWS):
+            state.update(table)
+        return state
+
+    with PcapFile(path) as f:
+        first = task.part == 0
+        last = task.part == task.parts - 1
+        warm_target = max(0, task.start - WARMUP_BYTES)
+        warm, start, end = _record_bounds(f, (warm_target, task.start, task.end))
+        packets = f.modbus_packets(
+            decode_ports,
+            start=0 if first else start,
+            end=None if last else end,
+            warmup_from=None if first else warm,
+        )
+        for table in native_tables(packets, STREAM_CHUNK_ROWS):
+            state.update(table)
+    return state
+
+
+def _run_task_star(args: Tuple[AnalysisTask, List[int], str]) -> Tuple[AnalysisTask, FeatureState, float]:
+    t0 = time.perf_counter()
+    state = run_task(*args)
+    return args[0], state, time.perf_counter() - t0
+
+
+def _session_report(name: str, files: List[Path], decode_ports: List[int], backend: str,
+                    state: FeatureState) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "session": name,
+        "files": [f.name for f in files],
+        "ok": bool(state.total),
+        "decode_ports": decode_ports,
+        "backend": backend,
+    }
+    if state.total:
+        out.update(state.features())
+    return out
+
+
+def analyze_many(
+    paths: Sequence[Path],
+    decode_ports: Optional[List[int]] = None,
+    backend: Optional[str] = None,
+    workers: Optional[int] = None,
+    part_bytes: Optional[int] = 0,
+) -> Dict[str, Any]:
+    """
+    Raport per plik (jak extract_features) + per sesja (segmenty ring buffera
+    scalone w kolejności numerów). workers=1 - bez puli, w bieżącym procesie.
+    backend=None - resolve_backend() raz w rodzicu, workery dostają konkretny.
+    part_bytes=0 - całe pliki (wynik dokładny), > 0 - duże pliki dzielone
+    na kawałki (native), None - rozmiar kawałka wg liczby workerów.
+    """
+    backend = resolve_backend(backend)
+    decode_ports = decode_ports or DEFAULT_DECODE_PORTS
+    workers = workers or os.cpu_count() or 1
+
+    # kolejność: sesja, numer segmentu - merge sesji idzie w kolejności zapisu
+    files = sorted(expand_paths(paths), key=lambda p: (*session_of(p), p.name))
+    total_bytes = sum(f.stat().st_size for f in files)
+    if part_bytes is None:
+        part_bytes = default_part_bytes(total_bytes, workers)
+    tasks = plan_tasks(files, backend, part_bytes)
+
+    t0 = time.perf_counter()
+    results: Dict[Tuple[int, int], FeatureState] = {}
+    task_seconds = 0.0
+    jobs = [(t, decode_ports, backend) for t in sorted(tasks, key=lambda t: t.end - t.start, reverse=True)]
+    if workers <= 1 or len(tasks) <= 1:
+        done = map(_run_task_star, jobs)
+        pool = None
+    else:
+        # spawn jak w fleet / proxy_multi: worker nie dziedziczy wątków rodzica (np. API)
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=mp.get_context("spawn"))
+        done = pool.map(_run_task_star, jobs)
+    try:
+        for task, state, seconds in done:
+            results[(task.file_index, task.part)] = state
+            task_seconds += seconds
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    wall = time.perf_counter() - t0
+
+    per_file: List[Dict[str, Any]] = []
+    file_states: List[FeatureState] = []
+    for i, f in enumerate(files):
+        state = FeatureState()
+        for task in tasks:
+            if task.file_index == i:
+                state.merge(results[(i, task.part)])
+        file_states.append(state)
+        report = features_report(f, decode_ports, backend, state)
+        report["parts"] = sum(1 for t in tasks if t.file_index == i)
+        per_file.append(report)
+
+    sessions: Dict[str, List[int]] = {}
+    for i, f in enumerate(files):
+        sessions.setdefault(session_of(f)[0], []).append(i)
+    per_session: List[Dict[str, Any]] = []
+    for name, idx in sessions.items():
+        state = FeatureState()
+        for i in idx:
+            state.merge(file_states[i])
+        per_session.append(_session_report(name, [files[i] for i in idx], decode_ports, backend, state))
+
+    return {
+        "backend": backend,
+        "decode_ports": decode_ports,
+        "workers": workers,
+        "tasks": len(tasks),
+        "part_bytes": part_bytes,
+        "total_mb": total_bytes / 2**20,
+        "wall_s": wall,
+        "task_s": task_seconds,
+        "files": per_file,
+        "sessions": per_session,
+    }
+
+
+def main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(description="Parallel quick Modbus/TCP statistics for many pcaps / ring-buffer segments")
+    ap.add_argument("paths", nargs="*", type=Path, help="pliki albo katalogi (domyślnie capture/pcap)")
+    ap.add_argument("--backend", choices=BACKENDS, default=None,
+                    help=f"domyślnie {DEFAULT_BACKEND}, bez tshark w systemie native")
+    ap.add_argument("--workers", type=int, default=None, help="domyślnie os.cpu_count()")
+    ap.add_argument("--part-mb", default="0",
+                    help="dzielenie dużych plików na kawałki tej wielkości (native, opt-in); "
+                         "0 = całe pliki, wynik dokładny (domyślnie); auto = wg liczby workerów")
+    ap.add_argument("--json", type=Path, default=None, help="zapis pełnego raportu")
+    args = ap.parse_args(argv[1:])
+
+    paths = args.paths or [Path(__file__).resolve().parents[1] / "capture" / "pcap"]
+    part_bytes = None if args.part_mb == "auto" else int(float(args.part_mb) * 2**20)
+    report = analyze_many(paths, backend=args.backend, workers=args.workers, part_bytes=part_bytes)
+
+    print(f"{len(report['files'])} files, {report['total_mb']:.1f} MB, {report['tasks']} tasks "
+          f"on {report['workers']} workers: {report['wall_s']:.2f} s wall ({report['task_s']:.2f} s in tasks)")
+    for s in report["sessions"]:
+        if not s["ok"]:
+            print(f"  {s['session']}: brak pakietów Modbus ({len(s['files'])} files)")
+            continue
+        print(f"  {s['session']}: {len(s['files'])} files, {s['total_pkts']} pkts, {s['duration_s']:.1f} s, "
+              f"FC3={s['fc3_count']} FC6={s['fc6_count']} flows={s['num_flows']}")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+        print("->", args.json)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,436 @@
+# analysis/pcap_reader.py
+"""
+Natywny czytnik pcap / pcapng (bez tshark / scapy): plik mapowany przez mmap,
+nagłówki czytane struct.unpack_from, payload TCP zwracany jako memoryview
+(bez kopiowania).
+
+Obsługiwane:
+  - pcap (us / ns, obie kolejności bajtów), pcapng (SHB / IDB / EPB / SPB,
+    if_tsresol, wiele interfejsów),
+  - link: Ethernet (+VLAN/QinQ), Linux SLL / SLL2, NULL/loopback, raw IPv4/IPv6,
+  - IPv4 (bez fragmentów poza pierwszym), IPv6 (bez nagłówków rozszerzeń), TCP,
+  - Modbus/TCP (iter_modbus): strumień każdego kierunku składany po seq
+    (TcpStream), więc ramki MBAP rozcięte między segmenty TCP też są liczone
+    - w pakiecie, który je domyka (jak reassembly w tshark).
+
+Zakres [start, end) w bajtach (iter_packets, PcapFile.*) to offsety rekordów
+z iter_record_offsets - tak analysis.parallel_stats dzieli duży plik między
+procesy na granicach pakietów.
+"""
+
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from injector.core import mbap
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BOM = 0x1A2B3C4D
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+_RAW_LINKTYPES = (LINKTYPE_RAW, 12, 14, LINKTYPE_IPV4, LINKTYPE_IPV6)
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+_ETH_VLAN = (0x8100, 0x88A8, 0x9100)
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+
+_U16BE = struct.Struct(">H")
+_TCP_HDR = struct.Struct(">HHIIBB")    # sport, dport, seq, ack, data offset, flags
+_IPV4_HDR = struct.Struct(">BxH2xHxB2x4s4s")   # ver/ihl, total, flags/frag, proto, src, dst
+# Ethernet + IPv4 (IHL=5) + TCP jednym unpack - typowy pakiet Modbus/TCP
+_ETH_IPV4_TCP = struct.Struct(">12xHBxH2xHxB2x4s4sHHIIBB")
+_ETH_IPV4_TCP_LEN = 14 + 20 + 14
+
+_SEQ_MASK = 0xFFFFFFFF
+
+
+class TcpSegment(NamedTuple):
+    ts: float
+    src: bytes          # 4 B (IPv4) / 16 B (IPv6)
+    dst: bytes
+    sport: int
+    dport: int
+    seq: int
+    flags: int
+    payload: memoryview
+    orig_len: int = 0
+
+
+class PacketRecord(NamedTuple):
+    ts: float
+    linktype: int
+    orig_len: int
+    data: memoryview
+
+
+class ModbusPacket(NamedTuple):
+    """Pakiet, który domyka >= 1 ramkę MBAP; pdus = [(func, adres albo -1)]."""
+    ts: float
+    src: bytes
+    dst: bytes
+    sport: int
+    dport: int
+    frame_len: int      # długość pakietu na łączu (orig_len, jak frame.len)
+    is_request: bool    # dport w portach Modbus
+    pdus: List[Tuple[int, int]]
+    flow: Tuple[bytes, int, bytes, int]    # (src, sport, dst, dport) - klucz kierunku
+
+
+# ----------------------------
+# Rekordy pcap / pcapng
+# ----------------------------
+
+def _iter_pcap(mv: memoryview, start: int = 0, end: Optional[int] = None) -> Iterator[PacketRecord]:
+    magic_le = struct.unpack_from("<I", mv, 0)[0]
+    if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        endian = "<"
+        magic = magic_le
+    else:
+        endian = ">"
+        magic = struct.unpack_from(">I", mv, 0)[0]
+    frac = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    linktype = struct.unpack_from(endian + "I", mv, 20)[0] & 0x0FFFFFFF
+    rec = struct.Struct(endian + "IIII")
+    off, n = max(24, start), len(mv)
+    stop = n if end is None else min(end, n)
+    while off < stop and off + 16 <= n:
+        sec, sub, incl, orig = rec.unpack_from(mv, off)
+        off += 16
+        if off + incl > n:
+            break      # ucięty ostatni rekord
+        yield PacketRecord(sec + sub * frac, linktype, orig, mv[off:off + incl])
+        off += incl
+
+
+def _tsresol(opts: memoryview, endian: str) -> float:
+    off = 0
+    while off + 4 <= len(opts):
+        code, length = struct.unpack_from(endian + "HH", opts, off)
+        off += 4
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            v = opts[off]
+            return 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0 ** -v
+        off += (length + 3) & ~3
+    return 1e-6
+
+
+def _iter_pcapng(mv: memoryview, start: int = 0, end: Optional[int] = None) -> Iterator[PacketRecord]:
+    """Bloki SHB / IDB zawsze od początku pliku (kontekst interfejsów), pakiety tylko z [start, end)."""
+    n = len(mv)
+    off = 0
+    stop = n if end is None else min(end, n)
+    endian = "<"
+    interfaces = []       # (linktype, tsresol) per sekcję
+    while off < stop and off + 12 <= n:
+        btype = struct.unpack_from(endian + "I", mv, off)[0]
+        if btype == PCAPNG_SHB:
+            bom = struct.unpack_from("<I", mv, off + 8)[0]
+            endian = "<" if bom == PCAPNG_BOM else ">"
+            interfaces = []
+        blen = struct.unpack_from(endian + "I", mv, off + 4)[0]
+        if blen < 12 or off + blen > n:
+            break
+        if btype in (3, 6) and off < start:
+            off += blen
+            continue
+        body = mv[off + 8:off + blen - 4]
+        if btype == 1:                                   # IDB
+            linktype = struct.unpack_from(endian + "H", body, 0)[0]
+            interfaces.append((linktype, _tsresol(body[8:], endian)))
+        elif btype == 6 and interfaces:                  # EPB
+            if_id, ts_hi, ts_lo, cap, orig = struct.unpack_from(endian + "IIIII", body, 0)
+            if if_id < len(interfaces):
+                linktype, res = interfaces[if_id]
+                yield PacketRecord(((ts_hi << 32) | ts_lo) * res, linktype, orig, body[20:20 + cap])
+        elif btype == 3 and interfaces:                  # SPB - bez timestampu
+            orig = struct.unpack_from(endian + "I", body, 0)[0]
+            yield PacketRecord(0.0, interfaces[0][0], orig, body[4:4 + orig])
+        off += blen
+
+
+def iter_packets(mv: memoryview, start: int = 0, end: Optional[int] = None) -> Iterator[PacketRecord]:
+    if len(mv) < 24:
+        return iter(())
+    if struct.unpack_from("<I", mv, 0)[0] == PCAPNG_SHB:
+        return _iter_pcapng(mv, start, end)
+    return _iter_pcap(mv, start, end)
+
+
+def iter_record_offsets(mv: memoryview) -> Iterator[int]:
+    """Offsety rekordów pakietów (pcap) / bloków EPB i SPB (pcapng) - tylko nagłówki, bez danych."""
+    n = len(mv)
+    if n < 24:
+        return
+    if struct.unpack_from("<I", mv, 0)[0] == PCAPNG_SHB:
+        off, endian = 0, "<"
+        while off + 12 <= n:
+            btype = struct.unpack_from(endian + "I", mv, off)[0]
+            if btype == PCAPNG_SHB:
+                endian = "<" if struct.unpack_from("<I", mv, off + 8)[0] == PCAPNG_BOM else ">"
+            blen = struct.unpack_from(endian + "I", mv, off + 4)[0]
+            if blen < 12 or off + blen > n:
+                return
+            if btype in (3, 6):
+                yield off
+            off += blen
+        return
+    endian = "<" if struct.unpack_from("<I", mv, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else ">"
+    incl_at = struct.Struct(endian + "I").unpack_from
+    off = 24
+    while off + 16 <= n:
+        incl = incl_at(mv, off + 8)[0]
+        if off + 16 + incl > n:
+            return
+        yield off
+        off += 16 + incl
+
+
+# ----------------------------
+# Warstwy link / IP / TCP
+# ----------------------------
+
+def _ip_payload(linktype: int, data: memoryview) -> Optional[Tuple[int, int]]:
+    """(wersja IP, offset nagłówka IP) albo None."""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        off = 12
+        ethertype = _U16BE.unpack_from(data, off)[0]
+        while ethertype in _ETH_VLAN and len(data) >= off + 6:
+            off += 4
+            ethertype = _U16BE.unpack_from(data, off)[0]
+        off += 2
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None
+        ethertype, off = _U16BE.unpack_from(data, 14)[0], 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20:
+            return None
+        ethertype, off = _U16BE.unpack_from(data, 0)[0], 20
+    elif linktype == LINKTYPE_NULL:
+        if len(data) < 4:
+            return None
+        family = struct.unpack_from("<I", data, 0)[0]
+        if family > 0xFFFF:
+            family = struct.unpack_from(">I", data, 0)[0]
+        ethertype = ETH_IPV4 if family == 2 else ETH_IPV6 if family in (10, 24, 28, 30) else 0
+        off = 4
+    elif linktype in _RAW_LINKTYPES:
+        if not len(data):
+            return None
+        ethertype = ETH_IPV4 if data[0] >> 4 == 4 else ETH_IPV6
+        off = 0
+    else:
+        return None
+    if ethertype == ETH_IPV4:
+        return 4, off
+    if ethertype == ETH_IPV6:
+        return 6, off
+    return None
+
+
+def parse_tcp(rec: PacketRecord) -> Optional[TcpSegment]:
+    data = rec.data
+    if rec.linktype == LINKTYPE_ETHERNET and len(data) >= _ETH_IPV4_TCP_LEN:
+        (ethertype, ver_ihl, total, frag, proto, src, dst,
+         sport, dport, seq, _, doff, flags) = _ETH_IPV4_TCP.unpack_from(data, 0)
+        if ethertype == ETH_IPV4 and ver_ihl == 0x45:
+            if proto != 6 or frag & 0x1FFF:
+                return None
+            end = min(len(data), 14 + total) if total else len(data)
+            payload_off = 34 + (doff >> 4) * 4
+            return TcpSegment(rec.ts, src, dst, sport, dport, seq, flags,
+                              data[payload_off:max(payload_off, end)], rec.orig_len)
+    ip = _ip_payload(rec.linktype, data)
+    if ip is None:
+        return None
+    version, off = ip
+    if version == 4:
+        if len(data) < off + 20:
+            return None
+        ver_ihl, total, frag, proto, src, dst = _IPV4_HDR.unpack_from(data, off)
+        if proto != 6 or frag & 0x1FFF:
+            return None                                  # nie TCP / fragment (nie pierwszy)
+        end = min(len(data), off + total) if total else len(data)
+        tcp = off + (ver_ihl & 0x0F) * 4
+    else:
+        if len(data) < off + 40 or data[off + 6] != 6:
+            return None
+        plen = _U16BE.unpack_from(data, off + 4)[0]
+        src, dst = bytes(data[off + 8:off + 24]), bytes(data[off + 24:off + 40])
+        tcp = off + 40
+        end = min(len(data), tcp + plen)
+    if end < tcp + 20:
+        return None
+    sport, dport, seq, _, doff, flags = _TCP_HDR.unpack_from(data, tcp)
+    payload_off = tcp + (doff >> 4) * 4
+    return TcpSegment(rec.ts, src, dst, sport, dport, seq, flags, data[payload_off:max(payload_off, end)],
+                      rec.orig_len)
+
+
+# ----------------------------
+# Składanie TCP / MBAP
+# ----------------------------
+
+class TcpStream:
+    """
+    Jeden kierunek połączenia TCP składany po seq: retransmisje (też częściowe)
+    są przycinane, dziura w numeracji (segment zgubiony w capture) czyści bufor -
+    niepełnej ramki i tak nie odtworzymy.
+    """
+
+    __slots__ = ("buf", "next_seq")
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.next_seq: Optional[int] = None
+
+    def feed(self, seq: int, payload: memoryview) -> bool:
+        """Dopisuje nowe bajty do buf; False, gdy segment nic nowego nie wnosi."""
+        if self.next_seq is not None:
+            diff = (seq - self.next_seq) & _SEQ_MASK
+            if diff >= 0x80000000:
+                overlap = (self.next_seq - seq) & _SEQ_MASK
+                if overlap >= len(payload):
+                    return False
+                payload = payload[overlap:]
+                seq = self.next_seq
+            elif diff:
+                self.buf.clear()
+        self.buf += payload
+        self.next_seq = (seq + len(payload)) & _SEQ_MASK
+        return True
+
+
+def scan_mbap(buf: Union[bytearray, memoryview], is_request: bool) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Kompletne ramki MBAP z początku buf -> ([(func, adres)], zużyte bajty);
+    parsowanie we wspólnym codecu (mbap.scan_addresses). Zużyte == -1: śmieci.
+    """
+    return mbap.scan_addresses(buf, mbap.ADDRESS_FUNCS_REQUEST if is_request else mbap.ADDRESS_FUNCS_RESPONSE)
+
+
+def take_mbap(stream: TcpStream, seq: int, payload: memoryview, is_request: bool) -> List[Tuple[int, int]]:
+    """
+    Dokłada segment do strumienia i zdejmuje kompletne ramki MBAP.
+    Szybka ścieżka: segment w kolejności przy pustym buforze (typowy
+    request/response w jednym segmencie) parsowany wprost z mmap, do bufora
+    trafia tylko ewentualna niepełna końcówka.
+    """
+    if not stream.buf and (stream.next_seq is None or stream.next_seq == seq):
+        stream.next_seq = (seq + len(payload)) & _SEQ_MASK
+        pdus, used = scan_mbap(payload, is_request)
+        if 0 <= used < len(payload):
+            stream.buf += payload[used:]
+        return pdus
+    if not stream.feed(seq, payload):
+        return []
+    buf = stream.buf
+    pdus, used = scan_mbap(buf, is_request)
+    if used < 0:
+        buf.clear()
+    elif used:
+        del buf[:used]
+    return pdus
+
+
+def iter_modbus(segments: Iterator[TcpSegment], ports: Sequence[int],
+                streams: Optional[Dict[Tuple[bytes, int, bytes, int], TcpStream]] = None) -> Iterator[ModbusPacket]:
+    """
+    Pakiety Modbus/TCP (oba kierunki) z segmentów TCP, gdzie sport lub dport w ports.
+    streams - stan składania strumieni do kontynuacji (np. po rozgrzewce, patrz PcapFile.modbus_packets).
+    """
+    portset = frozenset(ports)
+    if streams is None:
+        streams = {}
+    for seg in segments:
+        if seg.dport in portset:
+            is_request = True
+        elif seg.sport in portset:
+            is_request = False
+        else:
+            continue
+        key = (seg.src, seg.sport, seg.dst, seg.dport)
+        if seg.flags & TCP_SYN:
+            streams.pop(key, None)
+        pdus = None
+        if len(seg.payload):
+            stream = streams.get(key)
+            if stream is None:
+                stream = streams[key] = TcpStream()
+            pdus = take_mbap(stream, seg.seq, seg.payload, is_request)
+        if seg.flags & (TCP_FIN | TCP_RST):
+            streams.pop(key, None)
+        if pdus:
+            yield ModbusPacket(seg.ts, seg.src, seg.dst, seg.sport, seg.dport,
+                               seg.orig_len, is_request, pdus, key)
+
+
+class PcapFile:
+    """
+    Plik pcap/pcapng zmapowany do pamięci. Używać jako context manager -
+    memoryview zwracane przez iteratory są ważne tylko do close().
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._f = self.path.open("rb")
+        size = self.path.stat().st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._mv = memoryview(self._mm) if self._mm is not None else memoryview(b"")
+
+    def packets(self, start: int = 0, end: Optional[int] = None) -> Iterator[PacketRecord]:
+        return iter_packets(self._mv, start, end)
+
+    def record_offsets(self) -> Iterator[int]:
+        return iter_record_offsets(self._mv)
+
+    def tcp_segments(self, start: int = 0, end: Optional[int] = None) -> Iterator[TcpSegment]:
+        for rec in iter_packets(self._mv, start, end):
+            seg = parse_tcp(rec)
+            if seg is not None:
+                yield seg
+
+    def modbus_packets(self, ports: Sequence[int], start: int = 0, end: Optional[int] = None,
+                       warmup_from: Optional[int] = None) -> Iterator[ModbusPacket]:
+        """
+        warmup_from < start: pakiety z [warmup_from, start) tylko zasilają składanie
+        strumieni TCP (bez wyniku) - część pliku liczona osobno widzi wtedy ramki
+        rozcięte na granicy i retransmisje tak samo jak przebieg przez cały plik.
+        """
+        streams: Dict[Tuple[bytes, int, bytes, int], TcpStream] = {}
+        if warmup_from is not None and warmup_from < start:
+            for _ in iter_modbus(self.tcp_segments(warmup_from, start), ports, streams):
+                pass
+        return iter_modbus(self.tcp_segments(start, end), ports, streams)
+
+    def close(self) -> None:
+        self._mv.release()
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass    # wołający trzyma jeszcze payload (memoryview) - mmap zamknie GC
+        self._f.close()
+
+    def __enter__(self) -> "PcapFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
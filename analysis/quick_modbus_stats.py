@@ -1,201 +1,299 @@
 # analysis/quick_modbus_stats.py
 
-import collections
-import math
-import shutil
+import argparse
+import socket
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 
-PCAP_EXTENSIONS = (".pcap", ".pcapng")
-TSHARK_FIXED_PATH = r"C:\Program Files\Wireshark\tshark.exe"
-
-DEFAULT_DECODE_PORTS = [502, 1502]
-
-
-def _get_tshark_exe() -> str:
-    exe = shutil.which("tshark")
-    return exe if exe else TSHARK_FIXED_PATH
-
-
-def _try_tshark(cmd: List[str]) -> Tuple[int, str, str]:
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    out, err = proc.communicate()
-    return proc.returncode, out, err
-
-
-def run_tshark(pcap: Path, decode_ports: List[int]) -> Tuple[
-    List[float], List[str], List[int], List[int], List[str]
-]:
-    tshark_exe = _get_tshark_exe()
-
-    # Najczęściej poprawny dissektor dla Modbus/TCP w tshark:
-    # - mbtcp (pole modbus.* jest dalej dostępne po dekodowaniu)
-    proto_candidates = ["mbtcp", "modbus.tcp", "modbus"]
-
-    base = [
-        "-r", str(pcap),
-        "-Y", "modbus",   # po poprawnym decode-as pojawi się warstwa modbus
-        "-T", "fields",
-        "-e", "frame.time_epoch",
-        "-e", "modbus.func_code",
-        "-e", "modbus.reference_num",
-        "-e", "frame.len",
-        "-e", "ip.src",
-        "-e", "ip.dst",
-        "-e", "tcp.srcport",
-        "-e", "tcp.dstport",
-    ]
+from analysis.modbus_table import FC_MULTI, FC_NONE, NO_PORT, FeatureState, ModbusTable, TableBuilder, empty_table
+from analysis.pcap_reader import ModbusPacket, PcapFile
+from analysis.tshark_profile import get_tshark_exe, get_tshark_profile, reset_tshark_profile, tshark_available
 
-    last_err = ""
-    out_text = ""
-
-    for proto in proto_candidates:
-        cmd = [tshark_exe]
-        for p in decode_ports:
-            cmd += ["-d", f"tcp.port=={p},{proto}"]
-        cmd += base
-
-        code, out, err = _try_tshark(cmd)
-        if "isn't valid for layer type" in err or "Valid protocols for layer type" in err:
-            last_err = err.strip()
-            continue
-
-        out_text = out
-        last_err = err.strip()
-        break
+PCAP_EXTENSIONS = (".pcap", ".pcapng")
 
-    if not out_text:
-        # tshark może po prostu nie znaleźć modbus (np. pcap bez 1502, albo brak ruchu)
-        # ale jeśli decode-as się wywalał, dajemy konkretną podpowiedź:
-        if last_err:
-            print("tshark stderr:", last_err)
-        return [], [], [], [], []
-
-    times: List[float] = []
-    func_codes: List[str] = []
-    fc6_addrs: List[int] = []
-    frame_lens: List[int] = []
-    flows: List[str] = []
-
-    for line in out_text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split("\t")
-        if len(parts) < 8:
-            continue
+# PLC, proxy, wbudowany PlcSimulator (injector.sim.plc_sim.SIM_DEFAULT_PORT, simulate_plc=True)
+DEFAULT_DECODE_PORTS = [502, 1502, 5020]
+
+# native - analysis.pcap_reader (mmap, bez tshark), tshark - dissektor Wiresharka
+BACKENDS = ("native", "tshark")
+DEFAULT_BACKEND = "tshark"      # backend=None: tshark, a bez binarki tshark - native
+
+# tryb strumieniowy: wierszy na kawałek (~1.5 MB kolumn)
+STREAM_CHUNK_ROWS = 65536
+
+
+TSHARK_FIELDS = (
+    "frame.time_epoch",
+    "modbus.func_code",
+    "modbus.reference_num",
+    "frame.len",
+    "ip.src",
+    "ip.dst",
+    "tcp.srcport",
+    "tcp.dstport",
+)
+
+
+def _parse_fc(fc: str) -> int:
+    if "," in fc:
+        return FC_MULTI
+    try:
+        return int(fc) & 0x7F
+    except ValueError:
+        return FC_NONE
+
+
+def _parse_port(raw: str) -> int:
+    try:
+        return int(raw)
+    except ValueError:
+        return NO_PORT
+
+
+def iter_tshark_tables(pcap: Path, decode_ports: List[int],
+                       chunk_rows: Optional[int] = None) -> Iterator[ModbusTable]:
+    """
+    Jedna dysekcja capture: nazwa decode-as i obsługiwane pola bierzemy
+    z profilu tshark (analysis.tshark_profile, sondowany raz na binarkę).
+    stdout tshark czytany wiersz po wierszu prosto do kolumn (TableBuilder);
+    chunk_rows - tabela co tyle wierszy (tryb strumieniowy), None - jedna
+    tabela na końcu. stderr idzie do pliku tymczasowego (pipe mógłby się
+    zapchać, gdy czytamy tylko stdout).
+    """
+    tshark_exe = get_tshark_exe()
+    profile = get_tshark_profile(tshark_exe)
+    if profile.decode_as is None:
+        print(f"tshark ({profile.version}): żaden z dissektorów Modbus nie działa w decode-as.")
+        return
 
+    fields = profile.usable_fields(TSHARK_FIELDS)
+    cmd = [profile.exe]
+    for p in decode_ports:
+        cmd += ["-d", f"tcp.port=={p},{profile.decode_as}"]
+    cmd += ["-r", str(pcap), "-Y", "modbus", "-T", "fields"]   # po decode-as pojawi się warstwa modbus
+    for name in fields:
+        cmd += ["-e", name]
+
+    col = {name: i for i, name in enumerate(fields)}
+    i_time = col["frame.time_epoch"]
+    i_fc = col.get("modbus.func_code")
+    i_addr = col.get("modbus.reference_num")
+    i_len = col.get("frame.len")
+    i_src, i_dst = col.get("ip.src"), col.get("ip.dst")
+    i_sport, i_dport = col.get("tcp.srcport"), col.get("tcp.dstport")
+
+    def get(parts: List[str], i: Optional[int]) -> str:
+        return parts[i].strip() if i is not None and i < len(parts) else ""
+
+    b = TableBuilder()
+    flow_ids = b.flow_ids
+    rows = 0
+
+    with tempfile.TemporaryFile() as err_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err_file, text=True)
         try:
-            t = float(parts[0])
-        except ValueError:
-            continue
+            for line in proc.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                parts = line.split("\t")
+                if len(parts) < len(fields):
+                    continue
+
+                try:
+                    t = float(parts[i_time])
+                except ValueError:
+                    continue
+
+                fc = _parse_fc(get(parts, i_fc))
+                addr_raw = get(parts, i_addr)
 
-        fc = parts[1].strip()
-        addr_raw = parts[2].strip()
-        len_raw = parts[3].strip()
-        ip_src = parts[4].strip()
-        ip_dst = parts[5].strip()
-        sport = parts[6].strip()
-        dport = parts[7].strip()
-
-        addr = -1
-        if fc == "6" and addr_raw:
-            try:
-                addr = int(addr_raw)
-            except ValueError:
                 addr = -1
+                if fc == 6 and addr_raw:
+                    try:
+                        addr = int(addr_raw)
+                    except ValueError:
+                        addr = -1
+
+                try:
+                    flen = int(get(parts, i_len))
+                except ValueError:
+                    flen = 0
+
+                key = (get(parts, i_src), get(parts, i_sport), get(parts, i_dst), get(parts, i_dport))
+                fid = flow_ids.get(key)
+                if fid is None:
+                    fid = b.new_flow(key, key[0], _parse_port(key[1]), key[2], _parse_port(key[3]))
+
+                b.ts.append(t)
+                b.fc.append(fc)
+                b.addr.append(addr)
+                b.frame_len.append(flen)
+                b.flow.append(fid)
+
+                rows += 1
+                if rows == chunk_rows:
+                    rows = 0
+                    yield b.flush()
+            proc.wait()
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:     # generator porzucony w trakcie
+                proc.kill()
+                proc.wait()
+        err_file.seek(0)
+        err = err_file.read().decode(errors="replace").strip()
+
+    if "isn't valid for layer type" in err or "Valid protocols for layer type" in err:
+        # profil nieaktualny (np. podmieniona binarka z tym samym mtime) - następne wywołanie sonduje od nowa
+        reset_tshark_profile(profile.exe, disk=True)
+        print("tshark stderr:", err)
+        return
+    if not len(b) and err:
+        # tshark może po prostu nie znaleźć modbus (np. pcap bez 1502, albo brak ruchu)
+        print("tshark stderr:", err)
+    yield b.flush()
+
+
+def _ip_str(raw: bytes, cache: Dict[bytes, str]) -> str:
+    s = cache.get(raw)
+    if s is None:
+        s = cache[raw] = socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+    return s
+
+
+def native_tables(packets: Iterator[ModbusPacket], chunk_rows: Optional[int] = None) -> Iterator[ModbusTable]:
+    """
+    Pakiety z analysis.pcap_reader -> tabele. Wiersz = pakiet domykający >= 1
+    ramkę Modbus; jak w tshark -T fields kilka PDU w pakiecie to FC_MULTI
+    (i brak jednego adresu FC6), a func_code jest bez bitu wyjątku (maska 0x7F).
+    chunk_rows jak w iter_tshark_tables.
+    """
+    b = TableBuilder()
+    flow_ids = b.flow_ids
+    ips: Dict[bytes, str] = {}
+    rows = 0
+
+    def columns():
+        return b.ts.append, b.fc.append, b.addr.append, b.frame_len.append, b.flow.append
+
+    ts_append, fc_append, addr_append, len_append, flow_append = columns()
+
+    for pkt in packets:
+        pdus = pkt.pdus
+        if len(pdus) == 1:
+            func, addr = pdus[0]
+            fc = func & 0x7F
+            if fc != 6 or func & 0x80:
+                addr = -1
+        else:
+            fc = FC_MULTI
+            addr = -1
+        fid = flow_ids.get(pkt.flow)
+        if fid is None:
+            fid = b.new_flow(pkt.flow, _ip_str(pkt.src, ips), pkt.sport, _ip_str(pkt.dst, ips), pkt.dport)
+        ts_append(pkt.ts)
+        fc_append(fc)
+        addr_append(addr)
+        len_append(pkt.frame_len)
+        flow_append(fid)
 
-        try:
-            flen = int(len_raw)
-        except ValueError:
-            flen = 0
+        rows += 1
+        if rows == chunk_rows:
+            rows = 0
+            yield b.flush()
+            ts_append, fc_append, addr_append, len_append, flow_append = columns()
 
-        flow = f"{ip_src}:{sport} -> {ip_dst}:{dport}"
+    yield b.flush()
 
-        times.append(t)
-        func_codes.append(fc)
-        fc6_addrs.append(addr)
-        frame_lens.append(flen)
-        flows.append(flow)
 
-    return times, func_codes, fc6_addrs, frame_lens, flows
+def iter_native_tables(pcap: Path, decode_ports: List[int],
+                       chunk_rows: Optional[int] = None) -> Iterator[ModbusTable]:
+    """
+    Te same kolumny co tshark, bez tshark: pcap/pcapng czytany przez mmap
+    (analysis.pcap_reader), MBAP dekodowany ze złożonego strumienia TCP.
+    """
+    with PcapFile(pcap) as f:
+        yield from native_tables(f.modbus_packets(decode_ports), chunk_rows)
 
 
-def _entropy_from_counts(counter: collections.Counter) -> float:
-    total = sum(counter.values())
-    if total == 0:
-        return 0.0
-    ent = 0.0
-    for c in counter.values():
-        p = c / total
-        ent -= p * math.log2(p)
-    return ent
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """None -> DEFAULT_BACKEND, chyba że tshark nie jest zainstalowany (wtedy native)."""
+    if backend is None:
+        backend = DEFAULT_BACKEND if tshark_available() else "native"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+    return backend
 
 
-def extract_features(pcap: Path, decode_ports: Optional[List[int]] = None) -> Dict[str, Any]:
-    decode_ports = decode_ports or DEFAULT_DECODE_PORTS
-    times, func_codes, fc6_addrs, frame_lens, flows = run_tshark(pcap, decode_ports)
+def iter_modbus_tables(pcap: Path, decode_ports: List[int], backend: Optional[str] = None,
+                       chunk_rows: Optional[int] = None) -> Iterator[ModbusTable]:
+    if resolve_backend(backend) == "native":
+        return iter_native_tables(pcap, decode_ports, chunk_rows)
+    return iter_tshark_tables(pcap, decode_ports, chunk_rows)
 
-    if not times:
-        return {"file": pcap.name, "path": str(pcap), "ok": False, "decode_ports": decode_ports}
 
-    total = len(times)
-    duration = (max(times) - min(times)) if total > 1 else 0.0
-    pkts_per_sec = (total / duration) if duration > 0 else float("inf")
+def read_modbus_table(pcap: Path, decode_ports: List[int], backend: Optional[str] = None) -> ModbusTable:
+    """Cały capture jako jedna tabela."""
+    for table in iter_modbus_tables(pcap, decode_ports, backend):
+        return table
+    return empty_table()
 
-    fc_counter = collections.Counter(func_codes)
-    fc3 = fc_counter.get("3", 0)
-    fc6 = fc_counter.get("6", 0)
 
-    fc6_addr_counts = collections.Counter(
-        addr for fc, addr in zip(func_codes, fc6_addrs) if fc == "6" and addr >= 0
-    )
-    fc6_entropy = _entropy_from_counts(fc6_addr_counts) if fc6_addr_counts else 0.0
+def run_native(pcap: Path, decode_ports: List[int]) -> ModbusTable:
+    return read_modbus_table(pcap, decode_ports, "native")
 
-    flow_counts = collections.Counter(flows)
 
-    ports_seen_dst = collections.Counter()
-    for f in flows:
-        try:
-            dport = f.split("->")[1].strip().split(":")[-1]
-            ports_seen_dst[dport] += 1
-        except Exception:
-            pass
+def run_tshark(pcap: Path, decode_ports: List[int]) -> ModbusTable:
+    return read_modbus_table(pcap, decode_ports, "tshark")
 
-    mean_len = sum(frame_lens) / len(frame_lens) if frame_lens else 0.0
-    var = (sum((x - mean_len) ** 2 for x in frame_lens) / len(frame_lens)) if frame_lens else 0.0
-    std_len = var ** 0.5
+
+def features_report(pcap: Path, decode_ports: List[int], backend: str, state: FeatureState) -> Dict[str, Any]:
+    if not state.total:
+        return {"file": pcap.name, "path": str(pcap), "ok": False, "decode_ports": decode_ports,
+                "backend": backend}
 
     return {
         "file": pcap.name,
         "path": str(pcap),
         "ok": True,
         "decode_ports": decode_ports,
-        "total_pkts": total,
-        "duration_s": duration,
-        "pkts_per_sec": pkts_per_sec,
-        "fc3_count": fc3,
-        "fc6_count": fc6,
-        "fc6_distinct_addrs": len(fc6_addr_counts),
-        "fc6_entropy": fc6_entropy,
-        "mean_frame_len": mean_len,
-        "std_frame_len": std_len,
-        "num_flows": len(flow_counts),
-        "flow_top3": flow_counts.most_common(3),
-        "ports_seen_dst": dict(ports_seen_dst),
+        "backend": backend,
+        **state.features(),
     }
 
 
-def analyze_pcap(pcap: Path) -> None:
-    feats = extract_features(pcap)
+def extract_features(pcap: Path, decode_ports: Optional[List[int]] = None,
+                     backend: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
+    """
+    stream=False: cały capture jako jedna tabela kolumnowa. stream=True: kawałki
+    po STREAM_CHUNK_ROWS wierszy wpadają do FeatureState i są zwalniane -
+    pamięć ograniczona niezależnie od rozmiaru pcap, wynik identyczny.
+    backend=None - resolve_backend().
+    """
+    decode_ports = decode_ports or DEFAULT_DECODE_PORTS
+    backend = resolve_backend(backend)
+    chunk_rows = STREAM_CHUNK_ROWS if stream else None
+
+    state = FeatureState()
+    for table in iter_modbus_tables(pcap, decode_ports, backend, chunk_rows):
+        state.update(table)
+    return features_report(pcap, decode_ports, backend, state)
+
+
+def analyze_pcap(pcap: Path, backend: Optional[str] = None, stream: bool = False) -> None:
+    print_features(pcap.name, str(pcap), extract_features(pcap, backend=backend, stream=stream))
 
-    print(f"\n=== {pcap.name} ===")
-    print(f"Ścieżka: {pcap}")
+
+def print_features(name: str, path: str, feats: Dict[str, Any]) -> None:
+    print(f"\n=== {name} ===")
+    print(f"Ścieżka: {path}")
 
     if not feats.get("ok", False):
-        print("Brak pakietów Modbus lub problem z tshark.")
+        print(f"Brak pakietów Modbus lub problem z odczytem (backend={feats.get('backend')}).")
         print(f"TIP: decode_ports={feats.get('decode_ports')}; oraz upewnij się że dumpcap łapie 1502 (BPF: tcp port 502 or tcp port 1502).")
         return
 
@@ -265,21 +363,45 @@ def choose_files_interactive(files: List[Path]) -> List[Path]:
 
 
 def main(argv: List[str]) -> None:
-    if len(argv) > 1:
-        for arg in argv[1:]:
-            pcap = Path(arg)
+    ap = argparse.ArgumentParser(description="Quick Modbus/TCP statistics for pcap/pcapng files")
+    ap.add_argument("pcaps", nargs="*", type=Path, help="bez plików - wybór z capture/pcap")
+    ap.add_argument("--backend", choices=BACKENDS, default=None,
+                    help=f"domyślnie {DEFAULT_BACKEND}, bez tshark w systemie native")
+    ap.add_argument("--stream", action="store_true",
+                    help="stała pamięć: kawałki po %d wierszy zamiast całej tabeli" % STREAM_CHUNK_ROWS)
+    ap.add_argument("--workers", type=int, default=None,
+                    help="procesy analizy (analysis.parallel_stats), domyślnie os.cpu_count(); 1 = po kolei")
+    args = ap.parse_args(argv[1:])
+
+    if args.pcaps:
+        chosen = []
+        for pcap in args.pcaps:
             if not pcap.exists():
                 print(f"\n=== {pcap} ===")
                 print("Plik nie istnieje, pomijam.")
                 continue
-            analyze_pcap(pcap)
+            chosen.append(pcap)
+    else:
+        pcap_dir = find_pcap_dir()
+        files = list_pcaps(pcap_dir)
+        chosen = choose_files_interactive(files)
+
+    if args.workers == 1:
+        for p in chosen:
+            analyze_pcap(p, args.backend, args.stream)
+        return
+    if not chosen:
         return
 
-    pcap_dir = find_pcap_dir()
-    files = list_pcaps(pcap_dir)
-    chosen = choose_files_interactive(files)
-    for p in chosen:
-        analyze_pcap(p)
+    from analysis.parallel_stats import analyze_many    # parallel_stats importuje ten moduł
+
+    report = analyze_many(chosen, backend=args.backend, workers=args.workers)
+    for feats in report["files"]:
+        print_features(feats["file"], feats["path"], feats)
+    for s in report["sessions"]:
+        if len(s["files"]) > 1:     # segmenty ring buffera jednej sesji - raport scalony
+            print_features(f"{s['session']} (sesja, plików: {len(s['files'])})", ", ".join(s["files"]), s)
+    print(f"\n{report['tasks']} tasks on {report['workers']} workers: {report['wall_s']:.2f} s")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+# analysis/tshark_profile.py
+"""
+Profil możliwości tshark: jaka nazwa protokołu działa w decode-as
+(-d tcp.port==N,<proto> - zależnie od wersji mbtcp / modbus.tcp / modbus)
+i które pola -e ta wersja zna.
+
+Sondowanie jest tanie - tshark czyta pusty pcap (sam nagłówek), więc nie
+zależy od rozmiaru analizowanego capture - i robione raz na binarkę:
+profil trafia do pliku JSON (PROFILE_PATH, albo env TSHARK_PROFILE_PATH),
+klucz = ścieżka binarki, ważność = rozmiar + mtime pliku (aktualizacja
+Wiresharka unieważnia wpis). W procesie dodatkowo cache w pamięci, więc
+każde kolejne extract_features / wywołanie API to dokładnie jedna dysekcja.
+"""
+
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+PROFILE_PATH = BASE_DIR / "analysis" / ".tshark_profile.json"
+
+TSHARK_FIXED_PATH = r"C:\Program Files\Wireshark\tshark.exe"
+
+# kandydaci decode-as w kolejności prób
+DECODE_AS_CANDIDATES = ("mbtcp", "modbus.tcp", "modbus")
+
+# pola używane przez analysis/* i api/* (sprawdzane w jednym uruchomieniu)
+PROFILE_FIELDS = (
+    "frame.time_epoch", "frame.len",
+    "ip.src", "ip.dst", "ipv6.src", "ipv6.dst",
+    "tcp.srcport", "tcp.dstport", "tcp.stream",
+    "mbtcp.trans_id", "mbtcp.unit_id",
+    "modbus.func_code", "modbus.reference_num", "modbus.word_cnt",
+    "modbus.exception_code", "modbus.regval_uint16",
+)
+
+PROBE_TIMEOUT_S = 30.0
+_DECODE_AS_ERRORS = ("isn't valid for layer type", "Valid protocols for layer type")
+
+
+def get_tshark_exe() -> str:
+    exe = shutil.which("tshark")
+    return exe if exe else TSHARK_FIXED_PATH
+
+
+def tshark_available(exe: Optional[str] = None) -> bool:
+    return os.path.isfile(exe or get_tshark_exe())
+
+
+@dataclass
+class TsharkProfile:
+    exe: str
+    version: str
+    signature: str                   # rozmiar:mtime binarki
+    decode_as: Optional[str]         # None = żaden kandydat nie przeszedł
+    fields: Dict[str, bool] = field(default_factory=dict)
+    probed_at: float = 0.0
+
+    def supports(self, name: str) -> bool:
+        # pole spoza PROFILE_FIELDS - nie wiemy, zakładamy że jest
+        return self.fields.get(name, True)
+
+    def usable_fields(self, names: Sequence[str]) -> List[str]:
+        return [n for n in names if self.supports(n)]
+
+
+def _signature(exe: str) -> Optional[str]:
+    try:
+        st = Path(exe).stat()
+    except OSError:
+        return None
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+
+def _run(cmd: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT_S)
+
+
+def _empty_pcap(directory: str) -> str:
+    path = os.path.join(directory, "empty.pcap")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+    return path
+
+
+def _invalid_fields(stderr: str) -> List[str]:
+    """tshark: 'Some fields aren't valid:' + po jednym polu w wierszu (wcięte)."""
+    out: List[str] = []
+    collecting = False
+    for line in stderr.splitlines():
+        if "fields aren't valid" in line or "field isn't valid" in line:
+            collecting = True
+            continue
+        if collecting:
+            name = line.strip()
+            if not name:
+                break
+            out.append(name)
+    return out
+
+
+def probe_tshark(exe: str, port: int = 502) -> TsharkProfile:
+    """Sondowanie na pustym pcap: wersja, działający decode-as, obsługiwane pola."""
+    sig = _signature(exe) or ""
+    ver = _run([exe, "--version"])
+    version = (ver.stdout.splitlines() or ["?"])[0].strip()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        empty = _empty_pcap(tmp)
+        decode_as = None
+        for proto in DECODE_AS_CANDIDATES:
+            res = _run([exe, "-r", empty, "-d", f"tcp.port=={port},{proto}", "-T", "fields", "-e", "frame.number"])
+            if any(e in res.stderr for e in _DECODE_AS_ERRORS):
+                continue
+            decode_as = proto
+            break
+
+        cmd = [exe, "-r", empty, "-T", "fields"]
+        if decode_as:
+            cmd += ["-d", f"tcp.port=={port},{decode_as}"]
+        for name in PROFILE_FIELDS:
+            cmd += ["-e", name]
+        invalid = set(_invalid_fields(_run(cmd).stderr))
+
+    profile = TsharkProfile(
+        exe=exe,
+        version=version,
+        signature=sig,
+        decode_as=decode_as,
+        fields={name: name not in invalid for name in PROFILE_FIELDS},
+        probed_at=time.time(),
+    )
+    log.info("tshark profile: %s (%s) decode-as=%s, unsupported fields=%s",
+             exe, version, decode_as, sorted(invalid) or "-")
+    return profile
+
+
+# ----------------------------
+# Cache: pamięć procesu + plik
+# ----------------------------
+
+_PROFILE_CACHE: Dict[str, TsharkProfile] = {}
+_PROFILE_LOCK = threading.Lock()
+
+
+def _profile_path() -> Path:
+    env = os.environ.get("TSHARK_PROFILE_PATH")
+    return Path(env) if env else PROFILE_PATH
+
+
+def _load_disk() -> Dict[str, dict]:
+    path = _profile_path()
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_disk(profile: TsharkProfile) -> None:
+    path = _profile_path()
+    data = _load_disk()
+    data[profile.exe] = asdict(profile)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("Cannot write tshark profile cache %s: %r", path, e)
+
+
+def get_tshark_profile(exe: Optional[str] = None) -> TsharkProfile:
+    """
+    Profil dla binarki (domyślnie get_tshark_exe()). Kolejność: pamięć procesu,
+    plik (gdy sygnatura binarki się zgadza), sondowanie. Brak tshark -> FileNotFoundError.
+    """
+    exe = exe or get_tshark_exe()
+    exe = shutil.which(exe) or exe
+    with _PROFILE_LOCK:
+        sig = _signature(exe)
+        cached = _PROFILE_CACHE.get(exe)
+        if cached is not None and cached.signature == sig:
+            return cached
+
+        raw = _load_disk().get(exe)
+        if raw and raw.get("signature") == sig:
+            try:
+                profile = TsharkProfile(**raw)
+            except TypeError:
+                profile = None      # stary format pliku - sondujemy od nowa
+            if profile is not None:
+                _PROFILE_CACHE[exe] = profile
+                return profile
+
+        if sig is None and not shutil.which(exe):
+            raise FileNotFoundError(f"tshark not found: {exe}")
+        profile = probe_tshark(exe)
+        _PROFILE_CACHE[exe] = profile
+        _save_disk(profile)
+        return profile
+
+
+def reset_tshark_profile(exe: Optional[str] = None, disk: bool = False) -> None:
+    """Unieważnia profil (jednej binarki albo wszystkie); disk=True usuwa też wpis z pliku."""
+    with _PROFILE_LOCK:
+        if exe is None:
+            _PROFILE_CACHE.clear()
+        else:
+            _PROFILE_CACHE.pop(exe, None)
+        if not disk:
+            return
+        if exe is None:
+            try:
+                _profile_path().unlink()
+            except OSError:
+                pass
+            return
+        data = _load_disk()
+        if data.pop(exe, None) is not None:
+            try:
+                _profile_path().write_text(json.dumps(data, indent=2), encoding="utf-8")
+            except OSError:
+                pass
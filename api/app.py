@@ -49,7 +49,21 @@ def health():
 @app.post("/scenario/start", response_model=ScenarioStatus)
 def start(req: StartScenarioRequest):
     try:
-        return runner.start(req.name)
+        return runner.start(
+            req.name,
+            engine=req.engine,
+            hmi_count=req.hmi_count,
+            normal_count=req.normal_count,
+            fleet=req.fleet,
+            plcs_per_process=req.plcs_per_process,
+            simulate_plc=req.simulate_plc,
+            sim_service_delay_ms=req.sim_service_delay_ms,
+            proxy_mode=req.proxy_mode,
+            proxy_workers=req.proxy_workers,
+            proxy_upstreams=req.proxy_upstreams,
+            proxy_shield_ttl_ms=req.proxy_shield_ttl_ms,
+            proxy_txlog=req.proxy_txlog,
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -83,7 +97,7 @@ def quick_stats(pcap_name: str):
     if not p.exists():
         raise HTTPException(status_code=404, detail="pcap not found")
 
-    feats = extract_features(p)
+    feats = extract_features(p, stream=True)    # stała pamięć niezależnie od rozmiaru pcap
     if not feats.get("ok", False):
         return QuickStatsResponse(ok=False, file=pcap_name, path=str(p), features=feats)
 
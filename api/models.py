@@ -4,7 +4,18 @@ from typing import Optional, Dict, Any, List
 
 class StartScenarioRequest(BaseModel):
     name: str  # "baseline" | "baseline_proxy_spoof" | ...
-    # w przyszłości: parametry scenariuszy
+    engine: str = "threads"  # "threads" | "asyncio"
+    hmi_count: int = 1
+    normal_count: int = 1
+    fleet: bool = False  # scenariusz dla całej floty PLC (config: fleet)
+    plcs_per_process: int = 4
+    simulate_plc: bool = False  # wbudowany symulator PLC zamiast OpenPLC
+    sim_service_delay_ms: float = 0.0
+    proxy_mode: str = "asyncio"  # "asyncio" | "threads" | "processes" | "mux"
+    proxy_workers: int = 0  # dla proxy_mode="processes"; 0 = liczba CPU
+    proxy_upstreams: int = 2  # dla proxy_mode="mux": połączenia do PLC współdzielone przez klientów
+    proxy_shield_ttl_ms: float = 0.0  # > 0: shield mode (cache odczytów FC3/FC4, tylko proxy_mode="mux")
+    proxy_txlog: bool = False  # binarny log transakcji proxy w <pcap>.txlog/
 
 
 class ScenarioStatus(BaseModel):
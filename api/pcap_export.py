@@ -1,22 +1,22 @@
 import json
-import shutil
 import subprocess
 from pathlib import Path
 from typing import Optional
 
-TSHARK_FIXED_PATH = r"C:\Program Files\Wireshark\tshark.exe"
-
-def _get_tshark_exe() -> str:
-    exe = shutil.which("tshark")
-    return exe if exe else TSHARK_FIXED_PATH
+from analysis.quick_modbus_stats import DEFAULT_DECODE_PORTS
+from analysis.tshark_profile import get_tshark_profile
 
 def pcap_to_json(pcap_path: Path, out_path: Optional[Path] = None) -> str:
     """
     Zwraca JSON jako string (albo zapisuje do pliku, jeśli out_path podane).
+    decode-as z profilu tshark (sondowany raz) - bez niego ruch na 1502 nie ma warstwy modbus.
     """
-    tshark = _get_tshark_exe()
-    cmd = [
-        tshark,
+    profile = get_tshark_profile()
+    cmd = [profile.exe]
+    if profile.decode_as:
+        for port in DEFAULT_DECODE_PORTS:
+            cmd += ["-d", f"tcp.port=={port},{profile.decode_as}"]
+    cmd += [
         "-r", str(pcap_path),
         "-T", "json",
         "-j", "frame ip tcp modbus",
@@ -1,33 +1,32 @@
+import logging
 import time
 import threading
 from dataclasses import replace
+from pathlib import Path
 from typing import Optional, List, Dict, Any
 
-from injector.core.config import get_plc_config
-from injector.traffic.hmi_master import run_hmi_loop
-from injector.traffic.normal_client import run_normal_client
-from injector.attacks.scan_readonly import run_scan_readonly
-from injector.attacks.write_injection import run_write_injection
-from injector.attacks.mass_overwrite import run_spoofing
-from injector.attacks.modbus_proxy_spoof import run_modbus_proxy
+from injector.core.config import get_plc_config, get_fleet_config
+from injector.core.modbus import get_connection_pool, close_connection_pool
+from injector.core.scheduler import get_scheduler
+from injector.core.metrics import get_metrics
+from injector.core.txlog import get_txlog
+from injector.attacks.modbus_proxy_spoof import run_modbus_proxy, get_txn_counters, PROXY_MODES
+from injector.attacks.proxy_multi import ProxySupervisor
+from injector.attacks.proxy_stats import get_proxy_stats
+from injector.traffic.async_engine import AsyncTrafficEngine
+from injector.traffic.scenarios import SCENARIOS, ENGINES, scenario_masters, launch_masters
+from injector.traffic.fleet import FleetLauncher
+from injector.sim.plc_sim import PlcSimulator, SIM_DEFAULT_HOST, SIM_DEFAULT_PORT
 
-from capture.core.capture_control import start_capture, stop_capture
+from capture.core.capture_control import MODBUS_PORTS, bpf_for_ports, start_capture, stop_capture
 
-
-def _make_thread(name: str, target, *, cfg, stop_event: threading.Event, **kwargs) -> threading.Thread:
-    t = threading.Thread(
-        name=name,
-        target=target,
-        kwargs={"cfg": cfg, "stop_event": stop_event, **kwargs},
-        daemon=True,
-    )
-    t.start()
-    return t
+log = logging.getLogger(__name__)
 
 
 class ScenarioRunner:
     def __init__(self):
-        self._lock = threading.Lock()
+        # RLock: start()/stop() zwracają self.status(), które też bierze lock
+        self._lock = threading.RLock()
         self._stop_event: Optional[threading.Event] = None
         self._threads: List[threading.Thread] = []
         self._scenario: Optional[str] = None
@@ -35,88 +34,189 @@ class ScenarioRunner:
         self._pcap_path: Optional[str] = None
         self._capture_pid: Optional[int] = None
         self._details: Dict[str, Any] = {}
+        self._engine: Optional[AsyncTrafficEngine] = None
+        self._fleet: Optional[FleetLauncher] = None
+        self._sim: Optional[PlcSimulator] = None
+        self._proxy: Optional[ProxySupervisor] = None
 
     def status(self) -> Dict[str, Any]:
         with self._lock:
+            details = {
+                **self._details,
+                "modbus_pool": get_connection_pool().stats(),
+                "schedulers": get_scheduler().report(),
+                "metrics": get_metrics().report(),
+            }
+            if self._engine is not None:
+                details["async_engine"] = self._engine.status()
+            if self._fleet is not None:
+                details["fleet"] = self._fleet.status()
+            if self._sim is not None:
+                details["plc_sim"] = self._sim.stats()
+            if self._proxy is not None:
+                details["proxy"] = {**details.get("proxy", {}), **self._proxy.stats()}
+            elif "proxy" in details:
+                details["proxy"] = {
+                    **details["proxy"],
+                    "transactions": get_txn_counters().snapshot(),
+                    "traffic": get_proxy_stats().snapshot(),
+                }
+                txlog = get_txlog()
+                if txlog is not None:
+                    details["proxy"]["txlog"] = txlog.stats()
             return {
                 "running": self._stop_event is not None and not self._stop_event.is_set(),
                 "scenario": self._scenario,
                 "started_at_epoch": self._started_at,
                 "pcap_path": self._pcap_path,
                 "capture_pid": self._capture_pid,
-                "details": dict(self._details),
+                "details": details,
             }
 
-    def start(self, name: str) -> Dict[str, Any]:
+    def start(
+        self,
+        name: str,
+        engine: str = "threads",
+        hmi_count: int = 1,
+        normal_count: int = 1,
+        fleet: bool = False,
+        plcs_per_process: int = 4,
+        simulate_plc: bool = False,
+        sim_service_delay_ms: float = 0.0,
+        proxy_mode: str = "asyncio",
+        proxy_workers: int = 0,
+        proxy_upstreams: int = 2,
+        proxy_shield_ttl_ms: float = 0.0,
+        proxy_txlog: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        engine="threads"  -> jeden wątek OS na generator (klasycznie),
+        engine="asyncio"  -> wszystkie generatory jako coroutines w AsyncTrafficEngine;
+        hmi_count / normal_count pozwalają zasymulować wiele HMI / klientów naraz.
+        fleet=True -> scenariusz dla każdego PLC z get_fleet_config(), shardowany
+        na procesy po plcs_per_process PLC.
+        simulate_plc=True -> wbudowany PlcSimulator na SIM_DEFAULT_PORT zamiast
+        prawdziwego PLC (wszystkie PLC floty wskazują na symulator).
+        proxy_mode / proxy_workers -> tryb run_modbus_proxy dla baseline_proxy_spoof;
+        "processes" = proxy_workers procesów z SO_REUSEPORT (0 = liczba CPU),
+        "mux" = klienci dzielą proxy_upstreams połączeń do PLC;
+        proxy_shield_ttl_ms > 0 (tylko "mux") -> odczyty FC3/FC4 z cache proxy.
+        proxy_txlog=True -> proxy pisze binarny log transakcji do <pcap>.txlog/.
+        """
         with self._lock:
             if self._stop_event is not None and not self._stop_event.is_set():
                 raise RuntimeError("Scenario already running. Stop it first.")
 
+            if name not in SCENARIOS:
+                raise ValueError(f"Unknown scenario name: {name}")
+            if engine not in ENGINES:
+                raise ValueError(f"Unknown engine: {engine}")
+            if fleet and name == "baseline_proxy_spoof":
+                raise ValueError("Proxy scenario is not supported in fleet mode")
+            if proxy_mode not in PROXY_MODES:
+                raise ValueError(f"Unknown proxy mode: {proxy_mode}")
+            if proxy_shield_ttl_ms > 0 and proxy_mode != "mux":
+                raise ValueError("Shield mode requires proxy_mode='mux'")
+
             cfg_real = get_plc_config()
+            fleet_cfgs = get_fleet_config() if fleet else []
             stop_event = threading.Event()
             threads: List[threading.Thread] = []
             details: Dict[str, Any] = {}
 
-            # START CAPTURE (label = name)
-            pcap_path = start_capture(label=name)
-            details["capture_label"] = name
-
-            # scenariusze
-            if name == "baseline":
-                threads.append(_make_thread("HMI", run_hmi_loop, cfg=cfg_real, stop_event=stop_event))
-                threads.append(_make_thread("NORMAL", run_normal_client, cfg=cfg_real, stop_event=stop_event))
-
-            elif name == "baseline_ro_scan":
-                threads.append(_make_thread("HMI", run_hmi_loop, cfg=cfg_real, stop_event=stop_event))
-                threads.append(_make_thread("NORMAL", run_normal_client, cfg=cfg_real, stop_event=stop_event))
-                threads.append(_make_thread(
-                    "SCAN_RO", run_scan_readonly,
-                    cfg=cfg_real, stop_event=stop_event,
-                    start_addr=0, end_addr=200, block_size=10, delay_s=0.01
-                ))
-
-            elif name == "baseline_write_inj":
-                threads.append(_make_thread("HMI", run_hmi_loop, cfg=cfg_real, stop_event=stop_event))
-                threads.append(_make_thread("NORMAL", run_normal_client, cfg=cfg_real, stop_event=stop_event))
-                threads.append(_make_thread(
-                    "WRITE_INJ", run_write_injection,
-                    cfg=cfg_real, stop_event=stop_event,
-                    target_register=2, qps=10.0
-                ))
-
-            elif name == "mass_overwrite_only":
-                threads.append(_make_thread(
-                    "MASS_OVERWRITE", run_spoofing,
-                    cfg=cfg_real, stop_event=stop_event,
-                    target_registers=list(range(10, 20)), qps=20.0, min_value=0, max_value=1000
-                ))
-
-            elif name == "baseline_proxy_spoof":
-                proxy_ready = threading.Event()
-                proxy_t = threading.Thread(
-                    name="PROXY",
-                    target=run_modbus_proxy,
-                    kwargs={
-                        "cfg": cfg_real,
-                        "stop_event": stop_event,
-                        "listen_host": cfg_real.proxy_host,
-                        "listen_port": cfg_real.proxy_port,
-                        "ready_event": proxy_ready,
-                    },
-                    daemon=True,
-                )
-                proxy_t.start()
-                proxy_ready.wait(timeout=2.0)
-
-                cfg_proxy = replace(cfg_real, proxy_enabled=True)
-                threads.append(proxy_t)
-                threads.append(_make_thread("HMI", run_hmi_loop, cfg=cfg_proxy, stop_event=stop_event))
-                threads.append(_make_thread("NORMAL", run_normal_client, cfg=cfg_proxy, stop_event=stop_event))
-                details["proxy"] = {"host": cfg_real.proxy_host, "port": cfg_real.proxy_port}
-
-            else:
-                stop_capture()
-                raise ValueError(f"Unknown scenario name: {name}")
+            self._sim = None
+            self._proxy = None
+            self._engine = None
+            self._fleet = None
+            capture_ports = list(MODBUS_PORTS)
+            capture_started = False
+            try:
+                if simulate_plc:
+                    self._sim = PlcSimulator(
+                        SIM_DEFAULT_HOST, SIM_DEFAULT_PORT, service_delay_s=sim_service_delay_ms / 1000.0
+                    )
+                    sim_ready = threading.Event()
+                    sim_t = threading.Thread(
+                        name="PLC_SIM",
+                        target=self._sim.run,
+                        kwargs={"stop_event": stop_event, "ready_event": sim_ready},
+                        daemon=True,
+                    )
+                    sim_t.start()
+                    threads.append(sim_t)
+                    if not sim_ready.wait(timeout=2.0):
+                        raise RuntimeError("PLC simulator did not start")
+
+                    sim_target = {"plc_host": SIM_DEFAULT_HOST, "plc_port": SIM_DEFAULT_PORT}
+                    cfg_real = replace(cfg_real, **sim_target)
+                    fleet_cfgs = [replace(c, **sim_target) for c in fleet_cfgs]
+                    # symulator nie słucha na 502/1502 - bez tego pcap byłby pusty
+                    capture_ports.append(SIM_DEFAULT_PORT)
+
+                # START CAPTURE (label = name)
+                pcap_path = start_capture(label=name, bpf=bpf_for_ports(capture_ports))
+                capture_started = True
+                details["capture_label"] = name
+                details["capture_ports"] = capture_ports
+
+                # scenariusze
+                cfg_masters = cfg_real
+                if name == "baseline_proxy_spoof":
+                    proxy_ready = threading.Event()
+                    txlog_dir = f"{pcap_path}.txlog" if proxy_txlog else None
+                    if proxy_mode == "processes":
+                        # obiekt trzymamy w runnerze - status() scala statystyki workerów
+                        self._proxy = ProxySupervisor(
+                            cfg_real, cfg_real.proxy_host, cfg_real.proxy_port, workers=proxy_workers,
+                            txlog_dir=txlog_dir,
+                        )
+                        proxy_target, proxy_kwargs = self._proxy.run, {}
+                    else:
+                        proxy_target = run_modbus_proxy
+                        proxy_kwargs = {
+                            "cfg": cfg_real,
+                            "listen_host": cfg_real.proxy_host,
+                            "listen_port": cfg_real.proxy_port,
+                            "mode": proxy_mode,
+                            "upstreams": proxy_upstreams,
+                            "shield_ttl_ms": proxy_shield_ttl_ms,
+                            "txlog_dir": txlog_dir,
+                        }
+                    proxy_t = threading.Thread(
+                        name="PROXY",
+                        target=proxy_target,
+                        kwargs={**proxy_kwargs, "stop_event": stop_event, "ready_event": proxy_ready},
+                        daemon=True,
+                    )
+                    proxy_t.start()
+                    threads.append(proxy_t)
+                    proxy_ready.wait(timeout=2.0 if self._proxy is None else 15.0)
+
+                    cfg_masters = replace(cfg_real, proxy_enabled=True)
+                    details["proxy"] = {"host": cfg_real.proxy_host, "port": cfg_real.proxy_port}
+
+                details["engine"] = engine
+                get_scheduler().clear()
+                get_metrics().reset()
+                get_txn_counters().reset()
+                get_proxy_stats().reset()
+
+                if fleet:
+                    self._fleet = FleetLauncher(
+                        name, fleet_cfgs,
+                        plcs_per_process=plcs_per_process, engine=engine,
+                        hmi_count=hmi_count, normal_count=normal_count,
+                    )
+                    self._fleet.start()
+                else:
+                    masters = scenario_masters(name, cfg_masters, hmi_count=hmi_count, normal_count=normal_count)
+                    master_threads, self._engine = launch_masters(
+                        [(cfg_masters, m) for m in masters], stop_event, engine
+                    )
+                    threads.extend(master_threads)
+            except BaseException:
+                self._abort_start(stop_event, threads, capture_started)
+                raise
 
             self._stop_event = stop_event
             self._threads = threads
@@ -128,16 +228,52 @@ class ScenarioRunner:
 
             return self.status()
 
+    def _abort_start(self, stop_event: threading.Event, threads: List[threading.Thread],
+                     capture_started: bool) -> None:
+        """Sprzątanie po nieudanym start(): zatrzymuje to, co zdążyło wystartować."""
+        stop_event.set()
+        if self._fleet is not None:
+            self._fleet.stop()
+        if self._proxy is not None:
+            self._proxy.stop()
+        for t in threads:
+            t.join(timeout=2.0)
+        if capture_started:
+            try:
+                stop_capture()
+            except OSError as e:
+                log.warning("Could not stop capture after failed start: %s", e)
+        self._sim = None
+        self._proxy = None
+        self._engine = None
+        self._fleet = None
+
     def stop(self) -> Dict[str, Any]:
         with self._lock:
             if self._stop_event is None or self._stop_event.is_set():
                 return self.status()
 
             self._stop_event.set()
+            if self._fleet is not None:
+                self._fleet.stop()
+            if self._proxy is not None:
+                self._proxy.stop()
             for t in self._threads:
                 t.join(timeout=2.0)
 
+            close_connection_pool()
+
             pid = stop_capture()
             self._capture_pid = pid
 
+            # histogramy opóźnień obok pcapa: <pcap>.metrics.json
+            if self._pcap_path:
+                try:
+                    # we flocie histogramy są w procesach shardów - ich podsumowania są w fleet.status()
+                    extra = {"fleet": self._fleet.status()} if self._fleet is not None else None
+                    path = get_metrics().dump(Path(self._pcap_path).with_suffix(".metrics.json"), extra=extra)
+                    self._details["metrics_path"] = str(path)
+                except OSError as e:
+                    log.warning("Could not write metrics dump: %s", e)
+
             return self.status()
@@ -0,0 +1,163 @@
+# bench/bench_analysis.py
+#
+# Czas i pamięć analizy offline:
+#   - analysis.quick_modbus_stats.extract_features na syntetycznych pcapach (10k .. 10M pakietów),
+#     backend native (mmap) i tshark (gdy zainstalowany) + zgodność cech między nimi,
+#     oba także w trybie strumieniowym (stream=True: stała pamięć, wynik identyczny z batch),
+#   - features.feature_modbus.window_features na dużych DataFrame'ach.
+#
+#   python -m bench.bench_analysis
+#   python -m bench.bench_analysis --pcap-sizes 10000 1000000 10000000 --frame-sizes 1000000
+#   python -m bench.bench_analysis --backends native
+#
+# Pamięć: tracemalloc (szczyt alokacji Pythona) + maxrss procesów potomnych (tshark), gdzie dostępne.
+# Czas mierzony w osobnym przebiegu bez tracemalloc (spowalnia kod Pythona kilkukrotnie,
+# a tshark liczy w podprocesie - porównanie backendów byłoby nieuczciwe).
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from analysis.quick_modbus_stats import BACKENDS
+from bench.common import RESULTS_DIR, write_results, write_synthetic_pcap
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+PCAP_CACHE_DIR = RESULTS_DIR / "pcaps"
+
+
+def _children_maxrss_kb() -> int:
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def _measure(fn: Callable[[], Any], trace_memory: bool = True) -> Tuple[Any, Dict[str, Any]]:
+    t0 = time.perf_counter()
+    result = fn()
+    out: Dict[str, Any] = {"seconds": time.perf_counter() - t0}
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            fn()
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        out["py_peak_mb"] = peak / 2**20
+    return result, out
+
+
+def synthetic_pcap(n_packets: int) -> Path:
+    path = PCAP_CACHE_DIR / f"synthetic_{n_packets}.pcap"
+    if not path.exists():
+        write_synthetic_pcap(path, n_packets)
+    return path
+
+
+# cechy porównywane między backendami (flow_top3 / ports_seen_dst zależą od formatowania tshark)
+_COMPARED_FEATURES = ("total_pkts", "fc3_count", "fc6_count", "fc6_distinct_addrs", "num_flows")
+
+
+def bench_extract_features(sizes: List[int], backends: List[str], trace_memory: bool = True) -> Dict[str, Any]:
+    from analysis.quick_modbus_stats import extract_features
+
+    out: Dict[str, Any] = {}
+    for n in sizes:
+        pcap = synthetic_pcap(n)
+        per_backend: Dict[str, Any] = {}
+        feats_by_backend: Dict[str, Dict[str, Any]] = {}
+        for backend in backends:
+            try:
+                feats, m = _measure(lambda: extract_features(pcap, backend=backend), trace_memory)
+                feats_s, m_s = _measure(lambda: extract_features(pcap, backend=backend, stream=True), trace_memory)
+            except (OSError, FileNotFoundError) as e:
+                per_backend[backend] = {"skipped": f"extract_features failed: {e!r}"}
+                continue
+            for mode, f, mm in (("batch", feats, m), ("stream", feats_s, m_s)):
+                if backend == "tshark":
+                    mm["children_maxrss_mb"] = _children_maxrss_kb() / 1024
+                mm["ok"] = bool(f.get("ok"))
+                mm["total_pkts"] = f.get("total_pkts", 0)
+                mm["pkts_per_s"] = n / mm["seconds"] if mm["seconds"] > 0 else 0.0
+            m["pcap_mb"] = pcap.stat().st_size / 2**20
+            m["stream"] = m_s
+            m["stream_identical"] = feats_s == feats
+            per_backend[backend] = m
+            feats_by_backend[backend] = feats
+        if len(feats_by_backend) > 1:
+            ref, *rest = feats_by_backend.values()
+            per_backend["features_agree"] = all(
+                f.get(k) == ref.get(k) for f in rest for k in _COMPARED_FEATURES
+            )
+        if "native" in feats_by_backend and "tshark" in feats_by_backend:
+            native_s = per_backend["native"]["seconds"]
+            per_backend["speedup_native"] = per_backend["tshark"]["seconds"] / native_s if native_s > 0 else None
+        out[str(n)] = per_backend
+    return out
+
+
+def _synthetic_frame(n_rows: int):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "ts": 1_700_000_000 + np.sort(rng.uniform(0, n_rows / 1000.0, n_rows)),
+        "src": rng.choice(["10.0.0.1", "10.0.0.2", "10.0.0.3"], n_rows),
+        "sport": rng.integers(40000, 40010, n_rows),
+        "dst": rng.choice(["10.0.0.1", "10.0.0.2"], n_rows),
+        "dport": 502,
+        "fc": rng.choice([1, 3, 5, 6, 15, 16], n_rows, p=[0.05, 0.6, 0.05, 0.2, 0.05, 0.05]),
+        "addr": rng.integers(0, 200, n_rows),
+        "exc": (rng.random(n_rows) < 0.01) * 2,
+        "len": rng.integers(60, 300, n_rows),
+    })
+
+
+def bench_window_features(sizes: List[int], window_s: float = 1.0, trace_memory: bool = True) -> Dict[str, Any]:
+    try:
+        from features.feature_modbus import window_features
+        frames = {n: _synthetic_frame(n) for n in sizes}
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e}"}
+
+    out: Dict[str, Any] = {}
+    for n, df in frames.items():
+        feats, m = _measure(lambda: window_features(df, window_s=window_s), trace_memory)
+        m["windows"] = len(feats)
+        m["rows_per_s"] = n / m["seconds"] if m["seconds"] > 0 else 0.0
+        out[str(n)] = m
+    return out
+
+
+def run(pcap_sizes: List[int], frame_sizes: List[int], backends: List[str],
+        trace_memory: bool = True) -> Dict[str, Any]:
+    return {
+        "extract_features": bench_extract_features(pcap_sizes, backends, trace_memory),
+        "window_features": bench_window_features(frame_sizes, trace_memory=trace_memory),
+    }
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Offline analysis time / memory")
+    ap.add_argument("--pcap-sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--frame-sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    ap.add_argument("--no-memory", action="store_true", help="bez przebiegu z tracemalloc (duże pliki)")
+    ap.add_argument("--json", type=Path, default=None, help="plik wyniku (domyślnie bench/results/)")
+    args = ap.parse_args(argv)
+
+    res = run(args.pcap_sizes, args.frame_sizes, args.backends, trace_memory=not args.no_memory)
+    print(json.dumps(res, indent=2))
+    print("->", write_results("analysis", res, args.json))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+# bench/bench_generators.py
+#
+# Maksymalne utrzymywalne tempo generatorów (run_scan_readonly, run_write_injection)
+# przeciwko lokalnemu PlcSimulator: qps bez limitu (rate 0), różne pipeline_window.
+#
+#   python -m bench.bench_generators
+#   python -m bench.bench_generators --duration 10 --windows 0 8 32 --json bench/results/gen.json
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from bench.common import local_plc, write_results
+from injector.attacks.scan_readonly import run_scan_readonly
+from injector.attacks.write_injection import run_write_injection
+from injector.core.metrics import get_metrics
+from injector.core.modbus import close_connection_pool
+from injector.core.scheduler import get_scheduler
+
+
+def _run_generator(name: str, target: Callable[..., None], kwargs: Dict[str, Any], duration_s: float) -> Dict[str, Any]:
+    stop = threading.Event()
+    t = threading.Thread(name=name, target=target, kwargs={**kwargs, "stop_event": stop}, daemon=True)
+    t.start()
+    time.sleep(duration_s)
+    stop.set()
+    t.join(timeout=5.0)
+    close_connection_pool()
+
+    sched = get_scheduler().report()["generators"].get(name, {})
+    series = [s for s in get_metrics().report()["series"] if s["generator"] == name]
+    ok = sum(s["ok"] for s in series)
+    return {
+        "achieved_qps": sched.get("achieved_qps", 0.0),
+        "completed_qps": ok / duration_s,
+        "ok": ok,
+        "errors": sum(s["errors"] for s in series),
+        "timeouts": sum(s["timeouts"] for s in series),
+        "latency": series[0]["latency"] if len(series) == 1 else {},
+    }
+
+
+def run(duration_s: float, windows: List[int], service_delay_s: float = 0.0) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"duration_s": duration_s, "service_delay_s": service_delay_s}
+    with local_plc(service_delay_s) as cfg:
+        for window in windows:
+            get_scheduler().clear()
+            get_metrics().reset()
+            out[f"write_injection_w{window}"] = _run_generator(
+                f"BENCH_WRITE_W{window}", run_write_injection,
+                {"cfg": cfg, "qps": 0.0, "pipeline_window": window}, duration_s,
+            )
+            out[f"scan_readonly_w{window}"] = _run_generator(
+                f"BENCH_SCAN_W{window}", run_scan_readonly,
+                {"cfg": cfg, "delay_s": 0.0, "end_addr": 999, "block_size": 10, "pipeline_window": window},
+                duration_s,
+            )
+    return out
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Max sustained qps of traffic generators")
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--windows", type=int, nargs="+", default=[0, 8, 32],
+                    help="pipeline_window (0 = klasyczny klient, jedno żądanie w locie)")
+    ap.add_argument("--delay-ms", type=float, default=0.0, help="czas obsługi żądania w symulatorze")
+    ap.add_argument("--json", type=Path, default=None, help="plik wyniku (domyślnie bench/results/)")
+    args = ap.parse_args(argv)
+
+    # generatory logują każdy zapis na INFO - przy dziesiątkach tys. qps to byłby benchmark loggera
+    logging.basicConfig(level=logging.WARNING)
+    res = run(args.duration, args.windows, args.delay_ms / 1000.0)
+    print(json.dumps(res, indent=2))
+    print("->", write_results("generators", res, args.json))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
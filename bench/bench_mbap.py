@@ -0,0 +1,138 @@
+# bench/bench_mbap.py
+#
+# Microbenchmark codeca MBAP: stary parser z modbus_proxy_spoof (slice + kopia
+# bytes na każde pole, składanie ramki od nowa) vs injector.core.mbap
+# (struct.Struct + memoryview, patch w miejscu).
+#
+#   python -m bench.bench_mbap
+#   python -m bench.bench_mbap --frames 200000 --regs 10 --json bench/results/mbap.json
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from injector.core import mbap
+
+
+# ----------------------------
+# "Before": kopia starej implementacji z injector/attacks/modbus_proxy_spoof.py
+# ----------------------------
+
+def _u16(b: bytes) -> int:
+    return int.from_bytes(b, byteorder="big", signed=False)
+
+def _p16(n: int) -> bytes:
+    return int(n).to_bytes(2, byteorder="big", signed=False)
+
+def _legacy_parse_mbap_frame(buf: bytearray) -> Optional[bytes]:
+    if len(buf) < 7:
+        return None
+    total_len = 6 + _u16(buf[4:6])
+    if len(buf) < total_len:
+        return None
+    frame = bytes(buf[:total_len])
+    del buf[:total_len]
+    return frame
+
+def _legacy_mbap_parts(frame: bytes) -> Tuple[int, int, int, int, bytes]:
+    return _u16(frame[0:2]), _u16(frame[2:4]), _u16(frame[4:6]), frame[6], frame[7:]
+
+def _legacy_spoof(frame: bytes, start_addr: int, count: int) -> bytes:
+    tid, pid, length, unit_id, pdu = _legacy_mbap_parts(frame)
+    byte_count = pdu[1]
+    data = bytearray(pdu[2:])
+    for i in range(0, min(len(data), count * 2), 2):
+        addr = start_addr + i // 2
+        if 0 <= addr <= 9:
+            data[i:i+2] = _p16((_u16(data[i:i+2]) + 1000) & 0xFFFF)
+    new_pdu = bytes([3, byte_count]) + bytes(data)
+    new_frame = bytearray()
+    new_frame += _p16(tid)
+    new_frame += _p16(pid)
+    new_frame += _p16(1 + len(new_pdu))
+    new_frame += bytes([unit_id])
+    new_frame += new_pdu
+    return bytes(new_frame)
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+
+def _make_stream(n_frames: int, regs: int) -> bytes:
+    one = [mbap.encode_read_response(tid, 1, 3, list(range(regs))) for tid in range(256)]
+    return b"".join(one[i & 0xFF] for i in range(n_frames))
+
+
+def _rate(n: int, dt: float) -> float:
+    return n / dt if dt > 0 else float("inf")
+
+
+def bench_legacy(stream: bytes, regs: int, spoof: bool) -> float:
+    buf = bytearray(stream)
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        frame = _legacy_parse_mbap_frame(buf)
+        if frame is None:
+            break
+        if spoof:
+            frame = _legacy_spoof(frame, 0, regs)
+        else:
+            _legacy_mbap_parts(frame)
+        n += 1
+    return _rate(n, time.perf_counter() - t0)
+
+
+def bench_codec(stream: bytes, regs: int, spoof: bool) -> float:
+    buf = bytearray(stream)
+    u16 = mbap.U16
+    t0 = time.perf_counter()
+    frames, consumed = mbap.split_frames(buf)
+    if spoof:
+        for f in frames:
+            off = f.register_data_offset()
+            for i in range(min(f.register_count(), regs)):
+                if 0 <= i <= 9:
+                    o = off + 2 * i
+                    u16.pack_into(buf, o, (u16.unpack_from(buf, o)[0] + 1000) & 0xFFFF)
+    else:
+        for f in frames:
+            f.func
+    del buf[:consumed]
+    return _rate(len(frames), time.perf_counter() - t0)
+
+
+def run(n_frames: int, regs: int, repeat: int = 3) -> Dict[str, Any]:
+    stream = _make_stream(n_frames, regs)
+    out: Dict[str, Any] = {"frames": n_frames, "regs_per_frame": regs, "bytes": len(stream)}
+    for name, fn in (("legacy", bench_legacy), ("codec", bench_codec)):
+        for spoof in (False, True):
+            key = f"{name}_{'spoof' if spoof else 'parse'}_fps"
+            out[key] = max(fn(stream, regs, spoof) for _ in range(repeat))
+    out["speedup_parse"] = out["codec_parse_fps"] / out["legacy_parse_fps"]
+    out["speedup_spoof"] = out["codec_spoof_fps"] / out["legacy_spoof_fps"]
+    return out
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="MBAP codec microbenchmark (frames/sec)")
+    ap.add_argument("--frames", type=int, default=100_000)
+    ap.add_argument("--regs", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", type=Path, default=None, help="zapisz wynik do pliku JSON")
+    args = ap.parse_args(argv)
+
+    res = run(args.frames, args.regs, args.repeat)
+    text = json.dumps(res, indent=2)
+    print(text)
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,143 @@
+# bench/bench_proxy.py
+#
+# Koszt proxy (run_modbus_proxy): dodatkowe opóźnienie pojedynczego FC3
+# (ping-pong, jedno żądanie w locie) i przepustowość ramek/s przy pipeliningu,
+# bezpośrednio do PlcSimulator vs przez proxy (--mode asyncio | threads | processes),
+# oraz przepustowość samej ścieżki forward_stream (forward_path).
+#
+#   python -m bench.bench_proxy
+#   python -m bench.bench_proxy --requests 20000 --window 32 --json bench/results/proxy.json
+
+import argparse
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict
+
+from bench.common import free_port, local_plc, write_results
+from injector.attacks.modbus_proxy_spoof import PROXY_MODES, ConnState, PendingReq, forward_stream, run_modbus_proxy
+from injector.core import mbap
+from injector.core.config import PlcConfig
+from injector.core.metrics import LatencyHistogram
+from injector.core.modbus import PipelinedModbusClient
+
+
+def _ping_pong(host: str, port: int, n: int) -> Dict[str, Any]:
+    hist = LatencyHistogram()
+    with PipelinedModbusClient(host, port, window=1) as client:
+        for i in range(n):
+            client.read_holding_registers(i % 10, 10, callback=lambda r: hist.record(r.latency_s))
+            client.drain()
+    return hist.summary()
+
+
+def _throughput(host: str, port: int, n: int, window: int) -> Dict[str, Any]:
+    with PipelinedModbusClient(host, port, window=window) as client:
+        t0 = time.perf_counter()
+        for i in range(n):
+            client.read_holding_registers(i % 10, 10)
+        client.drain()
+        dt = time.perf_counter() - t0
+        st = client.stats()
+    # przez proxy każda transakcja to 2 ramki (żądanie + odpowiedź)
+    return {"requests_per_s": st["completed"] / dt, "frames_per_s": 2 * st["completed"] / dt,
+            "timeouts": st["timeouts"]}
+
+
+def _forward_path(n_frames: int, regs: int = 10) -> Dict[str, Any]:
+    """
+    Sam forward_stream (wątkowa ścieżka P->C ze spoofingiem) na socketpair - bez klienta
+    i PLC, które przy pomiarze end-to-end są wąskim gardłem. Odpowiedzi FC3 idą
+    gęsto (wiele ramek w jednym segmencie), połowa ma kontekst requestu -> spoof.
+    """
+    rsp = [mbap.encode_read_response(tid, 1, 3, list(range(regs))) for tid in range(256)]
+    stream = b"".join(rsp[i & 0xFF] for i in range(n_frames))
+    state = ConnState()
+    for tid in range(0, 256, 2):
+        state.pending[tid] = PendingReq(func=3, start_addr=0, count=regs, ts=float("inf"))
+
+    src_w, src_r = socket.socketpair()
+    dst_w, dst_r = socket.socketpair()
+    stop = threading.Event()
+    fwd = threading.Thread(target=forward_stream, daemon=True, kwargs=dict(
+        src=src_r, dst=dst_w, stop_event=stop, direction="P->C", cfg=PlcConfig(),
+        state=state, record_requests=False, spoof_responses=True,
+    ))
+    received = [0]
+
+    def sink() -> None:
+        while received[0] < len(stream):
+            chunk = dst_r.recv(1 << 20)
+            if not chunk:
+                break
+            received[0] += len(chunk)
+
+    rx = threading.Thread(target=sink, daemon=True)
+    t0 = time.perf_counter()
+    fwd.start()
+    rx.start()
+    src_w.sendall(stream)
+    rx.join(timeout=60.0)
+    dt = time.perf_counter() - t0
+    stop.set()
+    for s in (src_w, src_r, dst_w, dst_r):
+        s.close()
+    return {"frames": n_frames, "frames_per_s": n_frames / dt, "mb_per_s": len(stream) / dt / 2**20,
+            "complete": received[0] == len(stream)}
+
+
+def run(n_requests: int, window: int, mode: str = "asyncio", workers: int = 0) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"requests": n_requests, "window": window, "mode": mode}
+    if mode == "processes":
+        out["workers"] = workers
+    with local_plc() as plc:
+        proxy_port = free_port()
+        cfg = replace(plc, proxy_host="127.0.0.1", proxy_port=proxy_port)
+        stop, ready = threading.Event(), threading.Event()
+        t = threading.Thread(
+            name="BENCH_PROXY", target=run_modbus_proxy, daemon=True,
+            kwargs={"cfg": cfg, "stop_event": stop, "listen_host": "127.0.0.1",
+                    "listen_port": proxy_port, "ready_event": ready, "mode": mode, "workers": workers},
+        )
+        t.start()
+        ready.wait(timeout=20.0 if mode == "processes" else 5.0)
+        try:
+            n_ping = max(1, n_requests // 5)
+            direct = _ping_pong(plc.plc_host, plc.plc_port, n_ping)
+            proxied = _ping_pong("127.0.0.1", proxy_port, n_ping)
+            out["latency_direct"] = direct
+            out["latency_proxy"] = proxied
+            out["added_latency_p50_ms"] = proxied["p50_ms"] - direct["p50_ms"]
+            out["added_latency_p99_ms"] = proxied["p99_ms"] - direct["p99_ms"]
+
+            out["throughput_direct"] = _throughput(plc.plc_host, plc.plc_port, n_requests, window)
+            out["throughput_proxy"] = _throughput("127.0.0.1", proxy_port, n_requests, window)
+        finally:
+            stop.set()
+            t.join(timeout=10.0)
+    out["forward_path"] = _forward_path(10 * n_requests)
+    return out
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Modbus proxy overhead: added latency and frames/sec")
+    ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--window", type=int, default=32)
+    ap.add_argument("--mode", choices=PROXY_MODES, default="asyncio", help="tryb proxy")
+    ap.add_argument("--workers", type=int, default=0, help="procesy dla --mode processes (0 = liczba CPU)")
+    ap.add_argument("--json", type=Path, default=None, help="plik wyniku (domyślnie bench/results/)")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    res = run(args.requests, args.window, args.mode, args.workers)
+    print(json.dumps(res, indent=2))
+    print("->", write_results("proxy", res, args.json))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+# bench/common.py
+#
+# Wspólne elementy benchmarków: lokalny PLC (PlcSimulator w wątku),
+# generator syntetycznych pcapów Modbus/TCP i zapis wyników do JSON.
+
+import contextlib
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from injector.core import mbap
+from injector.core.config import PlcConfig
+from injector.sim.plc_sim import PlcSimulator
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+# ----------------------------
+# Lokalny PLC
+# ----------------------------
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_plc(service_delay_s: float = 0.0, port: Optional[int] = None) -> Iterator[PlcConfig]:
+    """PlcSimulator na wolnym porcie; zwraca PlcConfig wskazujący na niego."""
+    port = port or free_port()
+    sim = PlcSimulator("127.0.0.1", port, service_delay_s=service_delay_s)
+    stop, ready = threading.Event(), threading.Event()
+    t = threading.Thread(name="BENCH_PLC", target=sim.run,
+                         kwargs={"stop_event": stop, "ready_event": ready}, daemon=True)
+    t.start()
+    if not ready.wait(timeout=5.0):
+        raise RuntimeError("PLC simulator did not start")
+    try:
+        yield PlcConfig(plc_host="127.0.0.1", plc_port=port)
+    finally:
+        stop.set()
+        t.join(timeout=2.0)
+
+
+# ----------------------------
+# Syntetyczne pcapy
+# ----------------------------
+
+_PCAP_GLOBAL = struct.Struct("<IHHiIII")
+_PCAP_REC = struct.Struct("<IIII")
+_ETH_IP = bytes.fromhex("020000000002" "020000000001" "0800")
+
+
+def _ipv4_tcp(src: bytes, dst: bytes, sport: int, dport: int, seq: int, payload: bytes) -> bytes:
+    total = 20 + 20 + len(payload)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, total, 0, 0x4000, 64, 6, 0, src, dst)
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, seq & 0xFFFFFFFF, 0, 5 << 4, 0x18, 65535, 0, 0)
+    return _ETH_IP + ip + tcp + payload
+
+
+def write_synthetic_pcap(path: Path, n_packets: int, rate_pps: float = 1000.0,
+                         plc_port: int = 502, fc6_share: float = 0.1) -> Path:
+    """
+    Klasyczny pcap (LINKTYPE_ETHERNET) z n_packets ramkami Modbus/TCP:
+    pary FC3 request/response (10 rejestrów) przeplatane FC6 (fc6_share).
+    Sumy kontrolne IP/TCP są zerowe - dla tshark / naszych parserów bez znaczenia.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    plc, hmi = bytes((10, 0, 0, 1)), bytes((10, 0, 0, 2))
+    sport = 40000
+    step_us = max(1, int(1_000_000 / rate_pps))
+    fc6_every = max(2, int(1 / fc6_share)) if fc6_share > 0 else 0
+
+    ts_us = 1_700_000_000 * 1_000_000
+    seq_c = seq_s = 1
+    with path.open("wb", buffering=1 << 20) as f:
+        f.write(_PCAP_GLOBAL.pack(0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        i = 0
+        tid = 0
+        while i < n_packets:
+            tid = (tid + 1) & 0xFFFF
+            if fc6_every and (tid % fc6_every) == 0:
+                addr = 10 + tid % 10
+                req = mbap.encode_write_single(tid, 1, addr, tid & 0x3FF)
+                rsp = req
+            else:
+                req = mbap.encode_read_request(tid, 1, 3, 0, 10)
+                rsp = mbap.encode_read_response(tid, 1, 3, [tid & 0xFF] * 10)
+            for src, dst, sp, dp, payload in ((hmi, plc, sport, plc_port, req), (plc, hmi, plc_port, sport, rsp)):
+                if i >= n_packets:
+                    break
+                if src == hmi:
+                    pkt = _ipv4_tcp(src, dst, sp, dp, seq_c, payload)
+                    seq_c += len(payload)
+                else:
+                    pkt = _ipv4_tcp(src, dst, sp, dp, seq_s, payload)
+                    seq_s += len(payload)
+                f.write(_PCAP_REC.pack(ts_us // 1_000_000, ts_us % 1_000_000, len(pkt), len(pkt)))
+                f.write(pkt)
+                ts_us += step_us
+                i += 1
+    return path
+
+
+# ----------------------------
+# Wyniki
+# ----------------------------
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "ts": time.time(),
+        "git_rev": _git_rev(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(name: str, results: Dict[str, Any], path: Optional[Path] = None) -> Path:
+    """Zapisuje {"env": ..., "results": ...}; domyślnie bench/results/<name>-<ts>.json."""
+    if path is None:
+        path = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"bench": name, "env": environment(), "results": results}, indent=2),
+                    encoding="utf-8")
+    return path
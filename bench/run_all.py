@@ -0,0 +1,42 @@
+# bench/run_all.py
+#
+# Cały zestaw benchmarków -> jeden plik JSON (bench/results/all-<ts>.json),
+# do porównywania przebiegów między commitami.
+#
+#   python -m bench.run_all
+#   python -m bench.run_all --quick
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from bench import bench_analysis, bench_generators, bench_mbap, bench_proxy
+from bench.common import write_results
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Run all benchmarks")
+    ap.add_argument("--quick", action="store_true", help="krótkie przebiegi / małe pliki (smoke)")
+    ap.add_argument("--json", type=Path, default=None, help="plik wyniku (domyślnie bench/results/)")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    q = args.quick
+    res = {
+        "mbap": bench_mbap.run(20_000 if q else 100_000, 10, repeat=1 if q else 3),
+        "generators": bench_generators.run(1.0 if q else 5.0, [0, 16] if q else [0, 8, 32]),
+        "proxy": bench_proxy.run(5_000 if q else 20_000, 32),
+        "analysis": bench_analysis.run(
+            [10_000] if q else [10_000, 100_000, 1_000_000],
+            [100_000] if q else [100_000, 1_000_000],
+            list(bench_analysis.BACKENDS),
+        ),
+    }
+    print(json.dumps(res, indent=2))
+    print("->", write_results("all", res, args.json))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
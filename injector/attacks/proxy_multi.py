@@ -0,0 +1,246 @@
+# injector/attacks/proxy_multi.py
+"""
+Wieloprocesowy spoof proxy: N workerów (AsyncModbusProxy) nasłuchuje na tym
+samym porcie z SO_REUSEPORT - kernel rozkłada nowe połączenia między procesy,
+więc framing i spoofing nie dzielą jednego GIL.
+
+Każdy worker ma własną pętlę accept, własne reguły (get_spoof_engine())
+i liczniki transakcji; rodzic (ProxySupervisor) zbiera ich statystyki
+z kolejki i scala w stats(). Schemat procesów jak w traffic/fleet.py.
+"""
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from injector.attacks.proxy_stats import (
+    DIRECTIONS, MAX_LISTED_CONNECTIONS, get_proxy_stats, merge_totals,
+)
+from injector.core.config import PlcConfig
+from injector.core.logging_setup import setup_logging
+from injector.core.txlog import close_txlog, open_txlog
+
+log = logging.getLogger(__name__)
+
+WORKER_READY_TIMEOUT_S = 10.0
+
+_SUM_FIELDS = ("connections", "connections_total", "plc_connect_failed")
+_SPOOF_SUM_FIELDS = ("frames_spoofed", "registers_spoofed")
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def _worker_main(
+    worker_id: int,
+    cfg: PlcConfig,
+    listen_host: str,
+    listen_port: int,
+    stop_event,
+    status_q,
+    report_every_s: float,
+    txlog_dir: Optional[str] = None,
+) -> None:
+    """Proces-worker: AsyncModbusProxy w wątku + raport stats() co report_every_s."""
+    from injector.attacks.proxy_async import AsyncModbusProxy
+
+    setup_logging("INFO")
+    if txlog_dir:
+        # każdy worker pisze własne segmenty w tym samym katalogu
+        open_txlog(txlog_dir, prefix=f"txlog-w{worker_id:02d}")
+    local_stop = threading.Event()
+    ready = threading.Event()
+    proxy = AsyncModbusProxy(cfg, listen_host, listen_port, reuse_port=True)
+    t = threading.Thread(name=f"PROXY_W{worker_id}", target=proxy.run,
+                         kwargs={"stop_event": local_stop, "ready_event": ready}, daemon=True)
+    t.start()
+
+    def report(final: bool = False) -> None:
+        st = {
+            "worker": worker_id,
+            "pid": os.getpid(),
+            "ready": ready.is_set(),
+            "alive": t.is_alive(),
+            "final": final,
+            "ts": time.time(),
+            **proxy.stats(),
+            # DirStats (z histogramem) - rodzic scala je dokładnie, nie z percentyli
+            "traffic_totals": get_proxy_stats().totals(),
+        }
+        try:
+            status_q.put_nowait(st)
+        except Exception:
+            pass
+
+    if ready.wait(timeout=WORKER_READY_TIMEOUT_S):
+        report()
+    try:
+        while not stop_event.wait(report_every_s):
+            report()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        local_stop.set()
+        t.join(timeout=2.0)
+        close_txlog()
+        report(final=True)
+
+
+class ProxySupervisor:
+    """
+    Rodzic dla N workerów proxy. run() jest blokujące i ma tę samą sygnaturę
+    co AsyncModbusProxy.run (stop_event / ready_event) - pasuje do wątku
+    w ScenarioRunner; ustawienie stop_event zatrzymuje wszystkie procesy.
+    """
+
+    def __init__(
+        self,
+        cfg: PlcConfig,
+        listen_host: str,
+        listen_port: int,
+        workers: int = 0,
+        report_every_s: float = 1.0,
+        txlog_dir: Optional[str] = None,
+    ):
+        if not reuse_port_supported():
+            raise RuntimeError("Multi-process proxy requires SO_REUSEPORT (Linux / BSD)")
+        self.cfg = cfg
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.report_every_s = report_every_s
+        self.txlog_dir = txlog_dir
+
+        self._ctx = mp.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._status_q = self._ctx.Queue()
+        self._procs: List[mp.process.BaseProcess] = []
+        self._collector: Optional[threading.Thread] = None
+        self._collector_stop = threading.Event()
+        self._stopped = False
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._worker_status: Dict[int, Dict[str, Any]] = {}
+
+    def start(self) -> bool:
+        """Startuje workery; True gdy wszystkie nasłuchują w WORKER_READY_TIMEOUT_S."""
+        for worker_id in range(self.workers):
+            p = self._ctx.Process(
+                name=f"PROXY_WORKER_{worker_id}",
+                target=_worker_main,
+                args=(worker_id, self.cfg, self.listen_host, self.listen_port,
+                      self._stop, self._status_q, self.report_every_s, self.txlog_dir),
+                daemon=True,
+            )
+            p.start()
+            self._procs.append(p)
+
+        self._collector = threading.Thread(name="PROXY_STATUS", target=self._collect, daemon=True)
+        self._collector.start()
+
+        with self._ready:
+            ok = self._ready.wait_for(
+                lambda: sum(st.get("ready", False) for st in self._worker_status.values()) >= self.workers,
+                timeout=WORKER_READY_TIMEOUT_S,
+            )
+        log.info(
+            "Spoof proxy: %d worker processes on %s:%s (SO_REUSEPORT) -> PLC %s:%s",
+            self.workers, self.listen_host, self.listen_port, self.cfg.plc_host, self.cfg.plc_port,
+        )
+        if not ok:
+            log.warning("Spoof proxy: not all workers reported ready")
+        return ok
+
+    def _collect(self) -> None:
+        while not self._collector_stop.is_set():
+            try:
+                st = self._status_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._ready:
+                self._worker_status[st["worker"]] = st
+                self._ready.notify_all()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for p in self._procs:
+            p.join(timeout=max(0.0, deadline - time.monotonic()))
+        for p in self._procs:
+            if p.is_alive():
+                log.warning("Proxy worker %s did not stop in time, terminating", p.name)
+                p.terminate()
+                p.join(timeout=1.0)
+
+        # ostatnie raporty (final=True) mogą jeszcze wisieć w kolejce
+        time.sleep(0.2)
+        self._collector_stop.set()
+        if self._collector is not None:
+            self._collector.join(timeout=2.0)
+        log.info("Spoof proxy (multi-process) stopped.")
+
+    def run(self, stop_event: threading.Event, ready_event: Optional[threading.Event] = None) -> None:
+        self.start()
+        if ready_event:
+            ready_event.set()
+        try:
+            stop_event.wait()
+        finally:
+            self.stop()
+
+    @staticmethod
+    def _merge_traffic(workers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        totals = merge_totals([st["traffic_totals"] for st in workers if "traffic_totals" in st])
+        per_conn: List[Dict[str, Any]] = []
+        for st in workers:
+            for conn in (st.get("traffic") or {}).get("per_connection", []):
+                per_conn.append({"worker": st["worker"], **conn})
+        per_conn.sort(key=lambda c: c["c2p"]["bytes"] + c["p2c"]["bytes"], reverse=True)
+        return {
+            **{name: totals[name].snapshot() for name in DIRECTIONS},
+            "connections_open": sum((st.get("traffic") or {}).get("connections_open", 0) for st in workers),
+            "connections_closed": sum((st.get("traffic") or {}).get("connections_closed", 0) for st in workers),
+            "per_connection": per_conn[:MAX_LISTED_CONNECTIONS],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = [self._worker_status.get(i, {"worker": i}) for i in range(self.workers)]
+
+        out: Dict[str, Any] = {"mode": "processes", "workers": self.workers,
+                               "workers_alive": sum(p.is_alive() for p in self._procs)}
+        for k in _SUM_FIELDS:
+            out[k] = sum(st.get(k, 0) for st in workers)
+        txn: Dict[str, int] = {}
+        spoof: Dict[str, int] = dict.fromkeys(_SPOOF_SUM_FIELDS, 0)
+        for st in workers:
+            for k, v in st.get("transactions", {}).items():
+                txn[k] = txn.get(k, 0) + v
+            for k in _SPOOF_SUM_FIELDS:
+                spoof[k] += st.get("spoof", {}).get(k, 0)
+        out["transactions"] = txn
+        out["spoof"] = spoof
+        out["traffic"] = self._merge_traffic(workers)
+        if self.txlog_dir:
+            out["txlog"] = {
+                "directory": self.txlog_dir,
+                "records": sum((st.get("txlog") or {}).get("records", 0) for st in workers),
+                "segments": sum((st.get("txlog") or {}).get("segments", 0) for st in workers),
+            }
+        out["per_worker"] = [
+            {k: st.get(k) for k in ("worker", "pid", "alive", "connections", "connections_total")}
+            for st in workers
+        ]
+        return out
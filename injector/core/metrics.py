@@ -0,0 +1,279 @@
+# injector/core/metrics.py
+"""
+Lekka instrumentacja transakcji Modbus: histogram opóźnień (HDR-style)
+per (generator, function code, endpoint) + liczniki błędów i timeoutów.
+
+Histogram jest log-liniowy: wartości w mikrosekundach, 16 pod-kubełków
+na każdą potęgę dwójki. Percentyl to górna granica kubełka, więc zawyża
+wynik o najwyżej 1/16 (~6.25%). Stała pamięć niezależnie od liczby próbek,
+record() to kilka operacji na intach.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymodbus.exceptions import ModbusIOException
+
+log = logging.getLogger(__name__)
+
+SeriesKey = Tuple[str, int, str]   # (generator, function code, "host:port")
+
+_SUB_BITS = 5
+_SUB = 1 << _SUB_BITS              # 32 - wartości < 32 us liczone dokładnie
+_HALF = _SUB >> 1                  # 16 pod-kubełków na potęgę dwójki
+_MAX_US = 60_000_000               # 60 s - wszystko powyżej ląduje w ostatnim kubełku
+
+
+def _bucket_index(us: int) -> int:
+    if us < _SUB:
+        return us
+    shift = us.bit_length() - _SUB_BITS
+    return _SUB + (shift - 1) * _HALF + ((us >> shift) - _HALF)
+
+
+def _bucket_upper(idx: int) -> int:
+    """Największa wartość (us) mieszcząca się w kubełku idx."""
+    if idx < _SUB:
+        return idx
+    shift = (idx - _SUB) // _HALF + 1
+    top = (idx - _SUB) % _HALF + _HALF
+    return ((top + 1) << shift) - 1
+
+
+_N_BUCKETS = _bucket_index(_MAX_US) + 1
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Dokładny percentyl metodą nearest-rank (dla małych prób, np. health check)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyHistogram:
+    """Histogram opóźnień o stałym rozmiarze; percentyle z dokładnością kubełka."""
+
+    __slots__ = ("counts", "count", "sum_us", "min_us", "max_us")
+
+    def __init__(self):
+        self.counts = [0] * _N_BUCKETS
+        self.count = 0
+        self.sum_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    def record(self, latency_s: float) -> None:
+        us = int(latency_s * 1_000_000)
+        if us < 0:
+            us = 0
+        self.counts[_bucket_index(us) if us < _MAX_US else _N_BUCKETS - 1] += 1
+        self.count += 1
+        self.sum_us += us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+        if us > self.max_us:
+            self.max_us = us
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.sum_us += other.sum_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile_us(self, q: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, math.ceil(q / 100.0 * self.count))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(_bucket_upper(idx), self.max_us)
+        return self.max_us
+
+    def summary(self) -> Dict[str, Any]:
+        """Wartości w ms."""
+        return {
+            "count": self.count,
+            "mean_ms": (self.sum_us / self.count / 1000.0) if self.count else 0.0,
+            "min_ms": (self.min_us or 0) / 1000.0,
+            "p50_ms": self.percentile_us(50) / 1000.0,
+            "p90_ms": self.percentile_us(90) / 1000.0,
+            "p95_ms": self.percentile_us(95) / 1000.0,
+            "p99_ms": self.percentile_us(99) / 1000.0,
+            "max_ms": self.max_us / 1000.0,
+        }
+
+
+class LatencySeries:
+    """Jedna seria (generator, FC, endpoint): histogram udanych transakcji + liczniki."""
+
+    def __init__(self, key: SeriesKey):
+        self.key = key
+        self.hist = LatencyHistogram()
+        self.ok = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.exception_codes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float) -> None:
+        with self._lock:
+            self.ok += 1
+            self.hist.record(latency_s)
+
+    def record_error(self, exception_code: Optional[int] = None) -> None:
+        with self._lock:
+            self.errors += 1
+            if exception_code is not None:
+                self.exception_codes[exception_code] = self.exception_codes.get(exception_code, 0) + 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def time(self) -> "_Timer":
+        """
+        with series.time() as t:
+            rr = client.read_holding_registers(...)
+            t.check(rr)
+        """
+        return _Timer(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        generator, func, endpoint = self.key
+        with self._lock:
+            return {
+                "generator": generator,
+                "func": func,
+                "endpoint": endpoint,
+                "ok": self.ok,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "exception_codes": dict(self.exception_codes),
+                "latency": self.hist.summary(),
+            }
+
+
+class _Timer:
+    __slots__ = ("series", "t0", "outcome", "exception_code")
+
+    def __init__(self, series: LatencySeries):
+        self.series = series
+        self.outcome = "ok"
+        self.exception_code: Optional[int] = None
+
+    def check(self, response: Any) -> Any:
+        """Klasyfikuje odpowiedź pymodbus (ExceptionResponse / ModbusIOException)."""
+        if isinstance(response, ModbusIOException):
+            self.outcome = "timeout"
+        elif response is not None and response.isError():
+            self.outcome = "error"
+            self.exception_code = getattr(response, "exception_code", None)
+        return response
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            if issubclass(exc_type, (TimeoutError, ModbusIOException)):
+                self.series.record_timeout()
+            elif issubclass(exc_type, Exception):   # nie CancelledError / KeyboardInterrupt
+                self.series.record_error()
+            return
+        if self.outcome == "ok":
+            self.series.record(time.perf_counter() - self.t0)
+        elif self.outcome == "timeout":
+            self.series.record_timeout()
+        else:
+            self.series.record_error(self.exception_code)
+
+
+def endpoint_of(cfg: Any) -> str:
+    return f"{cfg.effective_host}:{cfg.effective_port}"
+
+
+class MetricsRegistry:
+    """
+    Rejestr serii dla całego procesu. Generator pobiera serię raz (series())
+    i potem tylko mierzy - bez słownikowych lookupów na każde żądanie.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[SeriesKey, LatencySeries] = {}
+
+    def series(self, generator: str, func: int, endpoint: str) -> LatencySeries:
+        key = (generator, func, endpoint)
+        s = self._series.get(key)
+        if s is None:
+            with self._lock:
+                s = self._series.setdefault(key, LatencySeries(key))
+        return s
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def _all(self) -> List[LatencySeries]:
+        with self._lock:
+            return list(self._series.values())
+
+    def by_function(self, series: Optional[Iterable[LatencySeries]] = None) -> Dict[str, Any]:
+        """Agregat po function code (histogramy scalone ze wszystkich generatorów)."""
+        merged: Dict[int, Dict[str, Any]] = {}
+        for s in series if series is not None else self._all():
+            func = s.key[1]
+            agg = merged.setdefault(func, {"hist": LatencyHistogram(), "ok": 0, "errors": 0, "timeouts": 0})
+            with s._lock:
+                agg["hist"].merge(s.hist)
+                agg["ok"] += s.ok
+                agg["errors"] += s.errors
+                agg["timeouts"] += s.timeouts
+        return {
+            str(func): {"ok": a["ok"], "errors": a["errors"], "timeouts": a["timeouts"],
+                        "latency": a["hist"].summary()}
+            for func, a in sorted(merged.items())
+        }
+
+    def report(self) -> Dict[str, Any]:
+        series = self._all()
+        return {
+            "series": [s.snapshot() for s in series],
+            "by_function": self.by_function(series),
+        }
+
+    def dump(self, path: Path, extra: Optional[Dict[str, Any]] = None) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = self.report()
+        if extra:
+            data.update(extra)
+        path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        log.info("Modbus latency metrics written to %s", path)
+        return path
+
+
+_METRICS: Optional[MetricsRegistry] = None
+_METRICS_LOCK = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is None:
+            _METRICS = MetricsRegistry()
+        return _METRICS
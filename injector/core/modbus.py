@@ -1,12 +1,25 @@
 # injector/core/modbus.py
 import logging
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import Optional, List
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Callable, Any, Iterator, Sequence
 from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusException
 from .config import PlcConfig, get_plc_config
+from .metrics import LatencySeries, endpoint_of, get_metrics
+from .scheduler import current_name
+from . import mbap
 
 log = logging.getLogger(__name__)
 
+PoolKey = Tuple[str, int, int]
+
+
 @contextmanager
 def modbus_client(cfg: Optional[PlcConfig] = None):
     cfg = cfg or get_plc_config()
@@ -24,17 +37,840 @@ def modbus_client(cfg: Optional[PlcConfig] = None):
         client.close()
         log.info("Connection closed")
 
+
+# ----------------------------
+# Connection pool
+# ----------------------------
+
+@dataclass
+class _PooledConn:
+    client: ModbusTcpClient
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def _socket_alive(client: ModbusTcpClient) -> bool:
+    """
+    Bezczynne połączenie Modbus/TCP nie powinno mieć nic do odczytu.
+    Jeśli socket jest "readable", to albo PLC zamknął połączenie (FIN),
+    albo w buforze wisi spóźniona odpowiedź -> w obu przypadkach nie używamy go ponownie.
+    """
+    sock = client.socket
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class ModbusConnectionPool:
+    """
+    Thread-safe pula trwałych połączeń Modbus/TCP kluczowana (host, port, unit_id).
+
+    - połączenia są wypożyczane na czas jednego żądania i wracają do puli,
+    - bezczynne dłużej niż max_idle_s są zamykane (eviction),
+    - przed ponownym użyciem sprawdzamy, czy socket żyje,
+    - zerwane połączenie jest odrzucane, a żądanie ponawiane raz na nowym.
+    """
+
+    def __init__(self, max_idle_s: float = 30.0, max_idle_per_key: int = 4, timeout_s: float = 3.0):
+        self.max_idle_s = max_idle_s
+        self.max_idle_per_key = max_idle_per_key
+        self.timeout_s = timeout_s
+
+        self._lock = threading.Lock()
+        self._idle: Dict[PoolKey, List[_PooledConn]] = {}
+        self._last_sweep = time.monotonic()
+
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.requests_served = 0
+        self.reconnects = 0
+
+    @staticmethod
+    def key_for(cfg: PlcConfig) -> PoolKey:
+        return cfg.effective_host, cfg.effective_port, cfg.unit_id
+
+    def _open(self, key: PoolKey) -> _PooledConn:
+        host, port, unit_id = key
+        client = ModbusTcpClient(host, port=port, timeout=self.timeout_s)
+        if not client.connect():
+            client.close()
+            raise RuntimeError(f"Could not connect to PLC endpoint at {host}:{port}")
+        with self._lock:
+            self.connections_opened += 1
+        log.info("Pool: opened connection to %s:%s (unit %s)", host, port, unit_id)
+        return _PooledConn(client=client)
+
+    def _close(self, conn: _PooledConn) -> None:
+        try:
+            conn.client.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.connections_closed += 1
+
+    def _sweep_locked(self, now: float) -> List[_PooledConn]:
+        stale: List[_PooledConn] = []
+        for key, conns in self._idle.items():
+            fresh = [c for c in conns if now - c.last_used <= self.max_idle_s]
+            if len(fresh) != len(conns):
+                stale.extend(c for c in conns if now - c.last_used > self.max_idle_s)
+                self._idle[key] = fresh
+        self._last_sweep = now
+        return stale
+
+    def _checkout(self, key: PoolKey) -> _PooledConn:
+        now = time.monotonic()
+        candidate: Optional[_PooledConn] = None
+        stale: List[_PooledConn] = []
+
+        with self._lock:
+            if now - self._last_sweep > 1.0:
+                stale = self._sweep_locked(now)
+            idle = self._idle.get(key)
+            while idle:
+                conn = idle.pop()
+                if now - conn.last_used <= self.max_idle_s and _socket_alive(conn.client):
+                    candidate = conn
+                    break
+                stale.append(conn)
+
+        for conn in stale:
+            self._close(conn)
+
+        return candidate if candidate is not None else self._open(key)
+
+    def _checkin(self, key: PoolKey, conn: _PooledConn) -> None:
+        conn.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(conn)
+                return
+        self._close(conn)
+
+    @contextmanager
+    def connection(self, cfg: Optional[PlcConfig] = None) -> Iterator[ModbusTcpClient]:
+        """
+        Wypożycza połączenie z puli. Jeśli wewnątrz bloku poleci wyjątek,
+        połączenie jest zamykane zamiast wracać do puli (stan nieznany).
+        """
+        cfg = cfg or get_plc_config()
+        key = self.key_for(cfg)
+        conn = self._checkout(key)
+        ok = False
+        try:
+            yield conn.client
+            ok = True
+        finally:
+            if ok:
+                self._checkin(key, conn)
+            else:
+                self._close(conn)
+
+    def execute(self, cfg: PlcConfig, op: Callable[[ModbusTcpClient], Any]) -> Any:
+        """
+        Wykonuje op(client) na połączeniu z puli.
+        Przy zerwanym połączeniu (PLC restart, idle timeout po stronie PLC)
+        robi jeden reconnect i ponawia żądanie.
+        """
+        for attempt in range(2):
+            try:
+                with self.connection(cfg) as client:
+                    result = op(client)
+                with self._lock:
+                    self.requests_served += 1
+                return result
+            except (ConnectionException, OSError) as e:
+                if attempt:
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                log.info("Pool: connection to %s:%s lost (%r), reconnecting",
+                         cfg.effective_host, cfg.effective_port, e)
+
+    def evict_idle(self) -> None:
+        with self._lock:
+            stale = self._sweep_locked(time.monotonic())
+        for conn in stale:
+            self._close(conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            opened = self.connections_opened
+            served = self.requests_served
+            return {
+                "connections_opened": opened,
+                "connections_closed": self.connections_closed,
+                "requests_served": served,
+                "reconnects": self.reconnects,
+                "requests_per_connection": (served / opened) if opened else 0.0,
+                "idle": {f"{h}:{p}/{u}": len(c) for (h, p, u), c in self._idle.items()},
+            }
+
+
+_POOL: Optional[ModbusConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_connection_pool() -> ModbusConnectionPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ModbusConnectionPool()
+        return _POOL
+
+
+def close_connection_pool() -> None:
+    with _POOL_LOCK:
+        pool = _POOL
+    if pool is not None:
+        pool.close_all()
+
+
+# ----------------------------
+# Module-level helpers (pooled)
+# ----------------------------
+
 def read_holding_registers(address: int, count: int = 1, cfg: Optional[PlcConfig] = None) -> List[int]:
     cfg = cfg or get_plc_config()
-    with modbus_client(cfg) as client:
-        rr = client.read_holding_registers(address, count, unit=cfg.unit_id)
-        if rr.isError():
-            raise RuntimeError(f"Modbus error reading HR[{address}] x{count}: {rr}")
-        return list(rr.registers)
+    series = get_metrics().series(current_name("pool"), 3, endpoint_of(cfg))
+    with series.time() as t:
+        rr = t.check(get_connection_pool().execute(
+            cfg, lambda client: client.read_holding_registers(address, count, unit=cfg.unit_id)
+        ))
+    if rr.isError():
+        raise RuntimeError(f"Modbus error reading HR[{address}] x{count}: {rr}")
+    return list(rr.registers)
 
 def write_holding_register(address: int, value: int, cfg: Optional[PlcConfig] = None) -> None:
     cfg = cfg or get_plc_config()
-    with modbus_client(cfg) as client:
-        rq = client.write_register(address, value, unit=cfg.unit_id)
+    series = get_metrics().series(current_name("pool"), 6, endpoint_of(cfg))
+    with series.time() as t:
+        rq = t.check(get_connection_pool().execute(
+            cfg, lambda client: client.write_register(address, value, unit=cfg.unit_id)
+        ))
+    if rq.isError():
+        raise RuntimeError(f"Modbus error writing HR[{address}] = {value}: {rq}")
+
+
+# ----------------------------
+# Pipelined client (wiele transakcji w locie)
+# ----------------------------
+
+@dataclass
+class PipelinedResult:
+    tid: int
+    func: int
+    address: int
+    ok: bool
+    registers: Optional[List[int]] = None
+    exception_code: Optional[int] = None
+    timed_out: bool = False
+    latency_s: float = 0.0
+
+
+@dataclass
+class _InFlight:
+    func: int
+    address: int
+    sent_at: float
+    deadline: float
+    callback: Optional[Callable[[PipelinedResult], None]]
+
+
+class PipelinedModbusClient:
+    """
+    Klient Modbus/TCP z oknem transakcji w locie (pipelining).
+
+    Modbus/TCP pozwala na kilka niezakończonych żądań na jednym połączeniu -
+    odpowiedzi dopasowujemy po Transaction ID. Dzięki temu tempo nie jest
+    ograniczone RTT do PLC, tylko rozmiarem okna (window).
+
+    - submit blokuje tylko wtedy, gdy okno jest pełne,
+    - każde żądanie ma własny timeout (liczony od wysłania),
+    - wynik trafia do callbacku (PipelinedResult), także przy timeout/exception,
+    - spóźnione odpowiedzi dla przeterminowanych TID są liczone i odrzucane,
+    - opóźnienia / błędy / timeouty trafiają do injector.core.metrics
+      pod nazwą generatora metrics_name (domyślnie nazwa wątku).
+
+    Nie jest thread-safe: jeden klient = jeden wątek generatora.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 502,
+        unit_id: int = 1,
+        window: int = 16,
+        timeout_s: float = 1.0,
+        connect_timeout_s: float = 3.0,
+        metrics_name: Optional[str] = None,
+    ):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.window = window
+        self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+
+        self._sock: Optional[socket.socket] = None
+        self._rx = bytearray()
+        self._inflight: "OrderedDict[int, _InFlight]" = OrderedDict()
+        self._next_tid = 0
+        self.metrics_name = metrics_name or current_name("PIPELINED")
+        self._series: Dict[int, LatencySeries] = {}
+
+        self.sent = 0
+        self.completed = 0
+        self.exceptions = 0
+        self.timeouts = 0
+        self.unmatched = 0
+
+    @classmethod
+    def from_cfg(cls, cfg: Optional[PlcConfig] = None, **kwargs: Any) -> "PipelinedModbusClient":
+        cfg = cfg or get_plc_config()
+        return cls(cfg.effective_host, cfg.effective_port, cfg.unit_id, **kwargs)
+
+    # --- połączenie ---
+
+    def connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout_s)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.settimeout(None)
+        log.info("Pipelined client connected to %s:%s (window=%d)", self.host, self.port, self.window)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+        # wszystko co było w locie i tak już nie wróci
+        self._expire(float("inf"))
+        self._rx.clear()
+
+    def reconnect(self) -> bool:
+        """Zamyka i otwiera połączenie; przy błędzie tylko loguje (kolejny submit spróbuje znowu)."""
+        self.close()
+        try:
+            self.connect()
+            return True
+        except OSError as e:
+            log.warning("Pipelined client reconnect to %s:%s failed: %s", self.host, self.port, e)
+            return False
+
+    def __enter__(self) -> "PipelinedModbusClient":
+        self.connect()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        try:
+            if exc[0] is None:
+                self.drain()
+        finally:
+            self.close()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    # --- żądania ---
+
+    def read_holding_registers(self, address: int, count: int = 1,
+                               callback: Optional[Callable[[PipelinedResult], None]] = None) -> int:
+        return self._submit(
+            3, address, lambda tid: mbap.encode_read_request(tid, self.unit_id, 3, address, count), callback
+        )
+
+    def read_input_registers(self, address: int, count: int = 1,
+                             callback: Optional[Callable[[PipelinedResult], None]] = None) -> int:
+        return self._submit(
+            4, address, lambda tid: mbap.encode_read_request(tid, self.unit_id, 4, address, count), callback
+        )
+
+    def write_register(self, address: int, value: int,
+                       callback: Optional[Callable[[PipelinedResult], None]] = None) -> int:
+        return self._submit(
+            6, address, lambda tid: mbap.encode_write_single(tid, self.unit_id, address, value), callback
+        )
+
+    def write_registers(self, address: int, values: Sequence[int],
+                        callback: Optional[Callable[[PipelinedResult], None]] = None) -> int:
+        return self._submit(
+            16, address, lambda tid: mbap.encode_write_multiple(tid, self.unit_id, address, values), callback
+        )
+
+    def _alloc_tid(self) -> int:
+        for _ in range(0x10000):
+            tid = self._next_tid
+            self._next_tid = (tid + 1) & 0xFFFF
+            if tid not in self._inflight:
+                return tid
+        raise RuntimeError("No free transaction IDs")
+
+    def _submit(self, func: int, address: int, encode: Callable[[int], bytes],
+                callback: Optional[Callable[[PipelinedResult], None]]) -> int:
+        if self._sock is None:
+            raise ConnectionException(f"Pipelined client not connected to {self.host}:{self.port}")
+
+        while len(self._inflight) >= self.window:
+            self.poll(self._time_to_next_deadline())
+
+        tid = self._alloc_tid()
+        frame = encode(tid)
+        now = time.perf_counter()
+        self._inflight[tid] = _InFlight(func, address, now, now + self.timeout_s, callback)
+        try:
+            self._sock.sendall(frame)
+        except OSError as e:
+            self._inflight.pop(tid, None)
+            raise ConnectionException(f"send to {self.host}:{self.port} failed: {e!r}")
+        self.sent += 1
+        return tid
+
+    # --- odbiór ---
+
+    def _time_to_next_deadline(self) -> float:
+        if not self._inflight:
+            return 0.0
+        first = next(iter(self._inflight.values()))
+        return max(0.0, first.deadline - time.perf_counter())
+
+    def poll(self, timeout: float = 0.0) -> int:
+        """
+        Odbiera i dopasowuje odpowiedzi (czeka max timeout s na dane),
+        potem przeterminowuje stare transakcje. Zwraca liczbę zakończonych.
+        """
+        done = 0
+        if self._sock is not None and self._inflight:
+            readable, _, _ = select.select([self._sock], [], [], timeout)
+            if readable:
+                try:
+                    chunk = self._sock.recv(65536)
+                except OSError as e:
+                    raise ConnectionException(f"recv from {self.host}:{self.port} failed: {e!r}")
+                if not chunk:
+                    raise ConnectionException(f"Connection closed by {self.host}:{self.port}")
+                self._rx += chunk
+                done += self._consume_frames()
+        done += self._expire(time.perf_counter())
+        return done
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Czeka aż wszystkie transakcje w locie się zakończą (odpowiedź lub timeout)."""
+        end = None if timeout is None else time.perf_counter() + timeout
+        while self._inflight:
+            if end is not None and time.perf_counter() >= end:
+                break
+            self.poll(self._time_to_next_deadline())
+
+    def _series_for(self, func: int) -> LatencySeries:
+        series = self._series.get(func)
+        if series is None:
+            series = self._series[func] = get_metrics().series(
+                self.metrics_name, func, f"{self.host}:{self.port}"
+            )
+        return series
+
+    def _consume_frames(self) -> int:
+        frames, consumed = mbap.split_frames(self._rx)
+        done = 0
+        now = time.perf_counter()
+        for frame in frames:
+            req = self._inflight.pop(frame.tid, None)
+            if req is None:
+                self.unmatched += 1
+                continue
+            self._complete(frame, req, now)
+            done += 1
+        if consumed:
+            del self._rx[:consumed]
+        return done
+
+    def _complete(self, frame: mbap.FrameView, req: _InFlight, now: float) -> None:
+        res = PipelinedResult(tid=frame.tid, func=req.func, address=req.address, ok=True,
+                              latency_s=now - req.sent_at)
+        series = self._series_for(req.func)
+        if frame.is_exception:
+            res.ok = False
+            res.exception_code = frame.exception_code
+            self.exceptions += 1
+            series.record_error(res.exception_code)
+        else:
+            series.record(res.latency_s)
+            if req.func in (3, 4):
+                res.registers = list(frame.registers())
+        self.completed += 1
+        if req.callback is not None:
+            req.callback(res)
+
+    def _expire(self, now: float) -> int:
+        expired = 0
+        while self._inflight:
+            tid, req = next(iter(self._inflight.items()))
+            if req.deadline > now:
+                break
+            del self._inflight[tid]
+            self.timeouts += 1
+            expired += 1
+            self._series_for(req.func).record_timeout()
+            if req.callback is not None:
+                req.callback(PipelinedResult(tid=tid, func=req.func, address=req.address, ok=False,
+                                             timed_out=True, latency_s=self.timeout_s))
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "in_flight": len(self._inflight),
+            "sent": self.sent,
+            "completed": self.completed,
+            "exceptions": self.exceptions,
+            "timeouts": self.timeouts,
+            "unmatched": self.unmatched,
+        }
+
+
+# ----------------------------
+# Coalescing planner (batching odczytów / zapisów w jednym "ticku")
+# ----------------------------
+
+MAX_READ_REGISTERS = 125   # limit FC3/FC4
+MAX_WRITE_REGISTERS = 123  # limit FC16
+
+
+@dataclass
+class PlannedRead:
+    """Jedno PDU FC3 pokrywające kilka logicznych odczytów (members = indeksy w wejściu)."""
+    address: int
+    count: int
+    members: List[int] = field(default_factory=list)
+
+
+@dataclass
+class PlannedWrite:
+    """Jedno PDU zapisu: FC6 (1 rejestr) albo FC16 (ciągły blok)."""
+    func: int
+    address: int
+    values: List[int] = field(default_factory=list)
+
+
+def plan_reads(
+    requests: Sequence[Tuple[int, int]],
+    max_count: int = MAX_READ_REGISTERS,
+    max_gap: int = 0,
+) -> List[PlannedRead]:
+    """
+    requests = [(address, count), ...] zebrane w jednym ticku.
+    Łączy nachodzące się / sąsiednie zakresy (oraz rozdzielone dziurą <= max_gap)
+    w minimalną liczbę PDU o długości <= max_count. Każdy logiczny odczyt
+    trafia w całości do jednego PDU, więc wynik da się potem po prostu pociąć.
+
+    Zachłannie po posortowanym początku - dla przedziałów z limitem długości
+    daje to minimalną liczbę PDU.
+    """
+    order = sorted(range(len(requests)), key=lambda i: requests[i])
+    plans: List[PlannedRead] = []
+    cur: Optional[PlannedRead] = None
+
+    for i in order:
+        addr, count = requests[i]
+        if count < 1 or count > max_count:
+            raise ValueError(f"Read of {count} registers at HR[{addr}] outside 1..{max_count}")
+        end = addr + count
+        if cur is not None:
+            cur_end = cur.address + cur.count
+            if addr <= cur_end + max_gap and end - cur.address <= max_count:
+                cur.count = max(cur_end, end) - cur.address
+                cur.members.append(i)
+                continue
+        cur = PlannedRead(address=addr, count=count, members=[i])
+        plans.append(cur)
+    return plans
+
+
+def split_read_results(
+    requests: Sequence[Tuple[int, int]],
+    plans: Sequence[PlannedRead],
+    results: Sequence[Optional[Sequence[int]]],
+) -> List[Optional[List[int]]]:
+    """
+    results[k] = rejestry odczytane dla plans[k] (None = błąd tego PDU).
+    Zwraca wartości dla każdego logicznego odczytu w kolejności wejścia.
+    """
+    out: List[Optional[List[int]]] = [None] * len(requests)
+    for plan, regs in zip(plans, results):
+        if regs is None:
+            continue
+        for i in plan.members:
+            addr, count = requests[i]
+            off = addr - plan.address
+            out[i] = list(regs[off:off + count])
+    return out
+
+
+def plan_writes(
+    writes: Sequence[Tuple[int, int]],
+    allow_fc16: bool = False,
+    max_count: int = MAX_WRITE_REGISTERS,
+) -> List[PlannedWrite]:
+    """
+    writes = [(address, value), ...] (logiczne FC6) zebrane w jednym ticku.
+    Wielokrotny zapis tego samego rejestru -> wygrywa ostatni.
+    allow_fc16=True: ciągłe adresy składane w FC16 (do max_count rejestrów),
+    inaczej każdy zapis zostaje osobnym FC6.
+    """
+    last: Dict[int, int] = {}
+    for addr, value in writes:
+        last[addr] = value & 0xFFFF
+
+    plans: List[PlannedWrite] = []
+    if not allow_fc16:
+        return [PlannedWrite(func=6, address=a, values=[v]) for a, v in sorted(last.items())]
+
+    cur: Optional[PlannedWrite] = None
+    for addr in sorted(last):
+        if cur is not None and addr == cur.address + len(cur.values) and len(cur.values) < max_count:
+            cur.values.append(last[addr])
+            continue
+        cur = PlannedWrite(func=16, address=addr, values=[last[addr]])
+        plans.append(cur)
+    for p in plans:
+        if len(p.values) == 1:
+            p.func = 6
+    return plans
+
+
+class _Untimed:
+    """Zamiennik series.time(), gdy batcher nie ma serii dla danego FC."""
+
+    def __enter__(self) -> "_Untimed":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    @staticmethod
+    def check(response: Any) -> Any:
+        return response
+
+
+class RequestBatcher:
+    """
+    Zbiera logiczne odczyty/zapisy z jednego ticku i wysyła je jako minimalny
+    zestaw PDU. Wyniki wracają do wywołujących przez callbacki.
+
+    flush() najpierw wykonuje zapisy, potem odczyty - read-back w tym samym
+    ticku widzi już zapisane wartości. Błąd jednego PDU (odpowiedź z wyjątkiem,
+    zerwane połączenie, timeout) nie przerywa ticku: odczyty z tego PDU dostają
+    None, pozostałe PDU idą dalej.
+
+    series = {FC: LatencySeries} - każde wysłane PDU jest mierzone w serii swojego FC.
+    """
+
+    def __init__(self, max_read: int = MAX_READ_REGISTERS, max_gap: int = 0, allow_fc16: bool = False,
+                 series: Optional[Dict[int, LatencySeries]] = None):
+        self.max_read = max_read
+        self.max_gap = max_gap
+        self.allow_fc16 = allow_fc16
+        self.series = dict(series or {})
+        self._reads: List[Tuple[int, int]] = []
+        self._read_cbs: List[Optional[Callable[[Optional[List[int]]], None]]] = []
+        self._writes: List[Tuple[int, int]] = []
+
+        self.logical_requests = 0
+        self.pdus_sent = 0
+        self.pdus_failed = 0
+
+    def read(self, address: int, count: int,
+             callback: Optional[Callable[[Optional[List[int]]], None]] = None) -> None:
+        self._reads.append((address, count))
+        self._read_cbs.append(callback)
+
+    def write(self, address: int, value: int) -> None:
+        self._writes.append((address, value))
+
+    def _take(self):
+        reads, cbs, writes = self._reads, self._read_cbs, self._writes
+        self._reads, self._read_cbs, self._writes = [], [], []
+        self.logical_requests += len(reads) + len(writes)
+        return reads, cbs, writes
+
+    def _time(self, func: int):
+        series = self.series.get(func)
+        return series.time() if series is not None else _Untimed()
+
+    def _write_done(self, w: PlannedWrite, rq: Any) -> None:
         if rq.isError():
-            raise RuntimeError(f"Modbus error writing HR[{address}] = {value}: {rq}")
+            self.pdus_failed += 1
+            log.warning("Batched write HR[%s] x%s error: %s", w.address, len(w.values), rq)
+
+    def _read_done(self, p: PlannedRead, rr: Any) -> Optional[List[int]]:
+        if rr.isError():
+            self.pdus_failed += 1
+            log.warning("Batched read HR[%s] x%s error: %s", p.address, p.count, rr)
+            return None
+        return list(rr.registers)
+
+    def _failed(self, kind: str, address: int, count: int, e: Exception) -> None:
+        self.pdus_failed += 1
+        log.warning("Batched %s HR[%s] x%s failed: %r", kind, address, count, e)
+
+    def flush(self, client: ModbusTcpClient, unit_id: int = 1) -> int:
+        """Wykonanie na zwykłym (blokującym) kliencie pymodbus. Zwraca liczbę nieudanych PDU."""
+        reads, cbs, writes = self._take()
+        failed = self.pdus_failed
+
+        for w in plan_writes(writes, allow_fc16=self.allow_fc16):
+            self.pdus_sent += 1
+            try:
+                with self._time(w.func) as t:
+                    if w.func == 16:
+                        rq = t.check(client.write_registers(w.address, w.values, unit=unit_id))
+                    else:
+                        rq = t.check(client.write_register(w.address, w.values[0], unit=unit_id))
+            except (ModbusException, OSError) as e:
+                self._failed("write", w.address, len(w.values), e)
+                continue
+            self._write_done(w, rq)
+
+        plans = plan_reads(reads, max_count=self.max_read, max_gap=self.max_gap)
+        results: List[Optional[List[int]]] = []
+        for p in plans:
+            self.pdus_sent += 1
+            try:
+                with self._time(3) as t:
+                    rr = t.check(client.read_holding_registers(p.address, p.count, unit=unit_id))
+            except (ModbusException, OSError) as e:
+                self._failed("read", p.address, p.count, e)
+                results.append(None)
+                continue
+            results.append(self._read_done(p, rr))
+        self._dispatch(reads, cbs, plans, results)
+        return self.pdus_failed - failed
+
+    async def flush_async(self, client: Any, unit_id: int = 1) -> int:
+        """Jak flush(), ale na połączonym AsyncModbusTcpClient (AsyncTrafficEngine)."""
+        reads, cbs, writes = self._take()
+        failed = self.pdus_failed
+
+        for w in plan_writes(writes, allow_fc16=self.allow_fc16):
+            self.pdus_sent += 1
+            try:
+                with self._time(w.func) as t:
+                    if w.func == 16:
+                        rq = t.check(await client.write_registers(w.address, w.values, unit=unit_id))
+                    else:
+                        rq = t.check(await client.write_register(w.address, w.values[0], unit=unit_id))
+            except (ModbusException, OSError) as e:
+                self._failed("write", w.address, len(w.values), e)
+                continue
+            self._write_done(w, rq)
+
+        plans = plan_reads(reads, max_count=self.max_read, max_gap=self.max_gap)
+        results: List[Optional[List[int]]] = []
+        for p in plans:
+            self.pdus_sent += 1
+            try:
+                with self._time(3) as t:
+                    rr = t.check(await client.read_holding_registers(p.address, p.count, unit=unit_id))
+            except (ModbusException, OSError) as e:
+                self._failed("read", p.address, p.count, e)
+                results.append(None)
+                continue
+            results.append(self._read_done(p, rr))
+        self._dispatch(reads, cbs, plans, results)
+        return self.pdus_failed - failed
+
+    def flush_pooled(self, cfg: Optional[PlcConfig] = None) -> int:
+        """flush() na połączeniu wypożyczonym z globalnej puli."""
+        cfg = cfg or get_plc_config()
+        with get_connection_pool().connection(cfg) as client:
+            return self.flush(client, cfg.unit_id)
+
+    def flush_pipelined(self, client: "PipelinedModbusClient") -> int:
+        """Wykonanie na PipelinedModbusClient - wszystkie PDU ticku lecą naraz."""
+        reads, cbs, writes = self._take()
+        failed = self.pdus_failed
+
+        for w in plan_writes(writes, allow_fc16=self.allow_fc16):
+            self.pdus_sent += 1
+            try:
+                if w.func == 16:
+                    client.write_registers(w.address, w.values)
+                else:
+                    client.write_register(w.address, w.values[0])
+            except ConnectionException as e:
+                self._failed("write", w.address, len(w.values), e)
+
+        plans = plan_reads(reads, max_count=self.max_read, max_gap=self.max_gap)
+        results: List[Optional[List[int]]] = [None] * len(plans)
+
+        def collect(k: int) -> Callable[[PipelinedResult], None]:
+            def cb(res: PipelinedResult) -> None:
+                if res.ok:
+                    results[k] = res.registers
+                else:
+                    self.pdus_failed += 1
+            return cb
+
+        for k, p in enumerate(plans):
+            self.pdus_sent += 1
+            try:
+                client.read_holding_registers(p.address, p.count, callback=collect(k))
+            except ConnectionException as e:
+                self._failed("read", p.address, p.count, e)
+        try:
+            client.drain()
+        except (ConnectionException, OSError) as e:
+            log.warning("Batched pipelined drain failed: %r", e)
+        self._dispatch(reads, cbs, plans, results)
+        return self.pdus_failed - failed
+
+    @staticmethod
+    def _dispatch(reads, cbs, plans, results) -> None:
+        for cb, values in zip(cbs, split_read_results(reads, plans, results)):
+            if cb is not None:
+                cb(values)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "logical_requests": self.logical_requests,
+            "pdus_sent": self.pdus_sent,
+            "pdus_failed": self.pdus_failed,
+            "pdu_ratio": (self.pdus_sent / self.logical_requests) if self.logical_requests else 0.0,
+        }
+
+
+def read_holding_registers_batch(
+    ranges: Sequence[Tuple[int, int]],
+    cfg: Optional[PlcConfig] = None,
+) -> List[Optional[List[int]]]:
+    """
+    Wiele logicznych odczytów (address, count) jednym przejściem przez pulę,
+    z coalescingiem do minimalnej liczby FC3. None = PDU zakończone błędem.
+    """
+    cfg = cfg or get_plc_config()
+    plans = plan_reads(ranges)
+
+    def op(client: ModbusTcpClient) -> List[Optional[List[int]]]:
+        out: List[Optional[List[int]]] = []
+        for p in plans:
+            rr = client.read_holding_registers(p.address, p.count, unit=cfg.unit_id)
+            out.append(None if rr.isError() else list(rr.registers))
+        return out
+
+    return split_read_results(ranges, plans, get_connection_pool().execute(cfg, op))
@@ -0,0 +1,247 @@
+# injector/core/scheduler.py
+
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# ----------------------------
+# Arrival processes (odstępy między kolejnymi żądaniami)
+# ----------------------------
+
+class Arrival:
+    """Bazowy proces przybyć: rate = docelowe qps (0 = bez limitu)."""
+    rate: float = 0.0
+
+    def next_interval(self) -> float:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+
+class FixedRate(Arrival):
+    def __init__(self, qps: float):
+        self.rate = max(0.0, qps)
+        self._period = 1.0 / qps if qps > 0 else 0.0
+
+    def next_interval(self) -> float:
+        return self._period
+
+    def describe(self) -> str:
+        return f"fixed({self.rate:g}/s)"
+
+
+class Jittered(Arrival):
+    """Okres period_s ± jitter_s (jednostajnie) - jak dotychczasowe HMI / normal client."""
+
+    def __init__(self, period_s: float, jitter_s: float = 0.0, rng: Optional[random.Random] = None):
+        self.period_s = max(0.0, period_s)
+        self.jitter_s = abs(jitter_s)
+        self.rate = 1.0 / period_s if period_s > 0 else 0.0
+        self._rng = rng or random.Random()
+
+    def next_interval(self) -> float:
+        return max(0.0, self.period_s + self._rng.uniform(-self.jitter_s, self.jitter_s))
+
+    def describe(self) -> str:
+        return f"jitter({self.period_s:g}s±{self.jitter_s:g}s)"
+
+
+class Poisson(Arrival):
+    """Wykładnicze odstępy - proces Poissona o średniej intensywności qps."""
+
+    def __init__(self, qps: float, rng: Optional[random.Random] = None):
+        self.rate = max(0.0, qps)
+        self._rng = rng or random.Random()
+
+    def next_interval(self) -> float:
+        return self._rng.expovariate(self.rate) if self.rate > 0 else 0.0
+
+    def describe(self) -> str:
+        return f"poisson({self.rate:g}/s)"
+
+
+class Burst(Arrival):
+    """
+    Paczki po burst_size żądań wysyłanych od razu, paczki co burst_size/qps s
+    - średnio nadal qps.
+    """
+
+    def __init__(self, qps: float, burst_size: int = 10):
+        self.rate = max(0.0, qps)
+        self.burst_size = max(1, burst_size)
+        self._gap = self.burst_size / qps if qps > 0 else 0.0
+        self._i = 0
+
+    def next_interval(self) -> float:
+        self._i += 1
+        if self._i >= self.burst_size:
+            self._i = 0
+            return self._gap
+        return 0.0
+
+    def describe(self) -> str:
+        return f"burst({self.rate:g}/s x{self.burst_size})"
+
+
+def make_arrival(kind: str, qps: float, jitter_s: float = 0.0, burst_size: int = 10) -> Arrival:
+    """kind: "fixed" | "jitter" | "poisson" | "burst"."""
+    if kind == "fixed":
+        return FixedRate(qps)
+    if kind == "jitter":
+        return Jittered(1.0 / qps if qps > 0 else 0.0, jitter_s)
+    if kind == "poisson":
+        return Poisson(qps)
+    if kind == "burst":
+        return Burst(qps, burst_size)
+    raise ValueError(f"Unknown arrival process: {kind}")
+
+
+# ----------------------------
+# Harmonogram z absolutnymi deadline'ami
+# ----------------------------
+
+class RateSchedule:
+    """
+    Harmonogram jednego generatora. Kolejny deadline = poprzedni deadline + odstęp,
+    a nie "teraz + odstęp" - czas wykonania żądania (RTT do PLC) nie zaniża tempa
+    i nic nie dryfuje. Gdy generator nie nadąża, kolejne żądania idą od razu
+    (nadrabianie), ale tylko do max_lag_s - większe opóźnienie przesuwa harmonogram
+    (skipped), zamiast wypuszczać lawinę żądań.
+
+    Jeden harmonogram = jeden wątek / jedna coroutine.
+    """
+
+    def __init__(self, name: str, arrival: Arrival, max_lag_s: float = 1.0):
+        self.name = name
+        self.arrival = arrival
+        self.max_lag_s = max_lag_s
+
+        self._next: Optional[float] = None
+        self._started: Optional[float] = None
+        self._last: Optional[float] = None
+
+        self.ticks = 0
+        self.skipped = 0
+        self.late_ticks = 0
+        self.lateness_sum = 0.0
+        self.lateness_max = 0.0
+
+    def _advance(self, now: float) -> float:
+        """Wylicza następny deadline; zwraca ile trzeba jeszcze czekać."""
+        if self._next is None:
+            self._started = self._next = now
+            return 0.0
+        self._next += self.arrival.next_interval()
+        behind = now - self._next
+        if behind > self.max_lag_s:
+            if self.arrival.rate > 0:
+                self.skipped += int(behind * self.arrival.rate)
+            self._next = now
+            return 0.0
+        return -behind
+
+    def _record(self, now: float) -> None:
+        late = now - self._next
+        if late > 0:
+            self.lateness_sum += late
+            if late > self.lateness_max:
+                self.lateness_max = late
+            if late > 0.001:
+                self.late_ticks += 1
+        self.ticks += 1
+        self._last = now
+
+    def wait(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Czeka do następnego deadline'u. False = ustawiono stop_event (koniec pętli).
+        """
+        delay = self._advance(time.perf_counter())
+        if delay > 0:
+            if stop_event is not None:
+                if stop_event.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+        elif stop_event is not None and stop_event.is_set():
+            return False
+        self._record(time.perf_counter())
+        return True
+
+    async def wait_async(self) -> None:
+        """Wersja dla coroutines (koniec przez anulowanie taska)."""
+        delay = self._advance(time.perf_counter())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._record(time.perf_counter())
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = (self._last - self._started) if self._started is not None and self._last else 0.0
+        achieved = (self.ticks - 1) / elapsed if elapsed > 0 and self.ticks > 1 else 0.0
+        return {
+            "arrival": self.arrival.describe(),
+            "target_qps": self.arrival.rate,
+            "achieved_qps": achieved,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "late_ticks": self.late_ticks,
+            "lateness_mean_ms": (self.lateness_sum / self.ticks * 1000.0) if self.ticks else 0.0,
+            "lateness_max_ms": self.lateness_max * 1000.0,
+        }
+
+
+class Scheduler:
+    """
+    Centralny rejestr harmonogramów wszystkich generatorów - jedno miejsce,
+    z którego ScenarioRunner.status() czyta target vs achieved rate i lateness.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schedules: Dict[str, RateSchedule] = {}
+
+    def register(self, name: str, arrival: Arrival, max_lag_s: float = 1.0) -> RateSchedule:
+        sched = RateSchedule(name, arrival, max_lag_s=max_lag_s)
+        with self._lock:
+            self._schedules[name] = sched
+        return sched
+
+    def clear(self) -> None:
+        with self._lock:
+            self._schedules.clear()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            schedules = list(self._schedules.values())
+        generators = {s.name: s.stats() for s in schedules}
+        return {
+            "generators": generators,
+            "total_target_qps": sum(g["target_qps"] for g in generators.values()),
+            "total_achieved_qps": sum(g["achieved_qps"] for g in generators.values()),
+        }
+
+
+_SCHEDULER: Optional[Scheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = Scheduler()
+        return _SCHEDULER
+
+
+def current_name(default: str) -> str:
+    """Nazwa bieżącego taska asyncio albo wątku - klucz harmonogramu generatora."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    name = threading.current_thread().name
+    return default if name == "MainThread" else name
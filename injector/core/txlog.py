@@ -0,0 +1,210 @@
+# injector/core/txlog.py
+"""
+Binarny log transakcji Modbus pisany bezpośrednio przez proxy - jeden rekord
+o stałej szerokości na dopasowaną parę request/response, bez dumpcap -> pcap
+-> tshark -> parsowania tekstu.
+
+Segment (plik .bin, tylko dopisywanie):
+  nagłówek 16 B: MAGIC(8) record_size(u32) reserved(u32)
+  rekordy TXLOG_RECORD (little-endian, bez wyrównania), patrz TXLOG_DTYPE.
+
+Zapis jest buforowany (buffer_records rekordów w bytearray, jeden write()),
+po segment_records rekordach otwierany jest nowy segment. Odczyt:
+read_segment() mapuje plik (np.memmap) jako tablicę strukturalną - ucięty
+ostatni rekord (np. po awarii) jest pomijany.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"MBTXLOG1"
+SEGMENT_HEADER = struct.Struct("<8sII")
+
+# ts(wall), conn, tid, unit, func, address, count, exc, spoofed, req_len, rsp_len, latency_us
+TXLOG_RECORD = struct.Struct("<dIHBBHHBBHHI")
+TXLOG_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("conn", "<u4"),
+    ("tid", "<u2"),
+    ("unit", "u1"),
+    ("func", "u1"),
+    ("address", "<u2"),
+    ("count", "<u2"),
+    ("exc", "u1"),          # kod wyjątku Modbus (0 = poprawna odpowiedź)
+    ("spoofed", "u1"),      # liczba podmienionych rejestrów (max 255)
+    ("req_len", "<u2"),
+    ("rsp_len", "<u2"),
+    ("latency_us", "<u4"),
+])
+assert TXLOG_DTYPE.itemsize == TXLOG_RECORD.size
+
+DEFAULT_SEGMENT_RECORDS = 1_000_000     # ~30 MB na segment
+DEFAULT_BUFFER_RECORDS = 4096
+
+
+class TxLogWriter:
+    """
+    Append-only writer segmentów. append() jest bezpieczne dla wielu wątków
+    (forward_stream w trybie threads), kosztuje jedno struct.pack_into.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        prefix: str = "txlog",
+        segment_records: int = DEFAULT_SEGMENT_RECORDS,
+        buffer_records: int = DEFAULT_BUFFER_RECORDS,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.segment_records = segment_records
+        self.buffer_records = buffer_records
+
+        self._lock = threading.Lock()
+        self._buf = bytearray(buffer_records * TXLOG_RECORD.size)
+        self._n_buf = 0
+        self._file = None
+        self._segment_index = -1
+        self._segment_count = 0
+        self.segments: List[Path] = []
+        self.records = 0
+        self._closed = False
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._segment_index += 1
+        path = self.directory / f"{self.prefix}-{self._segment_index:05d}.bin"
+        self._file = path.open("wb", buffering=0)
+        self._file.write(SEGMENT_HEADER.pack(MAGIC, TXLOG_RECORD.size, 0))
+        self._segment_count = 0
+        self.segments.append(path)
+        log.debug("TxLog segment opened: %s", path)
+
+    def _flush_locked(self) -> None:
+        if not self._n_buf or self._file is None:
+            return
+        self._file.write(memoryview(self._buf)[:self._n_buf * TXLOG_RECORD.size])
+        self._segment_count += self._n_buf
+        self._n_buf = 0
+        if self._segment_count >= self.segment_records:
+            self._open_segment()
+
+    def append(self, ts: float, conn: int, tid: int, unit: int, func: int, address: int, count: int,
+               exc: int, spoofed: int, req_len: int, rsp_len: int, latency_us: int) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            TXLOG_RECORD.pack_into(
+                self._buf, self._n_buf * TXLOG_RECORD.size,
+                ts, conn & 0xFFFFFFFF, tid, unit, func & 0xFF, address, count,
+                exc, min(spoofed, 255), req_len, rsp_len, min(latency_us, 0xFFFFFFFF),
+            )
+            self._n_buf += 1
+            self.records += 1
+            # flush też na granicy segmentu - segment ma dokładnie segment_records rekordów
+            if self._n_buf >= self.buffer_records or self._segment_count + self._n_buf >= self.segment_records:
+                self._flush_locked()
+
+    def record_pair(self, conn: int, tid: int, unit: int, req: Any, rsp_func: int,
+                    exc: Optional[int], rsp_len: int, spoofed: int = 0) -> None:
+        """Rekord z PendingReq (func, start_addr, count, ts monotonic, size) i odpowiedzi."""
+        latency_us = int((time.monotonic() - req.ts) * 1_000_000)
+        self.append(time.time(), conn, tid, unit, req.func, req.start_addr, req.count,
+                    exc or 0, spoofed, req.size, rsp_len, max(0, latency_us))
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        log.info("TxLog closed: %d records in %d segments (%s)", self.records, len(self.segments), self.directory)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "records": self.records,
+            "segments": len(self.segments),
+            "buffered": self._n_buf,
+        }
+
+
+# ----------------------------
+# Odczyt
+# ----------------------------
+
+def read_segment(path: Union[str, Path]) -> np.ndarray:
+    """Segment jako tablica strukturalna TXLOG_DTYPE (np.memmap, bez kopiowania)."""
+    path = Path(path)
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        magic, rec_size, _ = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+    if magic != MAGIC or rec_size != TXLOG_DTYPE.itemsize:
+        raise ValueError(f"Not a txlog segment (or incompatible version): {path}")
+    n = (size - SEGMENT_HEADER.size) // rec_size
+    if n <= 0:
+        return np.zeros(0, dtype=TXLOG_DTYPE)
+    return np.memmap(path, dtype=TXLOG_DTYPE, mode="r", offset=SEGMENT_HEADER.size, shape=(n,))
+
+
+def segment_paths(directory: Union[str, Path]) -> List[Path]:
+    return sorted(Path(directory).glob("*.bin"))
+
+
+def read_txlog(directory: Union[str, Path]) -> np.ndarray:
+    """Wszystkie segmenty katalogu (jedna kopia do pamięci), posortowane po ts."""
+    parts = [read_segment(p) for p in segment_paths(directory)]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return np.zeros(0, dtype=TXLOG_DTYPE)
+    data = np.concatenate(parts)
+    return data[np.argsort(data["ts"], kind="stable")]
+
+
+# ----------------------------
+# Globalny writer procesu (proxy)
+# ----------------------------
+
+_TXLOG: Optional[TxLogWriter] = None
+_TXLOG_LOCK = threading.Lock()
+
+
+def open_txlog(directory: Union[str, Path], prefix: Optional[str] = None, **kwargs: Any) -> TxLogWriter:
+    """Otwiera writer procesu (zamyka poprzedni); prefix domyślnie txlog-<pid>."""
+    global _TXLOG
+    with _TXLOG_LOCK:
+        if _TXLOG is not None:
+            _TXLOG.close()
+        _TXLOG = TxLogWriter(directory, prefix=prefix or f"txlog-{os.getpid()}", **kwargs)
+        return _TXLOG
+
+
+def get_txlog() -> Optional[TxLogWriter]:
+    return _TXLOG
+
+
+def close_txlog() -> None:
+    global _TXLOG
+    with _TXLOG_LOCK:
+        if _TXLOG is not None:
+            _TXLOG.close()
+            _TXLOG = None
@@ -0,0 +1,277 @@
+# injector/sim/plc_sim.py
+"""
+Lokalny symulator PLC (Modbus/TCP server na asyncio) - zastępstwo dla OpenPLC
+przy testach przepustowości i na maszynach bez PLC (CI).
+
+Obsługuje FC1/2/3/4/5/6/15/16. Banki:
+  - holding / input registers: array('H') (2 B na rejestr, bez obiektów int),
+  - coils / discrete inputs: bytearray (1 B na bit, 0/1).
+
+Ramki dekodujemy wsadowo przez injector.core.mbap (bez kopiowania),
+odpowiedzi na wszystkie żądania z jednego recv() idą jednym write().
+"""
+
+import asyncio
+import logging
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Dict, List, Optional
+
+from injector.core import mbap
+
+log = logging.getLogger(__name__)
+
+SIM_DEFAULT_HOST = "127.0.0.1"
+SIM_DEFAULT_PORT = 5020
+
+BANK_SIZE = 65536
+
+# kody wyjątków Modbus
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+ILLEGAL_DATA_VALUE = 3
+
+_SWAP = sys.byteorder == "little"   # array('H') jest w natywnym porządku, Modbus w big-endian
+
+_MAX_READ_BITS = 2000
+_MAX_READ_REGS = 125
+_MAX_WRITE_BITS = 1968
+_MAX_WRITE_REGS = 123
+
+
+def _regs_to_wire(bank: array, address: int, count: int) -> bytes:
+    chunk = bank[address:address + count]
+    if _SWAP:
+        chunk.byteswap()
+    return chunk.tobytes()
+
+
+def _regs_from_wire(data: memoryview) -> array:
+    regs = array("H")
+    regs.frombytes(data)
+    if _SWAP:
+        regs.byteswap()
+    return regs
+
+
+def _pack_bits(bits: bytearray, address: int, count: int) -> bytes:
+    out = bytearray((count + 7) // 8)
+    for i in range(count):
+        if bits[address + i]:
+            out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+
+class PlcSimulator:
+    """
+    Modbus/TCP server z bankami rejestrów w pamięci.
+
+    - service_delay_s: sztuczny czas obsługi każdego żądania (jak cykl PLC),
+      żądania z jednego połączenia są obsługiwane po kolei,
+    - max_connections: limit równoczesnych połączeń (0 = bez limitu),
+      nadmiarowe połączenia są od razu zamykane,
+    - unit_id: None = odpowiada na każdy Unit ID, inaczej obce ramki są ignorowane.
+
+    run() jest blokujące (stop_event / ready_event jak run_modbus_proxy),
+    serve() to wersja dla istniejącej pętli asyncio.
+    """
+
+    def __init__(
+        self,
+        host: str = SIM_DEFAULT_HOST,
+        port: int = SIM_DEFAULT_PORT,
+        unit_id: Optional[int] = None,
+        service_delay_s: float = 0.0,
+        max_connections: int = 0,
+        size: int = BANK_SIZE,
+    ):
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.service_delay_s = service_delay_s
+        self.max_connections = max_connections
+        self.size = size
+
+        self.holding = array("H", bytes(2 * size))
+        self.input = array("H", bytes(2 * size))
+        self.coils = bytearray(size)
+        self.discrete = bytearray(size)
+
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.connections_total = 0
+        self.connections_rejected = 0
+        self.requests = 0
+        self.exceptions = 0
+        self.by_function: Dict[int, int] = {}
+
+    # --- obsługa PDU ---
+
+    def _check_range(self, address: int, count: int, limit: int) -> Optional[int]:
+        if count < 1 or count > limit:
+            return ILLEGAL_DATA_VALUE
+        if address + count > self.size:
+            return ILLEGAL_DATA_ADDRESS
+        return None
+
+    def handle_frame(self, frame: mbap.FrameView) -> Optional[bytes]:
+        """Zwraca gotową ramkę odpowiedzi (albo None, gdy żądanie ignorujemy)."""
+        if self.unit_id is not None and frame.unit_id != self.unit_id:
+            return None
+        func = frame.func
+        if func < 0:
+            return None
+        self.by_function[func] = self.by_function.get(func, 0) + 1
+
+        rng = frame.request_range()
+        if rng is None:
+            return self._exception(frame, func, ILLEGAL_DATA_VALUE)
+        _, address, count = rng
+        pdu = frame.pdu
+
+        if func in (3, 4):
+            err = self._check_range(address, count, _MAX_READ_REGS)
+            if err:
+                return self._exception(frame, func, err)
+            bank = self.holding if func == 3 else self.input
+            data = _regs_to_wire(bank, address, count)
+            return mbap.HEADER.pack(frame.tid, frame.pid, 3 + len(data), frame.unit_id) + bytes((func, len(data))) + data
+
+        if func in (1, 2):
+            err = self._check_range(address, count, _MAX_READ_BITS)
+            if err:
+                return self._exception(frame, func, err)
+            data = _pack_bits(self.coils if func == 1 else self.discrete, address, count)
+            return mbap.HEADER.pack(frame.tid, frame.pid, 3 + len(data), frame.unit_id) + bytes((func, len(data))) + data
+
+        if func == 6:
+            if address >= self.size:
+                return self._exception(frame, func, ILLEGAL_DATA_ADDRESS)
+            self.holding[address] = count     # dla FC6 "count" to wartość
+            return frame.tobytes()            # echo żądania
+
+        if func == 5:
+            if count not in (0x0000, 0xFF00):
+                return self._exception(frame, func, ILLEGAL_DATA_VALUE)
+            if address >= self.size:
+                return self._exception(frame, func, ILLEGAL_DATA_ADDRESS)
+            self.coils[address] = 1 if count else 0
+            return frame.tobytes()
+
+        if func in (15, 16):
+            limit = _MAX_WRITE_REGS if func == 16 else _MAX_WRITE_BITS
+            err = self._check_range(address, count, limit)
+            if err:
+                return self._exception(frame, func, err)
+            byte_count = pdu[5] if len(pdu) > 5 else -1
+            expected = 2 * count if func == 16 else (count + 7) // 8
+            if byte_count != expected or len(pdu) < 6 + byte_count:
+                return self._exception(frame, func, ILLEGAL_DATA_VALUE)
+            data = pdu[6:6 + byte_count]
+            if func == 16:
+                self.holding[address:address + count] = _regs_from_wire(data)
+            else:
+                for i in range(count):
+                    self.coils[address + i] = (data[i >> 3] >> (i & 7)) & 1
+            return mbap.HEADER.pack(frame.tid, frame.pid, 6, frame.unit_id) + struct.pack(">BHH", func, address, count)
+
+        return self._exception(frame, func, ILLEGAL_FUNCTION)
+
+    def _exception(self, frame: mbap.FrameView, func: int, code: int) -> bytes:
+        self.exceptions += 1
+        return mbap.HEADER.pack(frame.tid, frame.pid, 3, frame.unit_id) + bytes(((func | 0x80) & 0xFF, code))
+
+    # --- serwer ---
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        with self._lock:
+            if self.max_connections and self.connections >= self.max_connections:
+                self.connections_rejected += 1
+                reject = True
+            else:
+                self.connections += 1
+                self.connections_total += 1
+                reject = False
+        if reject:
+            log.warning("PLC sim: connection limit reached, rejecting %s", peer)
+            writer.close()
+            return
+
+        log.debug("PLC sim: client connected %s", peer)
+        buf = bytearray()
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                buf += chunk
+                frames, consumed = mbap.split_frames(buf)
+                if not frames:
+                    continue
+
+                out: List[bytes] = []
+                for frame in frames:
+                    if self.service_delay_s > 0:
+                        await asyncio.sleep(self.service_delay_s)
+                    rsp = self.handle_frame(frame)
+                    if rsp is not None:
+                        if self.service_delay_s > 0:
+                            writer.write(rsp)
+                        else:
+                            out.append(rsp)
+                self.requests += len(frames)
+                del buf[:consumed]
+
+                if out:
+                    writer.write(b"".join(out))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # zamknięcie symulatora - asyncio.run() anuluje otwarte połączenia
+            pass
+        finally:
+            with self._lock:
+                self.connections -= 1
+            writer.close()
+            log.debug("PLC sim: client disconnected %s", peer)
+
+    async def serve(self, stop_event: Optional[threading.Event] = None,
+                    ready_event: Optional[threading.Event] = None) -> None:
+        server = await asyncio.start_server(
+            self._handle_client, self.host, self.port, reuse_address=True, backlog=1024
+        )
+        log.info("PLC simulator listening on %s:%s (delay=%.3f ms, max_connections=%s)",
+                 self.host, self.port, self.service_delay_s * 1000.0, self.max_connections or "inf")
+        if ready_event is not None:
+            ready_event.set()
+        async with server:
+            if stop_event is None:
+                await server.serve_forever()
+            else:
+                # threading.Event nie ma wersji awaitable -> polling co 100 ms
+                while not stop_event.is_set():
+                    await asyncio.sleep(0.1)
+        log.info("PLC simulator stopped (%d requests)", self.requests)
+
+    def run(self, stop_event: Optional[threading.Event] = None,
+            ready_event: Optional[threading.Event] = None) -> None:
+        try:
+            asyncio.run(self.serve(stop_event, ready_event))
+        except KeyboardInterrupt:
+            log.info("PLC simulator interrupted by user")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "listen": f"{self.host}:{self.port}",
+                "connections": self.connections,
+                "connections_total": self.connections_total,
+                "connections_rejected": self.connections_rejected,
+                "requests": self.requests,
+                "exceptions": self.exceptions,
+                "by_function": dict(self.by_function),
+            }
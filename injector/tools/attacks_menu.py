@@ -7,6 +7,7 @@ from dataclasses import replace
 
 from injector.core.logging_setup import setup_logging
 from injector.core.config import get_plc_config
+from injector.core.modbus import close_connection_pool
 from injector.traffic.hmi_master import run_hmi_loop
 from injector.traffic.normal_client import run_normal_client
 from injector.attacks.scan_readonly import run_scan_readonly
@@ -44,6 +45,7 @@ def _main_loop_with_threads(*threads: threading.Thread, stop_event: threading.Ev
         for t in threads:
             t.join(timeout=2.0)
     finally:
+        close_connection_pool()
         pid = stop_capture()
         log.info("[MainThread] Scenario finished. Capture PID stopped: %s", pid)
 
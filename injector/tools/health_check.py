@@ -1,17 +1,24 @@
+import argparse
 import time
 import logging
 
 from injector.core.logging_setup import setup_logging
 from injector.core.config import get_plc_config
 from injector.core import modbus
+from injector.core.metrics import percentile
 
 log = logging.getLogger(__name__)
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="PLC health check (heartbeat + latency)")
+    parser.add_argument("--samples", type=int, default=100, help="liczba próbek opóźnienia")
+    parser.add_argument("--interval", type=float, default=0.05, help="odstęp między próbkami [s]")
+    args = parser.parse_args()
+
     setup_logging("INFO")
     cfg = get_plc_config()
     log.info("Starting PLC health check for %s:%s (unit %s)",
-             cfg.host, cfg.port, cfg.unit_id)
+             cfg.effective_host, cfg.effective_port, cfg.unit_id)
 
     # 1. Odczyt heartbeat_register
     hr_addr = cfg.heartbeat_register
@@ -22,27 +29,32 @@ def main() -> None:
         log.error("Failed to read heartbeat register: %s", e)
         return
 
-    # 2. Pomiary czasu odpowiedzi (np. 10 próbek)
-    samples = 10
+    # 2. Pomiary czasu odpowiedzi
     latencies = []
-    for i in range(samples):
+    errors = 0
+    for i in range(args.samples):
         t0 = time.perf_counter()
         try:
             _ = modbus.read_holding_registers(hr_addr, 1, cfg)
         except Exception as e:
             log.error("Error during sample %s: %s", i, e)
+            errors += 1
             continue
         dt = (time.perf_counter() - t0) * 1000.0  # ms
         latencies.append(dt)
-        time.sleep(0.1)
+        time.sleep(args.interval)
 
     if not latencies:
         log.error("No successful samples, PLC health check failed")
         return
 
     avg = sum(latencies) / len(latencies)
-    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
-    log.info("Latency: mean=%.2f ms, p95=%.2f ms (n=%d)", avg, p95, len(latencies))
+    # nearest-rank na surowych próbkach - dokładny także dla małego n
+    p50 = percentile(latencies, 50)
+    p95 = percentile(latencies, 95)
+    p99 = percentile(latencies, 99)
+    log.info("Latency: mean=%.2f ms, p50=%.2f ms, p95=%.2f ms, p99=%.2f ms, max=%.2f ms (n=%d, errors=%d)",
+             avg, p50, p95, p99, max(latencies), len(latencies), errors)
     log.info("PLC health check OK")
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+# injector/tools/plc_sim_cli.py
+
+import argparse
+import logging
+
+from injector.core.logging_setup import setup_logging
+from injector.sim.plc_sim import PlcSimulator, SIM_DEFAULT_HOST, SIM_DEFAULT_PORT
+
+log = logging.getLogger(__name__)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokalny symulator PLC (Modbus/TCP)")
+    parser.add_argument("--host", default=SIM_DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=SIM_DEFAULT_PORT)
+    parser.add_argument("--unit-id", type=int, default=None, help="domyślnie: odpowiada na każdy Unit ID")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="czas obsługi jednego żądania")
+    parser.add_argument("--max-connections", type=int, default=0, help="0 = bez limitu")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+    sim = PlcSimulator(
+        host=args.host,
+        port=args.port,
+        unit_id=args.unit_id,
+        service_delay_s=args.delay_ms / 1000.0,
+        max_connections=args.max_connections,
+    )
+    sim.run()
+    log.info("PLC simulator stats: %s", sim.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# injector/traffic/async_engine.py
+
+import asyncio
+import logging
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymodbus.client import AsyncModbusTcpClient
+
+from injector.core.config import PlcConfig, get_plc_config
+from injector.traffic.hmi_master import hmi_master_task
+from injector.traffic.normal_client import normal_client_task
+from injector.attacks.scan_readonly import scan_readonly_task
+from injector.attacks.write_injection import write_injection_task
+from injector.attacks.mass_overwrite import spoofing_task
+
+log = logging.getLogger(__name__)
+
+# kind -> coroutine(client, cfg, **params)
+BEHAVIOURS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "hmi": hmi_master_task,
+    "normal": normal_client_task,
+    "scan_readonly": scan_readonly_task,
+    "write_injection": write_injection_task,
+    "mass_overwrite": spoofing_task,
+}
+
+
+@dataclass
+class MasterSpec:
+    """
+    Jeden symulowany Modbus master: własne połączenie TCP i własny harmonogram.
+    cfg=None -> konfiguracja silnika.
+    """
+    kind: str
+    name: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    cfg: Optional[PlcConfig] = None
+
+
+def replicate(kind: str, prefix: str, n: int, **params: Any) -> List[MasterSpec]:
+    """N identycznie sparametryzowanych masterów: HMI_000, HMI_001, ..."""
+    return [MasterSpec(kind=kind, name=f"{prefix}_{i:03d}", params=dict(params)) for i in range(n)]
+
+
+class AsyncTrafficEngine:
+    """
+    Uruchamia wiele masterów (HMI, normal client, ataki) jako coroutines
+    na jednej pętli asyncio - zamiast jednego wątku OS na mastera.
+
+    run() jest blokujące i pasuje do _make_thread / threading.Thread:
+    kończy się, gdy stop_event zostanie ustawiony.
+    """
+
+    def __init__(
+        self,
+        specs: List[MasterSpec],
+        *,
+        cfg: Optional[PlcConfig] = None,
+        stop_event: Optional[threading.Event] = None,
+        connect_concurrency: int = 50,
+        timeout_s: float = 3.0,
+    ):
+        for spec in specs:
+            if spec.kind not in BEHAVIOURS:
+                raise ValueError(f"Unknown master kind: {spec.kind}")
+        self.specs = list(specs)
+        self.cfg = cfg or get_plc_config()
+        self.stop_event = stop_event or threading.Event()
+        self.connect_concurrency = connect_concurrency
+        self.timeout_s = timeout_s
+
+        self._lock = threading.Lock()
+        self._connected = 0
+        self._failed = 0
+
+    def status(self) -> Dict[str, Any]:
+        by_kind: Dict[str, int] = {}
+        for spec in self.specs:
+            by_kind[spec.kind] = by_kind.get(spec.kind, 0) + 1
+        with self._lock:
+            return {
+                "engine": "asyncio",
+                "masters": len(self.specs),
+                "masters_by_kind": by_kind,
+                "connected": self._connected,
+                "connect_failed": self._failed,
+            }
+
+    def run(self) -> None:
+        log.info("Async traffic engine starting %d masters", len(self.specs))
+        asyncio.run(self._main())
+        log.info("Async traffic engine stopped")
+
+    async def _main(self) -> None:
+        connect_sem = asyncio.Semaphore(self.connect_concurrency)
+        tasks = [
+            asyncio.create_task(self._run_master(spec, connect_sem), name=spec.name)
+            for spec in self.specs
+        ]
+
+        # threading.Event nie ma wersji awaitable -> tani polling co 100 ms
+        while not self.stop_event.is_set():
+            await asyncio.sleep(0.1)
+
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_master(self, spec: MasterSpec, connect_sem: asyncio.Semaphore) -> None:
+        cfg = spec.cfg or self.cfg
+        behaviour = BEHAVIOURS[spec.kind]
+
+        # rozsuwamy starty, żeby setki masterów nie strzelały w tej samej chwili
+        period = spec.params.get("period_s", 0.5)
+        await asyncio.sleep(random.uniform(0.0, max(period, 0.0)))
+
+        client = AsyncModbusTcpClient(cfg.effective_host, port=cfg.effective_port, timeout=self.timeout_s)
+        connected = False
+        try:
+            async with connect_sem:
+                ok = await client.connect()
+            if not ok:
+                with self._lock:
+                    self._failed += 1
+                log.warning("[%s] could not connect to %s:%s",
+                            spec.name, cfg.effective_host, cfg.effective_port)
+                return
+
+            connected = True
+            with self._lock:
+                self._connected += 1
+            log.debug("[%s] connected to %s:%s", spec.name, cfg.effective_host, cfg.effective_port)
+
+            await behaviour(client, cfg, **spec.params)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.warning("[%s] master crashed: %r", spec.name, e)
+        finally:
+            client.close()
+            if connected:
+                with self._lock:
+                    self._connected -= 1
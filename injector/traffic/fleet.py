@@ -0,0 +1,200 @@
+# injector/traffic/fleet.py
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from injector.core.config import PlcConfig
+from injector.core.logging_setup import setup_logging
+from injector.core.modbus import close_connection_pool, get_connection_pool
+from injector.core.metrics import get_metrics
+from injector.core.scheduler import get_scheduler
+from injector.traffic.scenarios import ENGINES, launch_masters, scenario_masters
+
+log = logging.getLogger(__name__)
+
+
+def shard_plcs(plcs: Sequence[PlcConfig], plcs_per_process: int) -> List[List[PlcConfig]]:
+    n = max(1, plcs_per_process)
+    return [list(plcs[i:i + n]) for i in range(0, len(plcs), n)]
+
+
+def _shard_main(
+    shard_id: int,
+    scenario: str,
+    plcs: List[PlcConfig],
+    engine: str,
+    hmi_count: int,
+    normal_count: int,
+    stop_event,
+    status_q,
+    report_every_s: float,
+) -> None:
+    """
+    Proces-worker: uruchamia generatory scenariusza dla swojego kawałka floty
+    i co report_every_s wysyła status do rodzica.
+    """
+    setup_logging("INFO")
+    local_stop = threading.Event()
+
+    masters = [
+        (cfg, m)
+        for cfg in plcs
+        for m in scenario_masters(scenario, cfg, hmi_count=hmi_count,
+                                  normal_count=normal_count, prefix=f"{cfg.name}/")
+    ]
+    threads, engine_obj = launch_masters(masters, local_stop, engine)
+    log.info("Fleet shard %d: %d PLC, %d masters (engine=%s)", shard_id, len(plcs), len(masters), engine)
+
+    def report(final: bool = False) -> None:
+        sched = get_scheduler().report()
+        st: Dict[str, Any] = {
+            "shard": shard_id,
+            "pid": os.getpid(),
+            "plcs": [cfg.name for cfg in plcs],
+            "masters": len(masters),
+            "alive_threads": sum(t.is_alive() for t in threads),
+            "modbus_pool": get_connection_pool().stats(),
+            # bez rozbicia na generatory - setki wpisów na shard to za dużo na kolejkę
+            "schedulers": {
+                "generators": len(sched["generators"]),
+                "total_target_qps": sched["total_target_qps"],
+                "total_achieved_qps": sched["total_achieved_qps"],
+            },
+            "metrics": get_metrics().by_function(),
+            "final": final,
+            "ts": time.time(),
+        }
+        if engine_obj is not None:
+            st["async_engine"] = engine_obj.status()
+        try:
+            status_q.put_nowait(st)
+        except Exception:
+            pass
+
+    try:
+        while not stop_event.wait(report_every_s):
+            report()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        local_stop.set()
+        for t in threads:
+            t.join(timeout=2.0)
+        close_connection_pool()
+        report(final=True)
+
+
+class FleetLauncher:
+    """
+    Shardowanie generatorów floty PLC na pulę procesów (obejście GIL):
+    jeden proces na plcs_per_process PLC. Status z workerów jest zbierany
+    w wątku rodzica i agregowany w status().
+    """
+
+    def __init__(
+        self,
+        scenario: str,
+        plcs: Sequence[PlcConfig],
+        *,
+        plcs_per_process: int = 4,
+        engine: str = "asyncio",
+        hmi_count: int = 1,
+        normal_count: int = 1,
+        report_every_s: float = 1.0,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if not plcs:
+            raise ValueError("Fleet is empty")
+        self.scenario = scenario
+        self.shards = shard_plcs(plcs, plcs_per_process)
+        self.engine = engine
+        self.hmi_count = hmi_count
+        self.normal_count = normal_count
+        self.report_every_s = report_every_s
+
+        # spawn: działa tak samo na Windows i Linux, worker nie dziedziczy wątków rodzica
+        self._ctx = mp.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._status_q = self._ctx.Queue()
+        self._procs: List[mp.process.BaseProcess] = []
+        self._collector: Optional[threading.Thread] = None
+        self._collector_stop = threading.Event()
+
+        self._lock = threading.Lock()
+        self._shard_status: Dict[int, Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        for shard_id, plcs in enumerate(self.shards):
+            p = self._ctx.Process(
+                name=f"FLEET_SHARD_{shard_id}",
+                target=_shard_main,
+                args=(shard_id, self.scenario, plcs, self.engine, self.hmi_count, self.normal_count,
+                      self._stop, self._status_q, self.report_every_s),
+                daemon=True,
+            )
+            p.start()
+            self._procs.append(p)
+
+        self._collector = threading.Thread(name="FLEET_STATUS", target=self._collect, daemon=True)
+        self._collector.start()
+        log.info("Fleet launcher: %d PLC in %d processes", sum(map(len, self.shards)), len(self.shards))
+
+    def _collect(self) -> None:
+        while not self._collector_stop.is_set():
+            try:
+                st = self._status_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                self._shard_status[st["shard"]] = st
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for p in self._procs:
+            p.join(timeout=max(0.0, deadline - time.monotonic()))
+        for p in self._procs:
+            if p.is_alive():
+                log.warning("Fleet shard %s did not stop in time, terminating", p.name)
+                p.terminate()
+                p.join(timeout=1.0)
+
+        # ostatnie raporty (final=True) mogą jeszcze wisieć w kolejce
+        time.sleep(0.2)
+        self._collector_stop.set()
+        if self._collector is not None:
+            self._collector.join(timeout=2.0)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            shards = [self._shard_status.get(i, {"shard": i}) for i in range(len(self.shards))]
+
+        totals = {"masters": 0, "connected": 0, "requests_served": 0, "connections_opened": 0,
+                  "target_qps": 0.0, "achieved_qps": 0.0}
+        for st in shards:
+            totals["masters"] += st.get("masters", 0)
+            totals["connected"] += st.get("async_engine", {}).get("connected", 0)
+            pool = st.get("modbus_pool", {})
+            totals["requests_served"] += pool.get("requests_served", 0)
+            totals["connections_opened"] += pool.get("connections_opened", 0)
+            sched = st.get("schedulers", {})
+            totals["target_qps"] += sched.get("total_target_qps", 0.0)
+            totals["achieved_qps"] += sched.get("total_achieved_qps", 0.0)
+
+        return {
+            "scenario": self.scenario,
+            "engine": self.engine,
+            "plcs": sum(map(len, self.shards)),
+            "processes": len(self._procs),
+            "processes_alive": sum(p.is_alive() for p in self._procs),
+            "totals": totals,
+            "shards": shards,
+        }
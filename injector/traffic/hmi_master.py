@@ -1,16 +1,25 @@
 # injector/traffic/hmi_master.py
 
 import logging
-import random
-import time
 from typing import Optional
 from threading import Event
 
 from injector.core.config import get_plc_config, PlcConfig
-from injector.core.modbus import modbus_client  # <- ważne
+from injector.core.modbus import RequestBatcher, modbus_client  # <- ważne
+from injector.core.metrics import endpoint_of, get_metrics
+from injector.core.scheduler import Jittered, current_name, get_scheduler
 
 log = logging.getLogger(__name__)
 
+
+def _hmi_reader(base_address: int, count: int):
+    """Callback batchera: None = PDU zakończone błędem (batcher już to zalogował)."""
+    def on_read(values) -> None:
+        if values is not None:
+            log.debug("HMI read HR[%s..%s] = %s", base_address, base_address + count - 1, values)
+    return on_read
+
+
 def run_hmi_loop(
     cfg: Optional[PlcConfig] = None,
     base_address: int = 0,
@@ -28,42 +37,49 @@ def run_hmi_loop(
         jitter_s,
     )
 
+    schedule = get_scheduler().register(current_name("HMI"), Jittered(period_s, jitter_s))
+    fc3 = get_metrics().series(schedule.name, 3, endpoint_of(cfg))
+
+    batcher = RequestBatcher(series={3: fc3})
+    on_read = _hmi_reader(base_address, count)
+
     try:
         with modbus_client(cfg) as client:
             while True:
-                if stop_event is not None and stop_event.is_set():
+                if not schedule.wait(stop_event):
                     log.info("Stop event set, leaving HMI loop")
                     break
 
-                t0 = time.perf_counter()
                 try:
-                    rr = client.read_holding_registers(
-                        base_address, count, unit=cfg.unit_id
-                    )
-                    if rr.isError():
-                        log.warning("HMI read error: %s", rr)
-                    else:
-                        values = list(rr.registers)
-                        log.debug(
-                            "HMI read HR[%s..%s] = %s",
-                            base_address,
-                            base_address + count - 1,
-                            values,
-                        )
+                    batcher.read(base_address, count, on_read)
+                    batcher.flush(client, cfg.unit_id)
                 except Exception as e:
                     log.warning("HMI read exception: %s", e)
 
-                dt = period_s + random.uniform(-jitter_s, jitter_s)
-                if dt < 0.0:
-                    dt = 0.0
-                elapsed = time.perf_counter() - t0
-                sleep_time = max(0.0, dt - elapsed)
-
-                if stop_event is None:
-                    time.sleep(sleep_time)
-                else:
-                    stop_event.wait(timeout=sleep_time)
-
-
     except KeyboardInterrupt:
         log.info("HMI loop interrupted by user")
+
+
+async def hmi_master_task(
+    client,
+    cfg: PlcConfig,
+    base_address: int = 0,
+    count: int = 10,
+    period_s: float = 0.2,
+    jitter_s: float = 0.05,
+) -> None:
+    """
+    Wersja asyncio pętli HMI dla AsyncTrafficEngine.
+    client = połączony AsyncModbusTcpClient; kończy się przez anulowanie taska.
+    """
+    schedule = get_scheduler().register(current_name("HMI"), Jittered(period_s, jitter_s))
+    fc3 = get_metrics().series(schedule.name, 3, endpoint_of(cfg))
+    batcher = RequestBatcher(series={3: fc3})
+    on_read = _hmi_reader(base_address, count)
+    while True:
+        await schedule.wait_async()
+        try:
+            batcher.read(base_address, count, on_read)
+            await batcher.flush_async(client, cfg.unit_id)
+        except Exception as e:
+            log.warning("HMI read exception: %s", e)
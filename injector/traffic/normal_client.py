@@ -2,15 +2,43 @@
 
 import logging
 import random
-import time
 from threading import Event
 from typing import Optional
 
 from injector.core.config import PlcConfig, get_plc_config
-from injector.core.modbus import modbus_client
+from injector.core.modbus import RequestBatcher, modbus_client
+from injector.core.metrics import endpoint_of, get_metrics
+from injector.core.scheduler import Jittered, current_name, get_scheduler
 
 log = logging.getLogger(__name__)
 
+
+def _queue_tick(batcher: RequestBatcher, cfg: PlcConfig, read_base: int, read_count: int,
+                write_prob: float) -> None:
+    """
+    Jeden tick normal clienta w batcherze: odczyt bloku i (z prawdopodobieństwem
+    write_prob) bezpieczny zapis z read-backiem. Batcher wysyła zapis przed odczytami,
+    a read-back leżący w bloku (lub tuż obok) jedzie w tym samym FC3 co blok.
+    """
+    def on_block(values) -> None:
+        if values is not None:
+            log.debug("Normal client read HR[%s..%s] = %s", read_base, read_base + read_count - 1, values)
+
+    batcher.read(read_base, read_count, on_block)
+
+    if random.random() < write_prob:
+        addr = cfg.safe_write_register
+        val = random.randint(cfg.safe_write_min, cfg.safe_write_max)
+        log.info("Normal client writing HR[%s] = %s", addr, val)
+
+        def on_read_back(values) -> None:
+            if values is not None:
+                log.info("Normal client read-back HR[%s] = %s (expected %s)", addr, values[0], val)
+
+        batcher.write(addr, val)
+        batcher.read(addr, 1, on_read_back)
+
+
 def run_normal_client(
     cfg: Optional[PlcConfig] = None,
     read_base: int = 0,
@@ -25,6 +53,7 @@ def run_normal_client(
       - cyklicznie czyta blok HR[read_base..read_base+read_count-1]
       - z pewnym prawdopodobieństwem wykonuje 'bezpieczny' zapis do safe_write_register
         w zakresie [safe_write_min, safe_write_max], potem robi read-back.
+      - żądania jednego cyklu idą przez RequestBatcher (minimalna liczba PDU).
     """
 
     cfg = cfg or get_plc_config()
@@ -37,71 +66,50 @@ def run_normal_client(
         write_prob,
     )
 
+    schedule = get_scheduler().register(current_name("NORMAL"), Jittered(period_s, jitter_s))
+    fc3 = get_metrics().series(schedule.name, 3, endpoint_of(cfg))
+    fc6 = get_metrics().series(schedule.name, 6, endpoint_of(cfg))
+
+    batcher = RequestBatcher(series={3: fc3, 6: fc6})
+
     try:
         with modbus_client(cfg) as client:
             while True:
-                if stop_event is not None and stop_event.is_set():
+                if not schedule.wait(stop_event):
                     log.info("Stop event set, leaving normal client loop")
                     break
 
-                t0 = time.perf_counter()
-
-                # 1) Odczyt bloku
                 try:
-                    rr = client.read_holding_registers(
-                        read_base, read_count, unit=cfg.unit_id
-                    )
-                    if rr.isError():
-                        log.warning("Normal client read error: %s", rr)
-                    else:
-                        values = list(rr.registers)
-                        log.debug(
-                            "Normal client read HR[%s..%s] = %s",
-                            read_base,
-                            read_base + read_count - 1,
-                            values,
-                        )
+                    _queue_tick(batcher, cfg, read_base, read_count, write_prob)
+                    batcher.flush(client, cfg.unit_id)
                 except Exception as e:
-                    log.warning("Normal client read exception: %s", e)
-
-                # 2) Zapis
-                if random.random() < write_prob:
-                    addr = cfg.safe_write_register
-                    val = random.randint(cfg.safe_write_min, cfg.safe_write_max)
-                    try:
-                        log.info("Normal client writing HR[%s] = %s", addr, val)
-                        wq = client.write_register(addr, val, unit=cfg.unit_id)
-                        if wq.isError():
-                            log.warning("Normal client write error: %s", wq)
-                        else:
-                            # read-back
-                            rb = client.read_holding_registers(
-                                addr, 1, unit=cfg.unit_id
-                            )
-                            if rb.isError():
-                                log.warning("Normal client read-back error: %s", rb)
-                            else:
-                                rb_val = rb.registers[0]
-                                log.info(
-                                    "Normal client read-back HR[%s] = %s (expected %s)",
-                                    addr,
-                                    rb_val,
-                                    val,
-                                )
-                    except Exception as e:
-                        log.warning("Normal client write exception: %s", e)
-
-                dt = period_s + random.uniform(-jitter_s, jitter_s)
-                if dt < 0.0:
-                    dt = 0.0
-                elapsed = time.perf_counter() - t0
-                sleep_time = max(0.0, dt - elapsed)
-
-                if stop_event is None:
-                    time.sleep(sleep_time)
-                else:
-                    stop_event.wait(timeout=sleep_time)
-
+                    log.warning("Normal client exception: %s", e)
 
     except KeyboardInterrupt:
         log.info("Normal client loop interrupted by user")
+
+
+async def normal_client_task(
+    client,
+    cfg: PlcConfig,
+    read_base: int = 0,
+    read_count: int = 10,
+    period_s: float = 0.5,
+    jitter_s: float = 0.1,
+    write_prob: float = 0.1,
+) -> None:
+    """
+    Wersja asyncio normal clienta dla AsyncTrafficEngine (odczyt bloku + okazjonalny
+    bezpieczny zapis z read-backiem). Kończy się przez anulowanie taska.
+    """
+    schedule = get_scheduler().register(current_name("NORMAL"), Jittered(period_s, jitter_s))
+    fc3 = get_metrics().series(schedule.name, 3, endpoint_of(cfg))
+    fc6 = get_metrics().series(schedule.name, 6, endpoint_of(cfg))
+    batcher = RequestBatcher(series={3: fc3, 6: fc6})
+    while True:
+        await schedule.wait_async()
+        try:
+            _queue_tick(batcher, cfg, read_base, read_count, write_prob)
+            await batcher.flush_async(client, cfg.unit_id)
+        except Exception as e:
+            log.warning("Normal client exception: %s", e)
@@ -0,0 +1,115 @@
+# injector/traffic/scenarios.py
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from injector.core.config import PlcConfig, get_plc_config
+from injector.traffic.hmi_master import run_hmi_loop
+from injector.traffic.normal_client import run_normal_client
+from injector.traffic.async_engine import AsyncTrafficEngine, MasterSpec
+from injector.attacks.scan_readonly import run_scan_readonly
+from injector.attacks.write_injection import run_write_injection
+from injector.attacks.mass_overwrite import run_spoofing
+
+SCENARIOS = (
+    "baseline",
+    "baseline_ro_scan",
+    "baseline_write_inj",
+    "mass_overwrite_only",
+    "baseline_proxy_spoof",
+)
+
+# (nazwa wątku/mastera, kind, kwargs) - kind jak w async_engine.BEHAVIOURS
+MasterEntry = Tuple[str, str, Dict[str, Any]]
+
+# kind -> blokująca pętla dla trybu "threads" (tryb "asyncio" bierze coroutines z async_engine.BEHAVIOURS)
+THREAD_TARGETS = {
+    "hmi": run_hmi_loop,
+    "normal": run_normal_client,
+    "scan_readonly": run_scan_readonly,
+    "write_injection": run_write_injection,
+    "mass_overwrite": run_spoofing,
+}
+
+ENGINES = ("threads", "asyncio")
+
+
+def scenario_masters(
+    name: str,
+    cfg: Optional[PlcConfig] = None,
+    hmi_count: int = 1,
+    normal_count: int = 1,
+    prefix: str = "",
+) -> List[MasterEntry]:
+    """
+    Zwraca listę masterów scenariusza dla jednego PLC.
+    Adresy bierzemy z cfg.registers (mapa rejestrów danego PLC we flocie).
+    prefix np. "plc01/" - żeby nazwy były unikalne przy wielu PLC.
+    """
+    cfg = cfg or get_plc_config()
+    regs = cfg.registers
+
+    def numbered(label: str, kind: str, n: int, kwargs: Dict[str, Any]) -> List[MasterEntry]:
+        if n == 1:
+            return [(f"{prefix}{label}", kind, dict(kwargs))]
+        return [(f"{prefix}{label}_{i:03d}", kind, dict(kwargs)) for i in range(n)]
+
+    baseline = (
+        numbered("HMI", "hmi", hmi_count,
+                 dict(base_address=regs.hmi_base, count=regs.hmi_count))
+        + numbered("NORMAL", "normal", normal_count,
+                   dict(read_base=regs.hmi_base, read_count=regs.hmi_count))
+    )
+
+    if name in ("baseline", "baseline_proxy_spoof"):
+        return baseline
+    if name == "baseline_ro_scan":
+        return baseline + [(
+            f"{prefix}SCAN_RO", "scan_readonly",
+            dict(start_addr=regs.scan_start, end_addr=regs.scan_end, block_size=10, delay_s=0.01),
+        )]
+    if name == "baseline_write_inj":
+        return baseline + [(
+            f"{prefix}WRITE_INJ", "write_injection",
+            dict(target_register=cfg.safe_write_register, qps=10.0),
+        )]
+    if name == "mass_overwrite_only":
+        return [(
+            f"{prefix}MASS_OVERWRITE", "mass_overwrite",
+            dict(target_registers=list(regs.attack_registers), qps=20.0, min_value=0, max_value=1000),
+        )]
+    raise ValueError(f"Unknown scenario name: {name}")
+
+
+def launch_masters(
+    masters: Sequence[Tuple[PlcConfig, MasterEntry]],
+    stop_event: threading.Event,
+    engine: str = "threads",
+) -> Tuple[List[threading.Thread], Optional[AsyncTrafficEngine]]:
+    """
+    Uruchamia masterów (każdy z własnym cfg - np. różne PLC we flocie).
+    engine="threads" -> wątek na mastera; engine="asyncio" -> jeden wątek z AsyncTrafficEngine.
+    """
+    if engine == "asyncio":
+        engine_obj = AsyncTrafficEngine(
+            [MasterSpec(kind=kind, name=tname, params=kwargs, cfg=cfg) for cfg, (tname, kind, kwargs) in masters],
+            stop_event=stop_event,
+        )
+        t = threading.Thread(name="ASYNC_ENGINE", target=engine_obj.run, daemon=True)
+        t.start()
+        return [t], engine_obj
+
+    if engine != "threads":
+        raise ValueError(f"Unknown engine: {engine}")
+
+    threads: List[threading.Thread] = []
+    for cfg, (tname, kind, kwargs) in masters:
+        t = threading.Thread(
+            name=tname,
+            target=THREAD_TARGETS[kind],
+            kwargs={"cfg": cfg, "stop_event": stop_event, **kwargs},
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+    return threads, None
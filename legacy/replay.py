@@ -1,4 +1,367 @@
+# legacy/replay.py
+"""
+Replay żądań Modbus/TCP z pcap/pcapng na PLC (albo symulator / proxy).
+
+  - żądania wyciągane natywnie (analysis.pcap_reader, bez tshark / scapy):
+    strumień klient -> PLC per połączenie TCP, składany po seq
+    (retransmisje pomijane), dzielony na ramki MBAP,
+  - granice połączeń zachowane: jedno połączenie w replayu na każde
+    połączenie z capture, otwierane w chwili jego pierwszego żądania,
+  - czas: speed=1.0 oryginalny, speed=N N-krotnie szybciej, speed=0 (asap)
+    bez czekania; harmonogram na absolutnych terminach (bez dryfu),
+  - pipelining: żądania nie czekają na odpowiedzi (okno max_inflight
+    na połączenie), wszystkie zaległe ramki idą jednym write(); żądanie
+    bez odpowiedzi po response_timeout_s zwalnia miejsce w oknie (liczone
+    jako unanswered), a zamknięcie połączenia przez PLC kończy wysyłanie,
+  - raport: opóźnienie wysłania względem harmonogramu (lag), faktyczne
+    przyspieszenie, latencje odpowiedzi i wyjątki.
+
+  python -m legacy.replay capture.pcapng --host 127.0.0.1 --port 5020 --speed 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from analysis.pcap_reader import PcapFile, TcpStream, TCP_FIN, TCP_RST, TCP_SYN
+from injector.core import mbap
+from injector.core.metrics import LatencyHistogram
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PLC_PORTS = (502, 1502)
+DEFAULT_MAX_INFLIGHT = 256
+CONNECT_TIMEOUT_S = 3.0
+DRAIN_TIMEOUT_S = 2.0        # ile czekamy na odpowiedzi po ostatnim żądaniu
+RESPONSE_TIMEOUT_S = 3.0     # żądanie starsze niż to przestaje zajmować okno
+
+# TID -> czasy wysłania w kolejności (FIFO): capture może używać tego samego TID
+# dla kilku żądań w locie (np. master ze stałym TID)
+Pending = Dict[int, Deque[float]]
+
+
+@dataclass
+class ReplayConn:
+    """Żądania jednego połączenia z capture: (ts z pcap, ramka MBAP)."""
+    key: Tuple[bytes, int, bytes, int]
+    frames: List[Tuple[float, bytes]] = field(default_factory=list)
+    _stream: TcpStream = field(default_factory=TcpStream, repr=False)
+
+    def feed(self, ts: float, seq: int, payload: memoryview) -> None:
+        buf = self._stream.buf
+        if not self._stream.feed(seq, payload):
+            return      # retransmisja
+        frames, consumed = mbap.split_frames(buf)
+        for f in frames:
+            self.frames.append((ts, f.tobytes()))
+        if consumed:
+            del buf[:consumed]
+
+
+def load_requests(pcap: Path, plc_ports: Sequence[int] = DEFAULT_PLC_PORTS) -> List[ReplayConn]:
+    """Połączenia klient -> PLC (dport w plc_ports) z ich żądaniami, w kolejności startu."""
+    open_conns: Dict[Tuple[bytes, int, bytes, int], ReplayConn] = {}
+    done: List[ReplayConn] = []
+    with PcapFile(pcap) as f:
+        for seg in f.tcp_segments():
+            if seg.dport not in plc_ports:
+                continue
+            key = (seg.src, seg.sport, seg.dst, seg.dport)
+            conn = open_conns.get(key)
+            if conn is None or (seg.flags & TCP_SYN and conn.frames):
+                if conn is not None:
+                    done.append(conn)
+                conn = open_conns[key] = ReplayConn(key)
+            if len(seg.payload):
+                conn.feed(seg.ts, seg.seq, seg.payload)
+            if seg.flags & (TCP_FIN | TCP_RST):
+                done.append(open_conns.pop(key))
+    done.extend(open_conns.values())
+    conns = [c for c in done if c.frames]
+    conns.sort(key=lambda c: c.frames[0][0])
+    return conns
+
+
+class ReplayEngine:
+    """
+    Odtwarza ReplayConn na host:port. speed=0 -> as-fast-as-possible.
+    unit_id (opcjonalnie) nadpisuje Unit ID w każdej ramce.
+    """
+
+    def __init__(
+        self,
+        conns: Sequence[ReplayConn],
+        host: str,
+        port: int,
+        speed: float = 1.0,
+        unit_id: Optional[int] = None,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        duration_s: Optional[float] = None,
+        response_timeout_s: float = RESPONSE_TIMEOUT_S,
+    ):
+        if speed < 0:
+            raise ValueError("speed must be >= 0 (0 = as fast as possible)")
+        self.conns = list(conns)
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.unit_id = unit_id
+        self.max_inflight = max(1, max_inflight)
+        self.duration_s = duration_s
+        self.response_timeout_s = response_timeout_s
+
+        self.lag = LatencyHistogram()          # faktyczne wysłanie - termin z harmonogramu
+        self.latency = LatencyHistogram()      # żądanie -> odpowiedź
+        self.sent = 0
+        self.responses = 0
+        self.exceptions = 0
+        self.unanswered = 0
+        self.connect_failed = 0
+        self.skipped = 0
+        self._first_send: Optional[float] = None
+        self._last_send = 0.0
+
+    def _due(self, t0: float, ts0: float, ts: float) -> float:
+        return t0 if self.speed == 0 else t0 + (ts - ts0) / self.speed
+
+    def _frames_for(self, conn: ReplayConn, ts0: float) -> List[Tuple[float, bytes]]:
+        frames = conn.frames
+        if self.duration_s is not None:
+            # duration_s to czas replayu (po przeskalowaniu speed)
+            limit = self.duration_s * (self.speed or 1.0)
+            frames = [fr for fr in frames if fr[0] - ts0 <= limit]
+        if self.unit_id is not None:
+            uid = self.unit_id & 0xFF
+            frames = [(ts, raw[:6] + bytes((uid,)) + raw[7:]) for ts, raw in frames]
+        return frames
+
+    async def _receiver(self, reader: asyncio.StreamReader, pending: Pending,
+                        window: asyncio.Semaphore) -> None:
+        buf = bytearray()
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            buf += chunk
+            frames, consumed = mbap.split_frames(buf)
+            now = time.perf_counter()
+            for f in frames:
+                sent = pending.get(f.tid)
+                if not sent:
+                    continue        # nieznany TID albo spóźniona odpowiedź po wygaśnięciu
+                sent_at = sent.popleft()
+                if not sent:
+                    del pending[f.tid]
+                self.responses += 1
+                if f.is_exception:
+                    self.exceptions += 1
+                self.latency.record(now - sent_at)
+                window.release()
+            if consumed:
+                del buf[:consumed]
+
+    def _expire(self, pending: Pending, window: asyncio.Semaphore, now: float) -> int:
+        """Żądania bez odpowiedzi dłużej niż response_timeout_s -> unanswered, zwolnione okno."""
+        limit = now - self.response_timeout_s
+        expired = 0
+        for tid in list(pending):
+            sent = pending[tid]
+            while sent and sent[0] <= limit:
+                sent.popleft()
+                expired += 1
+                window.release()
+            if not sent:
+                del pending[tid]
+        self.unanswered += expired
+        return expired
+
+    async def _acquire(self, window: asyncio.Semaphore, pending: Pending, rx: asyncio.Task) -> bool:
+        """Miejsce w oknie; False, gdy odbiornik się skończył (PLC zamknął połączenie)."""
+        while not rx.done():
+            acq = asyncio.ensure_future(window.acquire())
+            done, _ = await asyncio.wait((acq, rx), timeout=self.response_timeout_s,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if acq not in done:
+                acq.cancel()
+                await asyncio.gather(acq, return_exceptions=True)
+            if acq.done() and not acq.cancelled():
+                return True
+            # okno pełne od response_timeout_s - najstarsze żądania na pewno wygasły
+            self._expire(pending, window, time.perf_counter())
+        return False
+
+    async def _run_conn(self, conn: ReplayConn, t0: float, ts0: float) -> None:
+        loop = asyncio.get_running_loop()
+        frames = self._frames_for(conn, ts0)
+        if not frames:
+            return
+        first_due = self._due(t0, ts0, frames[0][0])
+        if first_due > loop.time():
+            await asyncio.sleep(first_due - loop.time())
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                    timeout=CONNECT_TIMEOUT_S)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.connect_failed += 1
+            self.skipped += len(frames)
+            log.warning("Replay: cannot connect to %s:%s: %r", self.host, self.port, e)
+            return
+
+        pending: Pending = {}
+        window = asyncio.Semaphore(self.max_inflight)
+        rx = loop.create_task(self._receiver(reader, pending, window))
+        i, n = 0, len(frames)
+        try:
+            while i < n:
+                due = self._due(t0, ts0, frames[i][0])
+                now = loop.time()
+                if due > now:
+                    await asyncio.sleep(due - now)
+                if not await self._acquire(window, pending, rx):
+                    log.debug("Replay: connection closed by peer, %d requests not sent", n - i)
+                    break
+                # wszystko, co już jest "na czas" (i mieści się w oknie) - jednym write()
+                batch = [i]
+                now = loop.time()
+                j = i + 1
+                while j < n and self._due(t0, ts0, frames[j][0]) <= now and not window.locked():
+                    await window.acquire()
+                    batch.append(j)
+                    j += 1
+                sent_at = time.perf_counter()
+                sent_loop = loop.time()
+                for k in batch:
+                    raw = frames[k][1]
+                    tid = mbap.U16.unpack_from(raw, 0)[0]
+                    sent = pending.get(tid)
+                    if sent is None:
+                        sent = pending[tid] = deque()
+                    sent.append(sent_at)
+                    self.lag.record(max(0.0, sent_loop - self._due(t0, ts0, frames[k][0])))
+                writer.write(b"".join(frames[k][1] for k in batch))
+                self.sent += len(batch)
+                if self._first_send is None:
+                    self._first_send = sent_loop
+                self._last_send = max(self._last_send, sent_loop)
+                i = j
+                await writer.drain()
+
+            # odpowiedzi na ostatnie żądania
+            deadline = loop.time() + DRAIN_TIMEOUT_S
+            while pending and loop.time() < deadline and not rx.done():
+                await asyncio.sleep(0.01)
+        except (ConnectionError, OSError) as e:
+            log.debug("Replay connection error: %r", e)
+        finally:
+            self.skipped += n - i
+            self.unanswered += sum(len(sent) for sent in pending.values())
+            rx.cancel()
+            await asyncio.gather(rx, return_exceptions=True)
+            writer.close()
+
+    async def run_async(self) -> Dict[str, Any]:
+        if not self.conns:
+            return self.report(0.0, 0.0)
+        loop = asyncio.get_running_loop()
+        ts0 = min(c.frames[0][0] for c in self.conns)
+        t0 = loop.time() + 0.05       # chwila na utworzenie tasków
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_conn(c, t0, ts0) for c in self.conns))
+        wall = time.perf_counter() - started
+        ts1 = max(c.frames[-1][0] for c in self.conns)
+        return self.report(ts1 - ts0, wall)
+
+    def run(self) -> Dict[str, Any]:
+        return asyncio.run(self.run_async())
+
+    def report(self, original_span_s: float, wall_s: float) -> Dict[str, Any]:
+        send_span = (self._last_send - self._first_send) if self._first_send is not None else 0.0
+        return {
+            "target": f"{self.host}:{self.port}",
+            "speed": self.speed if self.speed else "asap",
+            "connections": len(self.conns),
+            "sent": self.sent,
+            "responses": self.responses,
+            "exceptions": self.exceptions,
+            "unanswered": self.unanswered,
+            "skipped": self.skipped,
+            "connect_failed": self.connect_failed,
+            "original_span_s": original_span_s,
+            "replay_send_span_s": send_span,
+            "wall_s": wall_s,
+            # > speed oznacza, że nie nadążamy za harmonogramem (dla asap: faktyczne przyspieszenie)
+            "effective_speed": (original_span_s / send_span) if send_span > 0 else None,
+            "send_rate_fps": (self.sent / send_span) if send_span > 0 else None,
+            "schedule_lag": self.lag.summary(),
+            "latency": self.latency.summary(),
+        }
+
+
+def replay_pcap(
+    pcap: Path,
+    host: str,
+    port: int,
+    speed: float = 1.0,
+    unit_id: Optional[int] = None,
+    plc_ports: Sequence[int] = DEFAULT_PLC_PORTS,
+    max_inflight: int = DEFAULT_MAX_INFLIGHT,
+    duration_s: Optional[float] = None,
+) -> Dict[str, Any]:
+    t = time.perf_counter()
+    conns = load_requests(Path(pcap), plc_ports)
+    load_s = time.perf_counter() - t
+    log.info("Replay: %d requests in %d connections from %s (%.2f s)",
+             sum(len(c.frames) for c in conns), len(conns), pcap, load_s)
+    engine = ReplayEngine(conns, host, port, speed=speed, unit_id=unit_id,
+                          max_inflight=max_inflight, duration_s=duration_s)
+    report = engine.run()
+    report["pcap"] = str(pcap)
+    report["load_s"] = load_s
+    return report
+
+
 def run(plc_host, plc_port, unit_id, src_pcap=None, speed=1.0, duration_s=20):
-    # prosty placeholder – w minimalnym setupie możesz pominąć replay
-    # (pełny replay wymaga scapy/tcpreplay; trzymamy minimalizm)
-    pass
+    # wejście dla orchestratora (sygnatura jak pozostałe kroki)
+    if not src_pcap:
+        log.warning("Replay: no src_pcap given, skipping")
+        return None
+    report = replay_pcap(Path(src_pcap), plc_host, plc_port, speed=speed, unit_id=unit_id,
+                         duration_s=duration_s)
+    log.info("Replay finished: sent=%d responses=%d lag p99=%.3f ms",
+             report["sent"], report["responses"], report["schedule_lag"]["p99_ms"])
+    return report
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Replay Modbus/TCP requests from a pcap/pcapng capture")
+    ap.add_argument("pcap", type=Path)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=502)
+    ap.add_argument("--speed", type=float, default=1.0, help="mnożnik czasu (1 = oryginalny)")
+    ap.add_argument("--asap", action="store_true", help="bez harmonogramu (as fast as possible)")
+    ap.add_argument("--unit", type=int, default=None, help="nadpisz Unit ID")
+    ap.add_argument("--plc-ports", type=int, nargs="+", default=list(DEFAULT_PLC_PORTS))
+    ap.add_argument("--window", type=int, default=DEFAULT_MAX_INFLIGHT, help="max żądań w locie na połączenie")
+    ap.add_argument("--duration", type=float, default=None, help="limit czasu replayu [s]")
+    ap.add_argument("--json", type=Path, default=None, help="zapisz raport do pliku")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    report = replay_pcap(args.pcap, args.host, args.port, speed=0.0 if args.asap else args.speed,
+                         unit_id=args.unit, plc_ports=args.plc_ports, max_inflight=args.window,
+                         duration_s=args.duration)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        args.json.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,33 @@
+# tests/conftest.py
+import threading
+from typing import Any, Callable, Iterator
+
+import pytest
+
+from bench.common import free_port
+from injector.sim.plc_sim import PlcSimulator
+
+
+@pytest.fixture
+def serve() -> Iterator[Callable[[Any], Any]]:
+    """Uruchamia obiekt z blokującym run(stop_event, ready_event) w wątku; zatrzymywany po teście."""
+    running = []
+
+    def start(server: Any) -> Any:
+        stop, ready = threading.Event(), threading.Event()
+        t = threading.Thread(target=server.run, kwargs={"stop_event": stop, "ready_event": ready}, daemon=True)
+        t.start()
+        assert ready.wait(timeout=5.0), f"{type(server).__name__} did not start"
+        running.append((stop, t))
+        return server
+
+    yield start
+    for stop, t in running:
+        stop.set()
+        t.join(timeout=2.0)
+
+
+@pytest.fixture
+def plc_sim(serve) -> Callable[..., PlcSimulator]:
+    """Fabryka symulatorów PLC na wolnym porcie (kwargs jak PlcSimulator)."""
+    return lambda **kwargs: serve(PlcSimulator("127.0.0.1", free_port(), **kwargs))
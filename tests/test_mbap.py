@@ -0,0 +1,94 @@
+# tests/test_mbap.py
+import pytest
+
+from injector.core import mbap
+
+
+def test_encode_read_request_layout():
+    raw = mbap.encode_read_request(0x1234, 7, 3, 100, 10)
+    assert raw == bytes.fromhex("1234 0000 0006 07 03 0064 000a")
+    frame = mbap.FrameView(raw)
+    assert (frame.tid, frame.pid, frame.unit_id, frame.func) == (0x1234, 0, 7, 3)
+    assert frame.total_len == len(raw) == 12
+    assert frame.request_range() == (3, 100, 10)
+
+
+def test_tid_wraps_to_u16():
+    assert mbap.FrameView(mbap.encode_read_request(0x10001, 1, 3, 0, 1)).tid == 1
+
+
+def test_read_response_registers():
+    raw = mbap.encode_read_response(5, 1, 4, [0, 1, 0xFFFF])
+    frame = mbap.FrameView(raw)
+    assert frame.register_count() == 3
+    assert frame.registers() == (0, 1, 0xFFFF)
+    assert frame.register_data_offset() == mbap.HEADER_LEN + 2
+    assert not frame.is_exception
+
+
+def test_set_register_in_place():
+    buf = bytearray(mbap.encode_read_response(5, 1, 3, [10, 20]))
+    mbap.FrameView(buf).set_register(1, 0x1_0005)
+    assert mbap.FrameView(buf).registers() == (10, 5)
+    with pytest.raises(ValueError):
+        mbap.FrameView(bytearray(mbap.encode_exception(5, 1, 3, 2))).set_register(0, 1)
+
+
+def test_exception_frame():
+    frame = mbap.FrameView(mbap.encode_exception(9, 2, 3, 0x0B))
+    assert frame.is_exception
+    assert frame.func == 0x83
+    assert frame.exception_code == 0x0B
+    assert frame.register_data_offset() is None
+
+
+def test_write_frames():
+    single = mbap.FrameView(mbap.encode_write_single(1, 1, 40, -1))
+    assert single.request_range() == (6, 40, 0xFFFF)
+    multi = mbap.encode_write_multiple(2, 1, 10, [1, 2, 3])
+    frame = mbap.FrameView(multi)
+    assert frame.request_range() == (16, 10, 3)
+    assert frame.total_len == len(multi) == 6 + 1 + 6 + 6
+
+
+def test_frame_length_partial():
+    raw = mbap.encode_read_request(1, 1, 3, 0, 1)
+    assert mbap.frame_length(raw[:6]) is None
+    assert mbap.frame_length(raw[:-1]) is None
+    assert mbap.frame_length(raw) == len(raw)
+    assert mbap.frame_length(b"xx" + raw, 2) == len(raw)
+
+
+def test_split_frames_keeps_partial_tail():
+    frames = [mbap.encode_read_request(i, 1, 3, i, 1) for i in range(3)]
+    tail = mbap.encode_read_response(99, 1, 3, [1, 2])
+    buf = b"".join(frames) + tail[:5]
+    out, consumed = mbap.split_frames(buf)
+    assert [f.tid for f in out] == [0, 1, 2]
+    assert consumed == sum(len(f) for f in frames)
+    assert [f.tobytes() for f in out] == frames
+    assert mbap.split_frames(buf[consumed:] + tail[5:])[0][0].tid == 99
+
+
+def test_scan_frames_marks_functions():
+    buf = (mbap.encode_read_request(1, 1, 3, 0, 1)
+           + mbap.encode_write_single(2, 1, 0, 5)
+           + mbap.encode_read_request(3, 1, 4, 0, 1))
+    end, marked, n = mbap.scan_frames(buf + b"\x00\x04", funcs=(4, 6))
+    assert n == 3
+    assert end == len(buf)
+    assert marked == [12, 24]
+
+
+def test_scan_addresses():
+    requests = (mbap.encode_read_request(1, 1, 3, 100, 2)
+                + mbap.encode_write_multiple(2, 1, 7, [1, 2])
+                + mbap.encode_frame(3, 1, bytes((17,))))          # FC17 - bez adresu
+    assert mbap.scan_addresses(requests, mbap.ADDRESS_FUNCS_REQUEST) == ([(3, 100), (16, 7), (17, -1)], len(requests))
+
+    responses = mbap.encode_read_response(1, 1, 3, [5, 6]) + mbap.encode_write_single(2, 1, 9, 1)
+    pdus, used = mbap.scan_addresses(responses + responses[:9], mbap.ADDRESS_FUNCS_RESPONSE)
+    assert (pdus, used) == ([(3, -1), (6, 9)], len(responses))     # niepełna końcówka zostaje
+
+    assert mbap.scan_addresses(mbap.encode_frame(1, 1, b"\x03\x00\x00", pid=1), ())[1] == -1
+    assert mbap.scan_addresses(bytes.fromhex("0001 0000 0200 01 03 0000"), ())[1] == -1   # LEN > ramki Modbus
@@ -0,0 +1,57 @@
+# tests/test_metrics.py
+import random
+
+from injector.core.metrics import LatencyHistogram, percentile
+
+
+def test_percentile_nearest_rank():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 100) == 5.0
+    assert percentile([], 99) == 0.0
+
+
+def test_small_values_exact():
+    h = LatencyHistogram()
+    for us in range(1, 21):
+        h.record(us / 1e6)
+    assert h.percentile_us(50) == 10
+    assert h.percentile_us(100) == 20
+    assert (h.min_us, h.max_us, h.count) == (1, 20, 20)
+
+
+def test_percentiles_within_bucket_error():
+    rnd = random.Random(7)
+    samples = [rnd.lognormvariate(8, 1.5) for _ in range(20000)]    # us, od ~1 us do sekund
+    h = LatencyHistogram()
+    for us in samples:
+        h.record(us / 1e6)
+    ordered = sorted(int(us) for us in samples)
+    for q in (50, 90, 95, 99, 99.9):
+        exact = percentile(ordered, q)
+        got = h.percentile_us(q)
+        assert exact <= got <= exact * (1 + 1 / 16), q     # górna granica kubełka: <= 6.25%
+
+
+def test_merge_equals_single():
+    rnd = random.Random(3)
+    a, b, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i in range(5000):
+        s = rnd.expovariate(1 / 0.002)
+        (a if i % 3 else b).record(s)
+        both.record(s)
+    a.merge(b)
+    assert a.counts == both.counts
+    assert a.summary() == both.summary()
+
+
+def test_out_of_range_values():
+    h = LatencyHistogram()
+    h.record(-1.0)
+    h.record(3600.0)
+    assert h.min_us == 0
+    assert h.max_us == 3_600_000_000
+    # powyżej 60 s - ostatni kubełek, percentyl nie rośnie dalej
+    assert 60_000_000 <= h.percentile_us(100) < h.max_us
+    assert LatencyHistogram().summary()["p99_ms"] == 0.0
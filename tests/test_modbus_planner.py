@@ -0,0 +1,155 @@
+# tests/test_modbus_planner.py
+import asyncio
+import random
+
+import pytest
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException
+
+from injector.core.modbus import (
+    MAX_READ_REGISTERS, RequestBatcher, plan_reads, plan_writes, split_read_results,
+)
+
+
+def _covered(requests, plans):
+    for plan in plans:
+        assert 1 <= plan.count <= MAX_READ_REGISTERS
+        for i in plan.members:
+            addr, count = requests[i]
+            assert plan.address <= addr and addr + count <= plan.address + plan.count
+
+
+def test_adjacent_and_overlapping_reads_merge():
+    requests = [(10, 2), (0, 5), (5, 5), (3, 4)]
+    plans = plan_reads(requests)
+    assert [(p.address, p.count) for p in plans] == [(0, 12)]
+    assert sorted(plans[0].members) == [0, 1, 2, 3]
+
+
+def test_gap_and_limit():
+    requests = [(0, 2), (4, 2)]
+    assert len(plan_reads(requests)) == 2
+    assert [(p.address, p.count) for p in plan_reads(requests, max_gap=2)] == [(0, 6)]
+    assert len(plan_reads([(0, 100), (100, 30)])) == 2      # razem 130 > 125
+
+
+def test_invalid_count_rejected():
+    with pytest.raises(ValueError):
+        plan_reads([(0, 0)])
+    with pytest.raises(ValueError):
+        plan_reads([(0, MAX_READ_REGISTERS + 1)])
+
+
+def test_split_read_results_round_trip():
+    rnd = random.Random(1)
+    registers = [rnd.randrange(65536) for _ in range(1000)]
+    requests = [(a, rnd.randint(1, 20)) for a in (rnd.randrange(900) for _ in range(200))]
+    plans = plan_reads(requests, max_gap=3)
+    _covered(requests, plans)
+    assert sorted(i for p in plans for i in p.members) == list(range(len(requests)))
+
+    results = [registers[p.address:p.address + p.count] for p in plans]
+    out = split_read_results(requests, plans, results)
+    assert out == [registers[a:a + c] for a, c in requests]
+
+
+def test_split_read_results_failed_pdu():
+    requests = [(0, 2), (50, 2), (1, 1)]
+    plans = plan_reads(requests)
+    results = [None if p.address == 50 else list(range(p.address, p.address + p.count)) for p in plans]
+    assert split_read_results(requests, plans, results) == [[0, 1], None, [1]]
+
+
+def test_plan_writes():
+    writes = [(5, 1), (6, 2), (5, 3), (8, 0x1_0004)]
+    assert [(w.func, w.address, w.values) for w in plan_writes(writes)] == [
+        (6, 5, [3]), (6, 6, [2]), (6, 8, [4])]
+    assert [(w.func, w.address, w.values) for w in plan_writes(writes, allow_fc16=True)] == [
+        (16, 5, [3, 2]), (6, 8, [4])]
+
+
+class _Resp:
+    def __init__(self, registers=None):
+        self.registers = registers or []
+
+    def isError(self):
+        return False
+
+
+class _FlakyClient:
+    """Rejestry HR[i] = i; PDU zaczynające się pod adresem z fail_at rzucają ConnectionException."""
+
+    def __init__(self, fail_at=()):
+        self.fail_at = set(fail_at)
+        self.sent = []
+
+    def _pdu(self, func, address, n):
+        self.sent.append((func, address, n))
+        if address in self.fail_at:
+            raise ConnectionException(f"lost at {address}")
+        return _Resp(list(range(address, address + n)) if func == 3 else None)
+
+    def read_holding_registers(self, address, count, unit=1):
+        return self._pdu(3, address, count)
+
+    def write_register(self, address, value, unit=1):
+        return self._pdu(6, address, 1)
+
+    def write_registers(self, address, values, unit=1):
+        return self._pdu(16, address, len(values))
+
+
+class _AsyncFlakyClient(_FlakyClient):
+    async def read_holding_registers(self, address, count, unit=1):
+        return self._pdu(3, address, count)
+
+    async def write_register(self, address, value, unit=1):
+        return self._pdu(6, address, 1)
+
+    async def write_registers(self, address, values, unit=1):
+        return self._pdu(16, address, len(values))
+
+
+def _queue(batcher, out):
+    for addr, count in [(0, 2), (50, 2), (1, 1)]:
+        batcher.read(addr, count, lambda values, key=(addr, count): out.__setitem__(key, values))
+    batcher.write(20, 7)
+    batcher.write(21, 8)
+
+
+def test_batcher_failed_pdu_still_dispatches():
+    client, out = _FlakyClient(fail_at={20, 50}), {}
+    batcher = RequestBatcher(allow_fc16=True)
+    _queue(batcher, out)
+    assert batcher.flush(client) == 2
+    assert client.sent == [(16, 20, 2), (3, 0, 2), (3, 50, 2)]
+    assert out == {(0, 2): [0, 1], (50, 2): None, (1, 1): [1]}
+    assert batcher.stats()["pdus_failed"] == 2
+
+
+def test_batcher_flush_async():
+    client, out = _AsyncFlakyClient(fail_at={0}), {}
+    batcher = RequestBatcher()
+    _queue(batcher, out)
+    assert asyncio.run(batcher.flush_async(client)) == 1
+    assert client.sent == [(6, 20, 1), (6, 21, 1), (3, 0, 2), (3, 50, 2)]
+    assert out == {(0, 2): None, (50, 2): [50, 51], (1, 1): None}
+
+
+def test_batcher_write_then_read_back(plc_sim):
+    sim = plc_sim()
+    out = {}
+    batcher = RequestBatcher()
+    batcher.read(0, 10, lambda values: out.__setitem__("block", values))
+    batcher.write(5, 123)
+    batcher.read(5, 1, lambda values: out.__setitem__("read_back", values))
+
+    client = ModbusTcpClient("127.0.0.1", port=sim.port)
+    assert client.connect()
+    try:
+        assert batcher.flush(client) == 0
+    finally:
+        client.close()
+    assert out["read_back"] == [123]
+    assert out["block"][5] == 123
+    assert batcher.stats()["pdus_sent"] == 2      # FC6 + jedno FC3 dla bloku i read-backu
@@ -0,0 +1,153 @@
+# tests/test_modbus_proxy_spoof.py
+from injector.attacks.modbus_proxy_spoof import PENDING_TTL_S, ConnState, PendingReq, ShieldCache, TxnCounters
+from injector.core import mbap
+
+KEY = (1, 3, 10, 4)         # unit, FC, start, count
+DATA = bytes(range(8))
+
+
+def _state(**kwargs) -> ConnState:
+    return ConnState(registry=TxnCounters(), **kwargs)
+
+
+def test_conn_state_match_and_expiry():
+    state = _state(ttl_s=1.0)
+    state.put(1, PendingReq(3, 0, 1, ts=10.0))
+    state.put(2, PendingReq(3, 0, 1, ts=10.5))
+    assert state.pop(1).ts == 10.0
+    assert state.pop(1) is None
+    state.put(3, PendingReq(3, 0, 1, ts=11.6))     # TID 2 starszy niż ttl
+    assert state.pop(2) is None
+    assert state.counters() == {"matched": 1, "orphaned": 1, "evicted": 0,
+                                "unmatched_responses": 2, "collisions": 0}
+
+
+def test_conn_state_collision_and_eviction():
+    state = _state(max_pending=2)
+    state.put(1, PendingReq(3, 0, 1, ts=1.0))
+    state.put(1, PendingReq(3, 5, 1, ts=1.0))
+    state.put(2, PendingReq(3, 0, 1, ts=1.0))
+    state.put(3, PendingReq(3, 0, 1, ts=1.0))
+    assert list(state.pending) == [2, 3]
+    assert (state.collisions, state.evicted) == (1, 1)
+    state.close()
+    assert state.orphaned == 2 and not state.pending
+
+
+def test_shield_lookup_after_complete():
+    cache = ShieldCache(ttl_s=0.5)
+    assert cache.lookup(KEY, 1.0) is None
+    assert not cache.join(KEY, "a", 1.0)
+    assert cache.complete(KEY, 1.0, DATA, 1.1) == []
+    assert cache.lookup(KEY, 1.2) == DATA
+    assert cache.lookup((1, 3, 12, 2), 1.2) == DATA[4:]     # podzakres
+    assert cache.lookup((1, 3, 12, 4), 1.2) is None         # wychodzi poza cache
+    assert cache.lookup((1, 4, 10, 4), 1.2) is None         # inny FC
+    assert cache.lookup(KEY, 1.7) is None                   # po TTL
+
+
+def test_shield_join_coalesces():
+    cache = ShieldCache(ttl_s=0.5)
+    assert not cache.join(KEY, "leader", 0.0)
+    assert cache.join(KEY, "w1", 0.01)
+    assert cache.join(KEY, "w2", 0.02)
+    assert cache.complete(KEY, 0.0, DATA, 0.1) == ["w1", "w2"]
+    assert not cache.join(KEY, "next", 0.2)
+    stats = cache.stats()
+    assert (stats["forwarded"], stats["coalesced"]) == (2, 2)
+
+
+def test_shield_invalid_response_not_cached():
+    cache = ShieldCache(ttl_s=0.5)
+    cache.join(KEY, None, 0.0)
+    assert cache.complete(KEY, 0.0, DATA[:6], 0.1) == []
+    assert cache.lookup(KEY, 0.2) is None
+
+
+def test_shield_invalidate_before_response():
+    cache = ShieldCache(ttl_s=0.5)
+    cache.join(KEY, None, 1.0)
+    cache.invalidate(1, 12, 1, 1.05)               # zapis FC6 w trakcie odczytu
+    cache.complete(KEY, 1.0, DATA, 1.1)
+    assert cache.lookup(KEY, 1.2) is None
+    cache.join(KEY, None, 1.3)
+    cache.complete(KEY, 1.3, DATA, 1.4)
+    assert cache.lookup(KEY, 1.5) == DATA
+    cache.invalidate(1, 10, 1, 1.6)
+    assert cache.lookup(KEY, 1.7) is None
+
+
+def test_shield_write_detaches_inflight_read():
+    cache = ShieldCache(ttl_s=0.5)
+    new = bytes(range(10, 18))
+    assert not cache.join(KEY, "leader", 1.0)
+    assert cache.join(KEY, "w1", 1.01)
+    cache.invalidate(1, 13, 1, 1.05)               # zapis FC6 w zakresie odczytu w locie
+    assert not cache.join(KEY, "after", 1.1)       # nie dołącza do odczytu sprzed zapisu
+    assert cache.join(KEY, "w2", 1.11)
+    assert cache.complete(KEY, 1.0, DATA, 1.2) == ["w1"]
+    assert cache.lookup(KEY, 1.25) is None
+    assert cache.complete(KEY, 1.1, new, 1.3) == ["w2"]
+    assert cache.lookup(KEY, 1.35) == new
+    assert cache.stats()["inflight"] == 0
+
+
+def test_shield_detached_read_matched_by_owner():
+    cache = ShieldCache(ttl_s=0.5)
+    up0, up1 = object(), object()
+    new = bytes(range(10, 18))
+    cache.join(KEY, None, 1.0, owner=up0)
+    cache.join(KEY, "w1", 1.01)
+    cache.invalidate(1, 10, 4, 1.05)
+    cache.join(KEY, None, 1.1, owner=up1)
+    cache.join(KEY, "w2", 1.11)
+    cache.join((1, 3, 50, 1), None, 1.1, owner=up0)        # poza zakresem zapisu - zostaje
+    assert cache.complete(KEY, 1.1, new, 1.2, owner=up1) == ["w2"]     # nowszy upstream pierwszy
+    assert cache.complete(KEY, 1.0, DATA, 1.3, owner=up0) == ["w1"]
+    assert cache.lookup(KEY, 1.35) == new
+    assert cache.stats()["inflight"] == 1
+
+
+def test_shield_expire_returns_waiters():
+    cache = ShieldCache(ttl_s=0.5)
+    other = (1, 3, 50, 1)
+    cache.join(KEY, None, 0.0)
+    cache.join(KEY, "w1", 0.1)
+    cache.join(other, None, 1.0)
+    assert cache.expire(PENDING_TTL_S / 2) == []
+    assert cache.expire(PENDING_TTL_S + 0.5) == [(KEY, ["w1"])]
+    assert cache.stats()["inflight"] == 1
+    assert cache.failed == 1
+    assert cache.complete(KEY, 0.0, DATA, PENDING_TTL_S + 0.6) == []
+
+
+def test_shield_drop_owner():
+    cache = ShieldCache(ttl_s=0.5)
+    up0, up1 = object(), object()
+    cache.join(KEY, None, 0.0, owner=up0)
+    cache.join(KEY, "w1", 0.1)
+    cache.join((1, 3, 50, 1), None, 0.0, owner=up1)
+    assert cache.drop_owner(up0) == [(KEY, ["w1"])]
+    assert cache.drop_owner(up0) == []
+    assert cache.stats()["inflight"] == 1
+    cache.join(KEY, None, 0.2, owner=up0)
+    cache.join(KEY, "w2", 0.3)
+    cache.invalidate(1, 10, 1, 0.4)                 # odpięty lider też wraca przez drop_owner
+    assert cache.drop_owner(up0) == [(KEY, ["w2"])]
+    assert cache.stats()["inflight"] == 1
+
+
+def test_shield_stale_join_keeps_waiters():
+    cache = ShieldCache(ttl_s=0.5)
+    cache.join(KEY, None, 0.0)
+    cache.join(KEY, "w1", 0.1)
+    assert not cache.join(KEY, None, PENDING_TTL_S + 1.0)       # nowy lider
+    assert cache.complete(KEY, PENDING_TTL_S + 1.0, DATA, PENDING_TTL_S + 1.1) == ["w1"]
+
+
+def test_shield_response_bytes_match_encoder():
+    cache = ShieldCache(ttl_s=1.0)
+    rsp = mbap.encode_read_response(1, 1, 3, [1, 2, 3, 4])
+    cache.join(KEY, None, 1.0)
+    cache.complete(KEY, 1.0, mbap.FrameView(rsp).pdu[2:], 1.1)
+    assert cache.lookup(KEY, 1.2) == rsp[mbap.HEADER_LEN + 2:]
@@ -0,0 +1,137 @@
+# tests/test_parallel_stats.py
+import random
+from pathlib import Path
+
+import pytest
+
+from analysis import quick_modbus_stats
+from analysis.parallel_stats import WARMUP_BYTES, analyze_many
+from analysis.quick_modbus_stats import extract_features
+from bench.common import _PCAP_GLOBAL, _PCAP_REC, _ipv4_tcp, write_synthetic_pcap
+from injector.core import mbap
+
+CAPTURE_DIR = Path(__file__).resolve().parents[1] / "capture" / "pcap"
+CAPTURES = sorted(CAPTURE_DIR.glob("*.pcapng"))
+
+
+@pytest.fixture(scope="module")
+def batch_features():
+    return {p.name: extract_features(p, backend="native") for p in CAPTURES}
+
+
+def test_bundled_captures_present(batch_features):
+    assert len(CAPTURES) == 28
+    assert all(f["ok"] for f in batch_features.values())
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 1000])
+def test_stream_matches_batch(batch_features, monkeypatch, chunk_rows):
+    monkeypatch.setattr(quick_modbus_stats, "STREAM_CHUNK_ROWS", chunk_rows)
+    for p in CAPTURES:
+        assert extract_features(p, backend="native", stream=True) == batch_features[p.name], p.name
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_split_parts_match_batch(batch_features, workers):
+    # ~5 kawałków na plik: ramki rozcięte na granicach składa rozgrzewka WARMUP_BYTES
+    report = analyze_many([CAPTURE_DIR], backend="native", workers=workers, part_bytes=20000)
+    assert report["tasks"] > len(CAPTURES)
+    assert len(report["files"]) == len(CAPTURES)
+    for f in report["files"]:
+        parts = f.pop("parts")
+        assert parts >= 1
+        assert f == batch_features[f["file"]], f["file"]
+
+
+def test_sessions_merge_segments(batch_features):
+    report = analyze_many([CAPTURE_DIR], backend="native", workers=1, part_bytes=20000)
+    sessions = {s["session"]: s for s in report["sessions"]}
+    assert sum(len(s["files"]) for s in sessions.values()) == len(CAPTURES)
+    for s in sessions.values():
+        files = [batch_features[name] for name in s["files"]]
+        assert s["total_pkts"] == sum(f["total_pkts"] for f in files)
+        assert s["fc3_count"] == sum(f["fc3_count"] for f in files)
+        assert s["fc6_count"] == sum(f["fc6_count"] for f in files)
+
+
+def _write_fragmented_pcap(path: Path, n: int, seed: int = 1) -> Path:
+    """
+    Kilka przepływów naraz; co trzecia odpowiedź pocięta na dwa segmenty TCP
+    rozdzielone innym ruchem, co 50. segment wysłany ponownie (retransmisja).
+    """
+    rnd = random.Random(seed)
+    plc = bytes((10, 0, 0, 1))
+    flows = [[bytes((10, 0, 1, i + 2)), 40000 + i, 1, 1] for i in range(6)]
+    ts = 1_700_000_000 * 1_000_000
+    with path.open("wb") as f:
+        f.write(_PCAP_GLOBAL.pack(0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+
+        def emit(pkt: bytes) -> None:
+            nonlocal ts
+            f.write(_PCAP_REC.pack(ts // 1_000_000, ts % 1_000_000, len(pkt), len(pkt)))
+            f.write(pkt)
+            ts += rnd.randrange(1, 2000)
+
+        held = []
+        for k in range(n):
+            flow = flows[rnd.randrange(len(flows))]
+            hmi, sport = flow[0], flow[1]
+            tid = k & 0xFFFF
+            if k % 7 == 0:
+                req = rsp = mbap.encode_write_single(tid, 1, rnd.randrange(100), k & 0xFF)
+            else:
+                count = rnd.randrange(1, 60)
+                req = mbap.encode_read_request(tid, 1, 3, 0, count)
+                rsp = mbap.encode_read_response(tid, 1, 3, [k & 0xFFFF] * count)
+            emit(_ipv4_tcp(hmi, plc, sport, 502, flow[2], req))
+            flow[2] += len(req)
+            if k % 50 == 0:
+                emit(_ipv4_tcp(hmi, plc, sport, 502, flow[2] - len(req), req))
+            cut = len(rsp) // 2 if k % 3 == 0 else len(rsp)
+            emit(_ipv4_tcp(plc, hmi, 502, sport, flow[3], rsp[:cut]))
+            if cut < len(rsp):
+                held.append(_ipv4_tcp(plc, hmi, 502, sport, flow[3] + cut, rsp[cut:]))
+            flow[3] += len(rsp)
+            if held and rnd.random() < 0.5:
+                for pkt in held:
+                    emit(pkt)
+                held = []
+        for pkt in held:
+            emit(pkt)
+    return path
+
+
+def _split_vs_unsplit(pcap: Path, part_bytes: int, workers: int = 1):
+    whole = analyze_many([pcap], backend="native", workers=1, part_bytes=0)
+    split = analyze_many([pcap], backend="native", workers=workers, part_bytes=part_bytes)
+    assert whole["tasks"] == 1
+    assert split["tasks"] > 1
+    (a,), (b,) = whole["files"], split["files"]
+    assert b.pop("parts") == split["tasks"]
+    a.pop("parts")
+    return a, b
+
+
+@pytest.mark.parametrize("part_bytes", [64 * 1024, 3 * WARMUP_BYTES])
+def test_split_synthetic_pcap_matches_unsplit(tmp_path, part_bytes):
+    pcap = write_synthetic_pcap(tmp_path / "synthetic.pcap", 30000)
+    assert pcap.stat().st_size > 2 * part_bytes
+    whole, split = _split_vs_unsplit(pcap, part_bytes)
+    assert whole["ok"] and whole["total_pkts"] == 30000
+    assert split == whole
+    assert whole == extract_features(pcap, backend="native")
+
+
+def test_split_fragmented_pcap_matches_unsplit(tmp_path):
+    # granice kawałków tną ramki i retransmisje - w oknie WARMUP_BYTES wynik ten sam
+    pcap = _write_fragmented_pcap(tmp_path / "fragmented.pcap", 12000)
+    whole, split = _split_vs_unsplit(pcap, 40000, workers=2)
+    assert whole["ok"]
+    assert split == whole
+
+
+def test_default_does_not_split(tmp_path):
+    pcap = write_synthetic_pcap(tmp_path / "synthetic.pcap", 30000)
+    report = analyze_many([pcap], backend="native", workers=4)
+    assert (report["tasks"], report["part_bytes"]) == (1, 0)
+    assert analyze_many([pcap], backend="native", workers=4, part_bytes=None)["part_bytes"] > 0
@@ -0,0 +1,37 @@
+# tests/test_pcap_backends.py
+from pathlib import Path
+
+import pytest
+
+from analysis import quick_modbus_stats
+from analysis.quick_modbus_stats import extract_features, resolve_backend
+from analysis.tshark_profile import tshark_available
+
+CAPTURES = sorted((Path(__file__).resolve().parents[1] / "capture" / "pcap").glob("*.pcapng"))
+
+EXACT_FEATURES = ("total_pkts", "fc3_count", "fc6_count", "fc6_distinct_addrs", "num_flows", "ports_seen_dst")
+FLOAT_FEATURES = ("duration_s", "mean_frame_len", "std_frame_len", "fc6_entropy")
+
+
+def test_default_backend_is_tshark_when_installed(monkeypatch):
+    monkeypatch.setattr(quick_modbus_stats, "tshark_available", lambda: True)
+    assert resolve_backend() == "tshark"
+    monkeypatch.setattr(quick_modbus_stats, "tshark_available", lambda: False)
+    assert resolve_backend() == "native"
+    assert resolve_backend("tshark") == "tshark"
+    with pytest.raises(ValueError):
+        resolve_backend("scapy")
+
+
+@pytest.mark.skipif(not tshark_available(), reason="tshark not installed")
+@pytest.mark.parametrize("pcap", CAPTURES, ids=lambda p: p.name)
+def test_native_matches_tshark(pcap):
+    native = extract_features(pcap, backend="native")
+    tshark = extract_features(pcap, backend="tshark")
+    assert native["ok"] == tshark["ok"]
+    if not native["ok"]:
+        return
+    for key in EXACT_FEATURES:
+        assert native[key] == tshark[key], key
+    for key in FLOAT_FEATURES:
+        assert native[key] == pytest.approx(tshark[key], rel=1e-9, abs=1e-6), key
@@ -0,0 +1,29 @@
+# tests/test_proxy_async.py
+from bench.common import free_port
+from injector.attacks.proxy_async import AsyncModbusProxy
+from injector.attacks.proxy_rules import SpoofEngine, SpoofRule
+from injector.core import mbap
+from injector.core.config import PlcConfig
+from tests.util import connect, recv_frame
+
+
+def test_round_trip_through_proxy(plc_sim, serve):
+    sim = plc_sim()
+    for i in range(10):
+        sim.holding[i] = i
+    proxy = AsyncModbusProxy(PlcConfig(plc_host="127.0.0.1", plc_port=sim.port), "127.0.0.1", free_port())
+    proxy.engine = SpoofEngine([SpoofRule(name="hmi_offset", ranges=((0, 4),), value=1000)])
+    serve(proxy)
+
+    with connect(proxy.listen_port) as s:
+        # zapis przechodzi bez zmian, odczyt wraca z podmienionym HR[0..4]
+        s.sendall(mbap.encode_write_single(1, 1, 9, 42))
+        assert recv_frame(s) == mbap.encode_write_single(1, 1, 9, 42)
+        # kilka żądań w jednym segmencie TCP
+        s.sendall(mbap.encode_read_request(2, 1, 3, 3, 4) + mbap.encode_read_request(3, 1, 3, 8, 2))
+        assert recv_frame(s) == mbap.encode_read_response(2, 1, 3, [1003, 1004, 5, 6])
+        assert recv_frame(s) == mbap.encode_read_response(3, 1, 3, [8, 42])
+        s.sendall(mbap.encode_read_request(4, 1, 3, 0, 200))
+        assert recv_frame(s) == mbap.encode_exception(4, 1, 3, 3)
+    assert sim.requests == 4
+    assert proxy.engine.registers_spoofed == 2
@@ -0,0 +1,102 @@
+# tests/test_proxy_mux.py
+import socketserver
+import threading
+import time
+
+import pytest
+
+from bench.common import free_port
+from injector.attacks import modbus_proxy_spoof
+from injector.attacks.proxy_mux import MuxModbusProxy, SHIELD_FAIL_EXCEPTION
+from injector.attacks.proxy_rules import SpoofEngine, SpoofRule
+from injector.core import mbap
+from injector.core.config import PlcConfig
+from tests.util import connect, recv_frame
+
+
+@pytest.fixture
+def mux_proxy(serve):
+    def start(plc_port: int, rules=(), **kwargs) -> MuxModbusProxy:
+        cfg = PlcConfig(plc_host="127.0.0.1", plc_port=plc_port)
+        proxy = MuxModbusProxy(cfg, "127.0.0.1", free_port(), **kwargs)
+        proxy.engine = SpoofEngine(rules)
+        return serve(proxy)
+
+    return start
+
+
+def test_round_trip_spoofed(plc_sim, mux_proxy):
+    sim = plc_sim()
+    sim.holding[0], sim.holding[1] = 5, 6
+    proxy = mux_proxy(sim.port, rules=(SpoofRule(name="off", ranges=((0, 0),), value=100),))
+    with connect(proxy.listen_port) as s:
+        s.sendall(mbap.encode_read_request(42, 1, 3, 0, 2))
+        assert recv_frame(s) == mbap.encode_read_response(42, 1, 3, [105, 6])
+
+
+def test_shield_coalesced_waiters_share_one_spoof(plc_sim, mux_proxy):
+    sim = plc_sim(service_delay_s=0.3)
+    rules = (SpoofRule(name="replay", ranges=((0, 3),), transform="replay", history=1),)
+    proxy = mux_proxy(sim.port, rules=rules, upstreams=1, shield_ttl_s=0.01)
+    clients = [connect(proxy.listen_port) for _ in range(4)]
+    try:
+        for i, s in enumerate(clients):
+            s.sendall(mbap.encode_read_request(100 + i, 1, 3, 0, 4))
+        replies = [recv_frame(s) for s in clients]
+    finally:
+        for s in clients:
+            s.close()
+    assert sim.requests == 1
+    assert proxy.shield.coalesced == 3
+    assert proxy.engine.frames_spoofed == 1
+    assert [mbap.FrameView(r).tid for r in replies] == [100, 101, 102, 103]
+    assert len({r[2:] for r in replies}) == 1
+
+
+def test_shield_waiters_fail_when_leader_expires(plc_sim, mux_proxy, monkeypatch):
+    monkeypatch.setattr(modbus_proxy_spoof, "PENDING_TTL_S", 0.3)
+    sim = plc_sim(unit_id=1)        # odczyt unit 2 zostaje bez odpowiedzi
+    proxy = mux_proxy(sim.port, upstreams=1, shield_ttl_s=1.0)
+    leader, waiter = connect(proxy.listen_port), connect(proxy.listen_port)
+    try:
+        leader.sendall(mbap.encode_read_request(1, 2, 3, 0, 4))
+        time.sleep(0.05)
+        waiter.sendall(mbap.encode_read_request(9, 2, 3, 0, 4))
+        rsp = recv_frame(waiter)
+    finally:
+        leader.close()
+        waiter.close()
+    assert rsp == mbap.encode_exception(9, 2, 3, SHIELD_FAIL_EXCEPTION)
+    assert proxy.shield.stats()["inflight"] == 0
+    assert proxy.shield.failed == 1
+
+
+class _ClosingPlc(socketserver.BaseRequestHandler):
+    """PLC, który po pierwszym żądaniu zrywa połączenie bez odpowiedzi."""
+
+    def handle(self):
+        if self.request.recv(4096):
+            time.sleep(0.3)
+
+
+def test_shield_waiters_fail_when_leader_upstream_drops(mux_proxy):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _ClosingPlc)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        proxy = mux_proxy(server.server_address[1], upstreams=2, shield_ttl_s=1.0)
+        leader, waiter = connect(proxy.listen_port), connect(proxy.listen_port)   # upstream 0 i 1
+        try:
+            leader.sendall(mbap.encode_read_request(1, 1, 3, 0, 4))
+            time.sleep(0.05)
+            waiter.sendall(mbap.encode_read_request(9, 1, 3, 0, 4))
+            rsp = recv_frame(waiter)
+            assert recv_frame(leader) == b""      # klienci zerwanego upstreamu są zamykani
+        finally:
+            leader.close()
+            waiter.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert rsp == mbap.encode_exception(9, 1, 3, SHIELD_FAIL_EXCEPTION)
+    assert proxy.shield.stats()["inflight"] == 0
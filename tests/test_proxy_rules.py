@@ -0,0 +1,65 @@
+# tests/test_proxy_rules.py
+import pytest
+
+from injector.attacks.proxy_rules import SpoofEngine, SpoofRule, rule_from_yaml
+from injector.core import mbap
+
+
+def _apply(engine: SpoofEngine, registers, start=0, unit_id=1, func=3):
+    buf = bytearray(mbap.encode_read_response(1, unit_id, func, registers))
+    frame = mbap.FrameView(buf)
+    n = engine.apply(buf, frame.register_data_offset(), frame.register_count(), unit_id, func, start)
+    return list(mbap.FrameView(buf).registers()), n
+
+
+def test_stateless_transforms():
+    engine = SpoofEngine([
+        SpoofRule(name="off", ranges=((0, 1),), value=1000),
+        SpoofRule(name="const", ranges=((2, 2),), transform="constant", value=7),
+        SpoofRule(name="scale", ranges=((3, 3),), transform="scale", factor=0.5),
+    ])
+    assert _apply(engine, [65000, 1, 99, 11, 5]) == ([(65000 + 1000) & 0xFFFF, 1001, 7, 6, 5], 4)
+    assert _apply(engine, [3, 2], start=3) == ([2, 2], 1)
+
+
+def test_later_rule_wins():
+    engine = SpoofEngine([
+        SpoofRule(name="a", ranges=((0, 9),), value=1),
+        SpoofRule(name="b", ranges=((5, 5),), transform="constant", value=0),
+    ])
+    regs, _ = _apply(engine, [10] * 10)
+    assert regs == [11] * 5 + [0] + [11] * 4
+
+
+def test_unit_and_function_filters():
+    engine = SpoofEngine([
+        SpoofRule(name="u2", ranges=((0, 0),), value=1, unit_ids=(2,)),
+        SpoofRule(name="ir", ranges=((0, 0),), value=5, functions=(4,)),
+    ])
+    assert _apply(engine, [0], unit_id=1) == ([0], 0)
+    assert _apply(engine, [0], unit_id=2) == ([1], 1)
+    assert _apply(engine, [0], unit_id=1, func=4) == ([5], 1)
+    assert engine.functions == (3, 4)
+
+
+def test_freeze_and_replay_are_stateful():
+    engine = SpoofEngine([
+        SpoofRule(name="freeze", ranges=((0, 0),), transform="freeze"),
+        SpoofRule(name="replay", ranges=((1, 1),), transform="replay", history=2),
+    ])
+    seen = [_apply(engine, [v, v])[0] for v in (1, 2, 3, 4)]
+    assert [r[0] for r in seen] == [1, 1, 1, 1]
+    assert [r[1] for r in seen] == [1, 2, 1, 2]
+    assert engine.frames_spoofed == 4 and engine.registers_spoofed == 8
+
+
+def test_rule_from_yaml():
+    rule = rule_from_yaml({"registers": [[9, 5], 20], "transform": "scale", "factor": 2, "unit_ids": [3]}, 4)
+    assert rule == SpoofRule(name="rule04", ranges=((5, 9), (20, 20)), transform="scale",
+                             factor=2.0, unit_ids=(3,))
+    with pytest.raises(ValueError):
+        rule_from_yaml({"registers": [1], "transform": "invert"})
+    with pytest.raises(ValueError):
+        rule_from_yaml({"registers": [1], "functions": [6]})
+    with pytest.raises(ValueError):
+        rule_from_yaml({"registers": [70000]})
@@ -0,0 +1,63 @@
+# tests/test_replay.py
+import socket
+import time
+
+from injector.core import mbap
+from legacy.replay import ReplayConn, ReplayEngine
+
+KEY = (bytes((10, 0, 0, 2)), 40000, bytes((10, 0, 0, 1)), 502)
+
+
+def _conn(tids, unit_id=1):
+    frames = [(1_700_000_000.0 + i * 0.001, mbap.encode_read_request(tid, unit_id, 3, i, 1))
+              for i, tid in enumerate(tids)]
+    return ReplayConn(KEY, frames)
+
+
+def _replay(sim, conn, **kwargs):
+    engine = ReplayEngine([conn], "127.0.0.1", sim.port, speed=0.0, **kwargs)
+    t0 = time.monotonic()
+    report = engine.run()
+    return report, time.monotonic() - t0
+
+
+def test_round_trip(plc_sim):
+    sim = plc_sim()
+    report, _ = _replay(sim, _conn(range(1, 101)), max_inflight=8)
+    assert report["sent"] == 100
+    assert report["responses"] == 100
+    assert report["unanswered"] == 0
+    assert report["skipped"] == 0
+
+
+def test_ignored_requests_do_not_block_window(plc_sim):
+    # PLC odpowiada tylko na unit 1 - żądania unit 2 nigdy nie dostaną odpowiedzi
+    sim = plc_sim(unit_id=1)
+    report, wall = _replay(sim, _conn(range(1, 21), unit_id=2), max_inflight=4, response_timeout_s=0.2)
+    assert report["sent"] == 20
+    assert report["responses"] == 0
+    assert report["unanswered"] == 20
+    assert wall < 5.0
+
+
+def test_reused_tid_in_flight(plc_sim):
+    sim = plc_sim()
+    report, _ = _replay(sim, _conn([7] * 20), max_inflight=4)
+    assert report["sent"] == 20
+    assert report["responses"] == 20
+    assert report["unanswered"] == 0
+
+
+def test_peer_close_stops_sending(plc_sim):
+    # limit 1 połączenia zajęty - połączenie replayu PLC od razu zamyka
+    sim = plc_sim(max_connections=1)
+    holder = socket.create_connection(("127.0.0.1", sim.port))
+    try:
+        time.sleep(0.1)
+        report, wall = _replay(sim, _conn(range(1, 51)), max_inflight=4, response_timeout_s=0.5)
+    finally:
+        holder.close()
+    assert report["responses"] == 0
+    assert report["sent"] + report["skipped"] == 50
+    assert report["skipped"] > 0
+    assert wall < 5.0
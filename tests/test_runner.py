@@ -0,0 +1,29 @@
+# tests/test_runner.py
+import threading
+
+import pytest
+
+import api.runner as runner_mod
+from bench.common import free_port
+
+
+def test_failed_capture_stops_simulator(monkeypatch):
+    port = free_port()
+    seen = {}
+
+    def start_capture(label=None, bpf=None, **kwargs):
+        seen["bpf"] = bpf
+        raise RuntimeError("no dumpcap")
+
+    monkeypatch.setattr(runner_mod, "SIM_DEFAULT_PORT", port)
+    monkeypatch.setattr(runner_mod, "start_capture", start_capture)
+    monkeypatch.setattr(runner_mod, "stop_capture", lambda: pytest.fail("capture was never started"))
+
+    runner = runner_mod.ScenarioRunner()
+    with pytest.raises(RuntimeError, match="no dumpcap"):
+        runner.start("baseline", simulate_plc=True)
+
+    assert seen["bpf"] == f"tcp port 502 or tcp port 1502 or tcp port {port}"
+    assert runner._sim is None
+    assert not runner.status()["running"]
+    assert not [t for t in threading.enumerate() if t.name == "PLC_SIM"]
@@ -0,0 +1,29 @@
+# tests/util.py
+import socket
+import time
+
+from injector.core import mbap
+
+
+def connect(port: int) -> socket.socket:
+    s = socket.create_connection(("127.0.0.1", port), timeout=5.0)
+    time.sleep(0.05)        # proxy przyjmuje klienta i łączy się z PLC
+    return s
+
+
+def _recv_exact(s: socket.socket, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = s.recv(n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def recv_frame(s: socket.socket) -> bytes:
+    """Dokładnie jedna ramka MBAP; b"" (albo jej początek), gdy druga strona zamknęła połączenie."""
+    head = _recv_exact(s, mbap.HEADER_LEN)
+    if len(head) < mbap.HEADER_LEN:
+        return head
+    return head + _recv_exact(s, 6 + mbap.U16.unpack_from(head, 4)[0] - mbap.HEADER_LEN)